@@ -0,0 +1,95 @@
+"""
+End-to-end throughput of the scraping endpoints of a running app.
+
+The app should be started with upstream_replay_url pointing at a running
+benchmarks.upstream_replay server, so the numbers do not depend on the live
+sites and upstream latency and errors can be injected there. Title and genre
+ids are discovered through the api first, then every endpoint is requested
+`--requests` times with `--concurrency` requests in flight.
+
+    python -m benchmarks.upstream_replay --recordings /tmp/recordings --seed &
+    upstream_replay_url=http://localhost:8790 uvicorn src.main:app &
+    python -m benchmarks.endpoints --api http://localhost:8000/api/v1 --parsers anidub animevost
+
+Each endpoint is reported twice: the first pass requests every url once, so
+it mostly misses the app's cache and goes through the parsers, the second is
+the steady state served from the cache.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+import aiohttp
+from src.utils.stats import percentile
+
+
+async def discover(session: aiohttp.ClientSession, api: str, parser_id: str, pages: int) -> tuple[list[str], list[str]]:
+    title_ids = []
+    for page in range(1, pages + 1):
+        async with session.get(f'{api}/parsers/{parser_id}/titles', params={'page': page}) as response:
+            response.raise_for_status()
+            title_ids += [title['id'] for title in (await response.json())['titles']]
+    async with session.get(f'{api}/parsers/{parser_id}/genres') as response:
+        response.raise_for_status()
+        genre_ids = [genre['id'] for genre in await response.json()]
+    return title_ids, genre_ids
+
+
+async def measure(session: aiohttp.ClientSession, urls: list[str], requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    urls = itertools.cycle(urls)
+
+    async def client():
+        nonlocal requests, errors
+        while requests > 0:
+            requests -= 1
+            start = time.perf_counter()
+            async with session.get(next(urls)) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'per_second': len(latencies) / elapsed,
+        'mean': sum(latencies) / len(latencies) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+    }
+
+
+async def main(api: str, parser_ids: list[str], pages: int, requests: int, concurrency: int):
+    print(f'{"endpoint":<32}{"pass":>7}{"requests":>9}{"errors":>8}{"req/s":>9}{"mean ms":>10}{"p95 ms":>10}')
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        for parser_id in parser_ids:
+            title_ids, genre_ids = await discover(session, api, parser_id, pages)
+            endpoints = {
+                f'/parsers/{parser_id}/titles': [f'{api}/parsers/{parser_id}/titles?page={page}' for page in range(1, pages + 1)],
+                f'/titles/{{id}} ({parser_id})': [f'{api}/titles/{title_id}' for title_id in title_ids],
+                f'/genres/{{id}}/titles ({parser_id})': [f'{api}/genres/{genre_id}/titles?page={page}'
+                                                        for genre_id in genre_ids for page in range(1, pages + 1)],
+            }
+            for name, urls in endpoints.items():
+                if not urls:
+                    print(f'{name:<32}  no ids found')
+                    continue
+                for run, count in (('first', len(urls)), ('cached', requests)):
+                    result = await measure(session, urls, count, concurrency)
+                    print(f'{name:<32}{run:>7}{result["requests"]:>9}{result["errors"]:>8}{result["per_second"]:>9.1f}'
+                          f'{result["mean"]:>10.1f}{result["p95"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--api', default='http://localhost:8000/api/v1')
+    arg_parser.add_argument('--parsers', nargs='+', default=['anidub', 'animevost'])
+    arg_parser.add_argument('--pages', type=int, default=3)
+    arg_parser.add_argument('--requests', type=int, default=300)
+    arg_parser.add_argument('--concurrency', type=int, default=16)
+    args = arg_parser.parse_args()
+    asyncio.run(main(args.api, args.parsers, args.pages, args.requests, args.concurrency))
@@ -0,0 +1,136 @@
+"""
+HTML page fixtures shaped like the anidub and animevost pages the parsers read.
+
+A page saved from the live site as benchmarks/fixtures/<name>.html is used
+as is; otherwise a page with the same markup structure is generated, padded
+with navigation, comments and scripts to a realistic size. The saved pages are
+also what tests/test_strainers.py checks the parsers' SoupStrainers against.
+
+    python -m benchmarks.fixtures           # writes the generated pages to benchmarks/fixtures/
+    python -m benchmarks.fixtures --live    # saves the pages of the live sites instead
+"""
+import argparse
+import asyncio
+import random
+from pathlib import Path
+import aiohttp
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+GENRES = ['Экшен', 'Приключения', 'Комедия', 'Драма', 'Фэнтези', 'Романтика', 'Повседневность', 'Меха',
+          'Спорт', 'Детектив', 'Триллер', 'Школа', 'Сёнэн', 'Сэйнэн', 'Исекай', 'Музыка']
+WORDS = ['hikari', 'no', 'sora', 'kaze', 'yume', 'tsuki', 'hoshi', 'monogatari', 'senki', 'gakuen',
+         'kimi', 'boku', 'sekai', 'densetsu', 'mahou', 'shoujo', 'ken', 'tenshi', 'akuma', 'natsu']
+
+
+def _name(rng: random.Random) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+
+
+def _padding(rng: random.Random, comments: int) -> str:
+    menu = ''.join(f'<li><a href="/menu/{i}/">Раздел {i}</a><ul>' + ''.join(
+        f'<li><a href="/menu/{i}/{j}/">Пункт {j}</a></li>' for j in range(12)) + '</ul></li>' for i in range(10))
+    script = '<script>var data = ' + repr([rng.random() for _ in range(400)]) + ';</script>'
+    comment_items = ''.join(
+        f'<div class="comment" id="comment-{i}"><div class="comm-author"><a href="/user/u{i}/">user{i}</a>'
+        f'<span class="comm-date">01.01.2024</span></div><div class="comm-text">{" ".join(rng.choice(WORDS) for _ in range(40))}</div></div>'
+        for i in range(comments))
+    return f'<nav class="site-nav"><ul>{menu}</ul></nav>{script * 4}<div class="comments">{comment_items}</div>'
+
+
+def anidub_page(rng: random.Random, titles: int = 30, pages: int = 480) -> str:
+    items = []
+    for i in range(titles):
+        title_id = rng.randint(1000, 99999)
+        name = f'{_name(rng)} / {_name(rng)} [{rng.randint(1, 12):02d} из 12]'
+        items.append(
+            f'<div class="th-item"><a class="th-in with-mask" href="https://anidub.world/anime_tv/{title_id}-slug.html">'
+            f'<div class="th-img img-resp-vert"><img src="/uploads/posts/thumbs/{title_id}.jpg" alt="{name}"></div>'
+            f'<div class="th-rating">{rng.randint(1, 10)}</div><div class="th-tip">{" ".join(rng.choice(WORDS) for _ in range(60))}</div>'
+            f'<div class="th-title">{name}</div></a></div>')
+    pagination = ''.join(f'<a href="/page/{page}/">{page}</a>' for page in (*range(1, 8), pages))
+    return (f'<!DOCTYPE html><html><head><title>AniDub</title></head><body><div class="wrap"><div class="wrap-main">'
+            f'{_padding(rng, 300)}<div id="dle-content">{"".join(items)}<div class="bottom-nav"><div class="pagi-nav">'
+            f'<div class="navigation">{pagination}</div></div></div></div></div></div></body></html>')
+
+
+def anidub_title(rng: random.Random, episodes: int = 24) -> str:
+    name = f'{_name(rng)} / {_name(rng)} [{episodes:02d} из {episodes}]'
+    tabs = ''.join(f'<span data="https://video.sibnet.ru/shell.php?videoid={rng.randint(10**6, 10**7)}">Серия {i}</span>'
+                   for i in range(1, episodes + 1))
+    genres = ', '.join(f'<a href="/xfsearch/genre/{genre}/">{genre}</a>' for genre in rng.sample(GENRES, 4))
+    recommendations = anidub_page(rng, titles=8).split('<div id="dle-content">')[1].split('<div class="bottom-nav">')[0]
+    return (f'<!DOCTYPE html><html><body><div class="wrap"><div class="wrap-main">{_padding(rng, 400)}'
+            f'<div class="fleft"><div class="fposter"><img src="/uploads/posts/poster.jpg"></div></div>'
+            f'<div class="fright"><h1>{name}</h1><div class="fmeta"><span><a href="/year/2023/">2023</a></span>'
+            f'<span><a href="/anime/anime_tv">TV</a></span></div><ul class="flist"><li><span>Жанр:</span>{genres}</li>'
+            f'<li><span>Режиссер:</span>Someone</li></ul><div class="fdesc">{" ".join(rng.choice(WORDS) for _ in range(200))}</div></div>'
+            f'<div class="fplayer"><div class="tabs-sel">{tabs}</div></div>'
+            f'<div class="sect"><div class="sect-content">{recommendations}</div></div></div></div></body></html>')
+
+
+def animevost_page(rng: random.Random, titles: int = 20, pages: int = 300) -> str:
+    items = []
+    for i in range(titles):
+        title_id = rng.randint(1000, 9999)
+        name = f'{_name(rng)} / {_name(rng)} [1-{rng.randint(2, 24)} из 24]'
+        related = ''.join(f'<li><a href="https://animevost.org/tip/tv/{rng.randint(1000, 9999)}-slug.html">{_name(rng)} / {_name(rng)}</a> TV</li>'
+                          for _ in range(rng.randint(0, 4)))
+        items.append(
+            f'<div class="shortstory"><div class="shortstoryHead"><h2><a href="https://animevost.org/tip/tv/{title_id}-slug.html">{name}</a></h2></div>'
+            f'<div class="shortstoryContent"><table><tr><td><img src="/uploads/posts/{title_id}.jpg"></td><td>'
+            f'<p><strong>Год выхода: </strong>2023</p><p><strong>Жанр: </strong>{", ".join(rng.sample(GENRES, 3))}</p>'
+            f'<p><strong>Количество серий: </strong>24+ (24 мин.)</p><p><strong>Описание: </strong>{" ".join(rng.choice(WORDS) for _ in range(80))}</p>'
+            f'</td></tr></table><div class="text_spoiler"><ol>{related}</ol></div></div></div>')
+    topnav = ('<ul id="topnav"><li><a href="/">Главная</a></li><li><a href="#">Жанры</a><div>'
+              + ''.join(f'<span><a href="/zhanr/genre{i}/">{genre}</a></span>' for i, genre in enumerate(GENRES)) + '</div></li></ul>')
+    pagination = ''.join(f'<td><a href="/page/{page}/">{page}</a></td>' for page in (*range(1, 8), pages))
+    return (f'<!DOCTYPE html><html><body>{topnav}{_padding(rng, 250)}<div id="dle-content">{"".join(items)}'
+            f'<div class="block_2"><table><tr>{pagination}</tr></table></div></div></body></html>')
+
+
+GENERATORS = {
+    'anidub_page': anidub_page,
+    'anidub_title': anidub_title,
+    'animevost_page': animevost_page,
+}
+
+
+def load_fixtures(seed: int = 1) -> dict[str, str]:
+    fixtures = {}
+    for name, generator in GENERATORS.items():
+        path = FIXTURES_DIR / f'{name}.html'
+        fixtures[name] = path.read_text(encoding='utf-8') if path.exists() else generator(random.Random(seed))
+    return fixtures
+
+
+async def fetch_live_fixtures() -> dict[str, str]:
+    """
+    Fetches a list page of each site and the first title of the anidub one,
+    the pages the parse functions with strainers read.
+    """
+    from src.parsers import anidub, animevost
+    async with aiohttp.ClientSession(headers={'User-Agent': 'Mozilla/5.0'}) as session:
+        async def fetch(url: str) -> str:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                return await response.text()
+
+        fixtures = {
+            'anidub_page': await fetch(f'{anidub.WEBSITE_URL}/page/2/'),
+            'animevost_page': await fetch(f'{animevost.WEBSITE_URL}/page/2/'),
+        }
+        _, titles = anidub.parse_titles_page(fixtures['anidub_page'])
+        fixtures['anidub_title'] = await fetch(f'{anidub.WEBSITE_URL}/index.php?newsid={titles[0].id_on_website}')
+        return fixtures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--live', action='store_true', help='save the pages of the live sites')
+    args = parser.parse_args()
+    FIXTURES_DIR.mkdir(exist_ok=True)
+    fixtures = asyncio.run(fetch_live_fixtures()) if args.live else load_fixtures()
+    for name, html in fixtures.items():
+        (FIXTURES_DIR / f'{name}.html').write_text(html, encoding='utf-8')
+        print(f'{name}: {len(html.encode()) // 1024} KB')
@@ -0,0 +1,125 @@
+"""
+HLS duration probing against large generated playlist fixtures.
+
+Compares the previous approach (download the whole media playlist and parse
+it with m3u8.loads, if the package is installed) with HlsProber streaming the
+lowest-bandwidth variant, and with a warm per-URL cache.
+
+    python -m benchmarks.hls_playlists --segments 1000 10000 100000
+"""
+import argparse
+import asyncio
+import time
+import aiohttp
+from aiohttp import web
+from src.utils.hls import HlsProber, PlaylistScanner
+
+try:
+    import m3u8
+except ImportError:
+    m3u8 = None
+
+TIMEOUT = aiohttp.ClientTimeout(total=60)
+
+
+def media_playlist(segments: int, tail: int = 0) -> str:
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:6',
+             '#EXT-X-PLAYLIST-TYPE:VOD', '#EXT-X-MEDIA-SEQUENCE:0']
+    for index in range(segments):
+        lines.append('#EXTINF:5.005,')
+        lines.append(f'segment-{index:06d}.ts')
+    lines.append('#EXT-X-ENDLIST')
+    lines.extend(f'# trailing comment {index}' for index in range(tail))
+    return '\n'.join(lines) + '\n'
+
+
+def master_playlist(base_url: str) -> str:
+    return '\n'.join([
+        '#EXTM3U',
+        '#EXT-X-STREAM-INF:BANDWIDTH=2800000,RESOLUTION=1280x720,CODECS="avc1.4d401f,mp4a.40.2"',
+        f'{base_url}/720.m3u8',
+        '#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2"',
+        '360.m3u8',
+    ]) + '\n'
+
+
+class MemoryCache:
+    def __init__(self) -> None:
+        self.data = {}
+
+    async def get_hls_duration(self, url_hash: str):
+        return self.data.get(url_hash)
+
+    async def set_hls_duration(self, url_hash: str, duration: float):
+        self.data[url_hash] = duration
+
+
+async def old_probe(session: aiohttp.ClientSession, url: str) -> float:
+    async with session.get(url) as response:
+        playlist_data = await response.text()
+    for line in playlist_data.splitlines():
+        if line.startswith('http'):
+            async with session.get(line) as response:
+                playlist = m3u8.loads(await response.text())
+            return sum(segment.duration for segment in playlist.segments if segment.duration)
+
+
+async def timed(coro_factory, repeat: int) -> tuple[float, float]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = await coro_factory()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+async def main(segments_list: list[int], repeat: int, port: int):
+    app = web.Application()
+
+    async def master(request):
+        return web.Response(text=master_playlist(f"http://{request.host}/{request.match_info['segments']}"))
+
+    async def media(request):
+        return web.Response(text=media_playlist(int(request.match_info['segments']), tail=5000))
+
+    app.router.add_get('/{segments}/master.m3u8', master)
+    app.router.add_get('/{segments}/{variant}.m3u8', media)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+
+    prober = HlsProber(timeout=TIMEOUT)
+    cache = MemoryCache()
+    print(f'{"segments":>10}{"parse m3u8":>14}{"parse scan":>14}{"old ms":>10}{"probe ms":>10}{"cached ms":>11}')
+    async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
+        for segments in segments_list:
+            url = f'http://127.0.0.1:{port}/{segments}/master.m3u8'
+            text = media_playlist(segments)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                scanner = PlaylistScanner()
+                for line in text.splitlines():
+                    if not scanner.feed(line):
+                        break
+            scan_ms = (time.perf_counter() - start) / repeat * 1000
+            m3u8_ms = float('nan')
+            old_ms = float('nan')
+            if m3u8:
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    m3u8.loads(text)
+                m3u8_ms = (time.perf_counter() - start) / repeat * 1000
+                old_ms, _ = await timed(lambda: old_probe(session, url), repeat)
+            probe_ms, duration = await timed(lambda: prober.probe(session, url), repeat)
+            await prober.get_duration(session, url, service=cache)
+            cached_ms, _ = await timed(lambda: prober.get_duration(session, url, service=cache), repeat)
+            assert abs(duration[0] - segments * 5.005) < 1e-3 * segments
+            print(f'{segments:>10}{m3u8_ms:>14.2f}{scan_ms:>14.2f}{old_ms:>10.2f}{probe_ms:>10.2f}{cached_ms:>11.4f}')
+    await runner.cleanup()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--segments', type=int, nargs='+', default=[1000, 10000, 100000])
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--port', type=int, default=8790)
+    args = arg_parser.parse_args()
+    asyncio.run(main(args.segments, args.repeat, args.port))
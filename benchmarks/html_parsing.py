@@ -0,0 +1,105 @@
+"""
+Parse time and memory of the HTML backends over the page fixtures.
+
+Every case parses a fixture with every backend, both whole and restricted to the
+subtrees the parser declares (SoupStrainer), and then read with the parser's
+own extraction code. The extracted data is compared across runs. Each run
+happens in its own process, so the RSS growth it reports is its own.
+
+    python -m benchmarks.html_parsing --backends html.parser lxml html5lib
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from benchmarks.fixtures import load_fixtures
+from src.parsers import anidub, animevost
+from src.utils.html import parsed_html, resolve_backend
+
+
+def extract_anidub_page(soup) -> list:
+    return [title.model_dump() for title in anidub.get_titles_from_page(soup)] + [anidub.get_pages_count(soup)]
+
+
+def extract_anidub_title(soup) -> list:
+    data = soup.select_one('.wrap-main')
+    fright = data.select_one('.fright')
+    genres = [genre.text for item in fright.select('.flist > li') for genre in item.select('a')]
+    tabs = [tab.get('data') for tab in data.select_one('.fplayer').select_one('.tabs-sel').select('span')]
+    recommendations = [anidub.get_title_data(item).model_dump() for item in data.select('.sect > .sect-content > .th-item')]
+    return [fright.select_one('h1').text, fright.select_one('.fdesc').text, genres, tabs, recommendations]
+
+
+def extract_animevost_page(soup) -> list:
+    return [title.model_dump() for title in animevost.get_titles_from_page(soup)] + [animevost.get_pages_count(soup)]
+
+
+def extract_animevost_genres(soup) -> list:
+    return [genre['href'] for genre in soup.select('ul#topnav > li')[1].select('div > span > a')]
+
+
+# case: (fixture, extraction, subtrees the parser keeps)
+CASES = {
+    'anidub_page': ('anidub_page', extract_anidub_page, anidub.LIST_PAGE_ONLY),
+    'anidub_title': ('anidub_title', extract_anidub_title, anidub.TITLE_PAGE_ONLY),
+    'animevost_page': ('animevost_page', extract_animevost_page, animevost.LIST_PAGE_ONLY),
+    'animevost_genres': ('animevost_page', extract_animevost_genres, animevost.GENRES_PAGE_ONLY),
+}
+
+
+def run_case(name: str, backend: str, partial: bool, repeat: int):
+    fixture, extract, strainer = CASES[name]
+    html = load_fixtures()[fixture]
+    parse_only = strainer if partial else None
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    parse_ms = extract_ms = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with parsed_html(html, parse_only, backend) as soup:
+            parse_ms += time.perf_counter() - start
+            start = time.perf_counter()
+            result = extract(soup)
+            extract_ms += time.perf_counter() - start
+    tracemalloc.start()
+    with parsed_html(html, parse_only, backend) as soup:
+        extract(soup)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(json.dumps({
+        'size_kb': len(html.encode()) // 1024, 'parse_ms': parse_ms / repeat * 1000, 'extract_ms': extract_ms / repeat * 1000,
+        'python_peak_kb': peak // 1024, 'rss_growth_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+        'result': json.dumps(result, default=str, sort_keys=True),
+    }), flush=True)
+
+
+def main(backends: list[str], repeat: int):
+    print(f'{"case":<18}{"KB":>6}{"backend":>13}{"mode":>9}{"parse ms":>10}{"select ms":>11}{"py peak KB":>12}{"RSS +KB":>9}')
+    backends = [backend for backend in backends if resolve_backend(backend) == backend]
+    for name in CASES:
+        reference = None
+        for backend in backends:
+            for partial in (False, True):
+                command = [sys.executable, '-m', 'benchmarks.html_parsing', '--child', name, backend, '--repeat', str(repeat)]
+                output = subprocess.run(command + (['--partial'] if partial else []),
+                                        capture_output=True, text=True, check=True).stdout
+                row = json.loads(next(line for line in output.splitlines() if line.startswith('{')))
+                reference = reference or row['result']
+                same = '' if row['result'] == reference else '  (extracted data differs)'
+                print(f'{name:<18}{row["size_kb"]:>6}{backend:>13}{"partial" if partial else "full":>9}{row["parse_ms"]:>10.2f}'
+                      f'{row["extract_ms"]:>11.2f}{row["python_peak_kb"]:>12}{row["rss_growth_kb"]:>9}{same}')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--backends', nargs='+', default=['html.parser', 'lxml', 'html5lib'])
+    arg_parser.add_argument('--repeat', type=int, default=10)
+    arg_parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    arg_parser.add_argument('--partial', action='store_true', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.child:
+        run_case(*args.child, partial=args.partial, repeat=args.repeat)
+    else:
+        main(args.backends, args.repeat)
@@ -0,0 +1,218 @@
+"""
+Load test of a running app with a mix of simulated users.
+
+Every virtual user logs in and repeats actions picked by the weights of the
+chosen mix, with an exponential think time between them: browsing main and
+list pages, opening titles, listing the episodes it is watching, sending
+progress heartbeats for episodes of the titles it opened and searching. The
+report gives p50/p95/p99 latency and throughput per endpoint and is compared
+with a stored baseline, so regressions between runs stand out.
+
+Run it against an app served by benchmarks.upstream_replay (see
+benchmarks.endpoints), after seeding the load test users into Postgres:
+
+    python -m benchmarks.load_test --seed-users 200
+    python -m benchmarks.load_test --users 200 --duration 120 --mix watching --save-baseline
+    # after a change, compares with the saved run and exits with 1 on regressions
+    python -m benchmarks.load_test --users 200 --duration 120 --mix watching
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+import aiohttp
+from src.utils.stats import percentile
+
+BASELINE = Path(__file__).parent / 'baselines' / 'load_test.json'
+PASSWORD = 'load-test-password'
+COOKIE_NAME = 'fastapiusersauth'
+
+# action weights of the user mixes
+MIXES = {
+    'browsing': {'main': 5, 'list': 4, 'title': 3, 'episodes': 1, 'heartbeat': 1, 'search': 3},
+    'watching': {'main': 1, 'list': 1, 'title': 2, 'episodes': 2, 'heartbeat': 12, 'search': 1},
+    'mixed': {'main': 3, 'list': 2, 'title': 3, 'episodes': 2, 'heartbeat': 6, 'search': 2},
+}
+
+
+def user_email(index: int) -> str:
+    return f'load-test-{index}@example.com'
+
+
+async def seed_users(count: int):
+    from src.users_controller import create_user
+    for index in range(count):
+        await create_user(email=user_email(index), password=PASSWORD, name=f'Load test {index}',
+                          register_date=datetime.now(), is_verified=True)
+    print(f'Seeded {count} load test users')
+
+
+class LoadTest:
+    def __init__(self, api: str, parser_ids: list[str], weights: dict[str, int], think_ms: float, pages: int) -> None:
+        self.api = api
+        self.parser_ids = parser_ids
+        self.actions = list(weights)
+        self.weights = list(weights.values())
+        self.think_ms = think_ms
+        self.pages = pages
+        self.title_ids: list[str] = []
+        self.words: list[str] = []
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def request(self, session: aiohttp.ClientSession, name: str, method: str, path: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            async with session.request(method, f'{self.api}{path}', **kwargs) as response:
+                body = await response.read()
+                failed = response.status >= 400
+        except aiohttp.ClientError:
+            body, failed = None, True
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+        self.errors[name] = self.errors.get(name, 0) + failed
+        return None if failed or not body else json.loads(body)
+
+    async def discover(self, session: aiohttp.ClientSession):
+        for parser_id in self.parser_ids:
+            for page in range(1, self.pages + 1):
+                async with session.get(f'{self.api}/parsers/{parser_id}/titles', params={'page': page}) as response:
+                    response.raise_for_status()
+                    titles = (await response.json())['titles']
+                self.title_ids += [title['id'] for title in titles]
+                self.words += [word for title in titles for word in title['name'].split() if len(word) > 3]
+        if not self.title_ids:
+            raise RuntimeError('No titles found, is the app connected to the upstream stand-in?')
+
+    async def login(self, session: aiohttp.ClientSession, index: int) -> dict[str, str]:
+        async with session.post(f'{self.api}/auth/jwt/login', data={'username': user_email(index), 'password': PASSWORD}) as response:
+            if response.status >= 400:
+                raise RuntimeError(f'Login of {user_email(index)} failed, seed the users with --seed-users first')
+            # the auth cookie is secure and users share the client session, so it is passed by hand
+            return {'Cookie': f'{COOKIE_NAME}={response.cookies[COOKIE_NAME].value}'}
+
+    async def user(self, session: aiohttp.ClientSession, index: int, deadline: float):
+        rng = random.Random(index)
+        headers = await self.login(session, index)
+        episode_ids = []
+        while time.monotonic() < deadline:
+            action = rng.choices(self.actions, self.weights)[0]
+            parser_id = rng.choice(self.parser_ids)
+            if action == 'main':
+                await self.request(session, 'GET /parsers/{id}/titles/main', 'GET', f'/parsers/{parser_id}/titles/main', headers=headers)
+            elif action == 'list':
+                await self.request(session, 'GET /parsers/{id}/titles', 'GET', f'/parsers/{parser_id}/titles',
+                                   params={'page': rng.randint(1, self.pages)}, headers=headers)
+            elif action == 'title' or (action == 'heartbeat' and not episode_ids):
+                title = await self.request(session, 'GET /titles/{id}', 'GET', f'/titles/{rng.choice(self.title_ids)}', headers=headers)
+                if title and title['episodes']:
+                    episode_ids = [episode['id'] for episode in title['episodes']]
+            elif action == 'episodes':
+                await self.request(session, 'GET /episodes', 'GET', '/episodes', headers=headers)
+            elif action == 'heartbeat':
+                await self.request(session, 'POST /episodes/{id}/progress', 'POST', f'/episodes/{rng.choice(episode_ids)}/progress',
+                                   params={'progress': rng.randint(0, 100), 'time': rng.randint(0, 1440)}, headers=headers)
+            elif action == 'search':
+                await self.request(session, 'GET /titles/search', 'GET', '/titles/search',
+                                   params={'query': rng.choice(self.words)}, headers=headers)
+            await asyncio.sleep(rng.expovariate(1000 / self.think_ms) if self.think_ms else 0)
+
+    async def run(self, users: int, duration: float, ramp_up: float) -> dict:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0), cookie_jar=aiohttp.DummyCookieJar()) as session:
+            await self.discover(session)
+            start = time.monotonic()
+            deadline = start + ramp_up + duration
+
+            async def delayed_user(index: int):
+                await asyncio.sleep(ramp_up * index / users)
+                await self.user(session, index, deadline)
+
+            await asyncio.gather(*[delayed_user(index) for index in range(users)])
+            elapsed = time.monotonic() - start
+        return {
+            name: {
+                'requests': len(latencies),
+                'errors': self.errors[name],
+                'per_second': len(latencies) / elapsed,
+                'p50': percentile(latencies, 0.5) * 1000,
+                'p95': percentile(latencies, 0.95) * 1000,
+                'p99': percentile(latencies, 0.99) * 1000,
+            }
+            for name, latencies in sorted(self.latencies.items())
+        }
+
+
+def report(results: dict, baseline: dict | None, tolerance: float) -> list[str]:
+    """
+    Prints the results next to the baseline ones and returns the regressions:
+    endpoints whose p95 grew or throughput dropped by more than `tolerance`,
+    or that started to fail.
+    """
+    regressions = []
+    print(f'{"endpoint":<32}{"requests":>9}{"errors":>8}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"p95 vs base":>13}')
+    total = {'requests': 0, 'per_second': 0}
+    for name, row in results.items():
+        total['requests'] += row['requests']
+        total['per_second'] += row['per_second']
+        base = (baseline or {}).get(name)
+        change = ''
+        if base:
+            p95_change = row['p95'] / base['p95'] - 1 if base['p95'] else 0
+            change = f'{p95_change:+.0%}'
+            if p95_change > tolerance or row['per_second'] < base['per_second'] * (1 - tolerance) \
+                    or (row['errors'] and not base['errors']):
+                regressions.append(name)
+                change += ' !'
+        print(f'{name:<32}{row["requests"]:>9}{row["errors"]:>8}{row["per_second"]:>9.1f}{row["p50"]:>9.1f}'
+              f'{row["p95"]:>9.1f}{row["p99"]:>9.1f}{change:>13}')
+    print(f'{"total":<32}{total["requests"]:>9}{"":>8}{total["per_second"]:>9.1f}')
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    if args.seed_users:
+        await seed_users(args.seed_users)
+        return 0
+    weights = dict(MIXES[args.mix])
+    for weight in args.weights:
+        action, _, value = weight.partition('=')
+        weights[action] = int(value)
+    load_test = LoadTest(args.api, args.parsers, weights, args.think_ms, args.pages)
+    results = await load_test.run(args.users, args.duration, args.ramp_up)
+    baseline_path = Path(args.baseline)
+    baseline = None
+    if baseline_path.exists() and not args.save_baseline:
+        stored = json.loads(baseline_path.read_text())
+        if stored['mix'] != weights or stored['users'] != args.users:
+            print(f'Baseline {baseline_path} was run with another mix or users count, not comparing')
+        else:
+            baseline = stored['results']
+    regressions = report(results, baseline, args.tolerance)
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps({'mix': weights, 'users': args.users, 'results': results}, indent=2))
+        print(f'Saved the baseline to {baseline_path}')
+    if regressions:
+        print(f'Regressed: {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--api', default='http://localhost:8000/api/v1')
+    arg_parser.add_argument('--parsers', nargs='+', default=['anidub', 'animevost'])
+    arg_parser.add_argument('--users', type=int, default=50)
+    arg_parser.add_argument('--duration', type=float, default=60, help='Seconds of full load after the ramp-up')
+    arg_parser.add_argument('--ramp-up', type=float, default=10)
+    arg_parser.add_argument('--think-ms', type=float, default=1000, help='Mean pause between the actions of a user')
+    arg_parser.add_argument('--pages', type=int, default=3)
+    arg_parser.add_argument('--mix', choices=MIXES, default='mixed')
+    arg_parser.add_argument('--weights', nargs='*', default=[], help='Overrides of the mix weights, e.g. heartbeat=20 search=0')
+    arg_parser.add_argument('--baseline', default=str(BASELINE))
+    arg_parser.add_argument('--save-baseline', action='store_true')
+    arg_parser.add_argument('--tolerance', type=float, default=0.2)
+    arg_parser.add_argument('--seed-users', type=int, default=0, help='Create this many load test users and exit')
+    raise SystemExit(asyncio.run(main(arg_parser.parse_args())))
@@ -0,0 +1,95 @@
+"""
+Latency of an unrelated endpoint while pages are being parsed.
+
+Starts a local server with two routes: /scrape parses an anidub list page
+fixture through a ParsePool and /ping answers right away. Scrapes are fired
+concurrently while /ping is polled, once per executor type. The ping
+percentiles show how long the event loop stays blocked by parsing.
+
+    python -m benchmarks.parse_offloading --scrapes 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import time
+import aiohttp
+from aiohttp import web
+from benchmarks.fixtures import load_fixtures
+from src.parsers import anidub
+from src.utils.html import ParsePool
+from src.utils.stats import percentile
+
+
+async def run(executor: str, workers: int, scrapes: int, concurrency: int, port: int) -> dict:
+    html = load_fixtures()['anidub_page']
+    pool = ParsePool(executor=executor, workers=workers)
+    await pool.run(anidub.parse_titles_page, html)
+    app = web.Application()
+
+    async def scrape(request):
+        pages_count, titles = await pool.run(anidub.parse_titles_page, html)
+        return web.json_response({'titles': len(titles), 'pages': pages_count})
+
+    async def ping(request):
+        return web.json_response({'ok': True})
+
+    app.router.add_get('/scrape', scrape)
+    app.router.add_get('/ping', ping)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+
+    ping_latencies = []
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        remaining = scrapes
+        done = asyncio.Event()
+
+        async def scraper():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                async with session.get(f'http://127.0.0.1:{port}/scrape') as response:
+                    await response.read()
+
+        async def pinger():
+            while not done.is_set():
+                start = time.perf_counter()
+                async with session.get(f'http://127.0.0.1:{port}/ping') as response:
+                    await response.read()
+                ping_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.005)
+
+        start = time.perf_counter()
+        pinger_task = asyncio.create_task(pinger())
+        await asyncio.gather(*[scraper() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+        done.set()
+        await pinger_task
+    await runner.cleanup()
+    info = pool.info()
+    pool.shutdown()
+    return {
+        'scrapes_per_second': scrapes / elapsed,
+        'ping_p50': percentile(ping_latencies, 0.5) * 1000,
+        'ping_p99': percentile(ping_latencies, 0.99) * 1000,
+        'ping_max': percentile(ping_latencies, 1) * 1000,
+        'parse_p95': info['latency_p95_ms'],
+    }
+
+
+async def main(executors: list[str], workers: int, scrapes: int, concurrency: int, port: int):
+    print(f'{"executor":<10}{"scrapes/s":>11}{"ping p50 ms":>13}{"ping p99 ms":>13}{"ping max ms":>13}{"parse p95 ms":>14}')
+    for executor in executors:
+        result = await run(executor, workers, scrapes, concurrency, port)
+        print(f'{executor:<10}{result["scrapes_per_second"]:>11.1f}{result["ping_p50"]:>13.2f}{result["ping_p99"]:>13.2f}'
+              f'{result["ping_max"]:>13.2f}{result["parse_p95"]:>14.2f}')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--executors', nargs='+', default=['inline', 'thread', 'process'])
+    arg_parser.add_argument('--workers', type=int, default=2)
+    arg_parser.add_argument('--scrapes', type=int, default=200)
+    arg_parser.add_argument('--concurrency', type=int, default=16)
+    arg_parser.add_argument('--port', type=int, default=8791)
+    args = arg_parser.parse_args()
+    asyncio.run(main(args.executors, args.workers, args.scrapes, args.concurrency, args.port))
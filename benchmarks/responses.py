@@ -0,0 +1,85 @@
+"""
+Rendering time of the largest responses.
+
+A title with its episodes and the list and main pages are rendered the way
+FastAPI does for a response model: validated into the model and encoded, once
+with the previous JSONResponse and once with the ORJSONResponse default. The
+pages are also rendered from the JSON kept in the cache tier, as served by
+PreserializedJSONResponse on a cache hit, and the title with model_dump_json,
+as GET /titles/{id} serves it.
+
+    python -m benchmarks.responses --episodes 24 1000 --number 50
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import BaseModel
+from benchmarks.schemas import episode_model, parsed_title, title_model
+from src.schemas.parsers import Episode, MainPage, Title, TitlesPage, TitleShort
+from src.utils.responses import PreserializedJSONResponse
+
+
+def responses(episodes: int) -> dict[str, BaseModel]:
+    db_titles = [title_model(index) for index in range(60)]
+    title = parsed_title(episodes)
+    response = Title.model_validate(db_titles[0])
+    response.episodes = [Episode(id=episode.id, name=episode.name, number=episode.number, duration=episode.duration,
+                                 links=parsed.links, image_url=parsed.preview)
+                         for episode, parsed in zip([episode_model(db_titles[0], number) for number in range(1, episodes + 1)], title.episodes_list)]
+    response.recommended = [TitleShort.model_validate(item) for item in db_titles[1:9]]
+    titles = [TitleShort.model_validate(item) for item in db_titles]
+    return {
+        f'title, {episodes} episodes': response,
+        'titles page, 30 titles': TitlesPage(titles=titles[:30], total_pages=480),
+        'main page, 60 titles': MainPage(titles=titles, total_pages=480, pages_on_main=2),
+    }
+
+
+def renderers(model: BaseModel) -> dict[str, Callable[[], bytes]]:
+    loop = asyncio.new_event_loop()
+    field = create_response_field(name='response', type_=type(model), mode='serialization')
+
+    def fastapi(response_class) -> bytes:
+        content = loop.run_until_complete(serialize_response(field=field, response_content=model, is_coroutine=True))
+        return response_class(content).body
+
+    cached_body = model.model_dump_json()
+    result = {
+        'JSONResponse': lambda: fastapi(JSONResponse),
+        'ORJSONResponse': lambda: fastapi(ORJSONResponse),
+    }
+    if isinstance(model, Title):
+        # rendered per request, as the title holds the user's progress
+        result['preserialized'] = lambda: PreserializedJSONResponse(model.model_dump_json()).body
+    else:
+        result['preserialized'] = lambda: PreserializedJSONResponse((cached_body + ' ')[:-1], etag='etag').body
+    return result
+
+
+def main(episodes_sizes: list[int], number: int):
+    print(f'{"response":<26}{"renderer":>16}{"ms":>9}{"KB":>8}')
+    seen = set()
+    for episodes in episodes_sizes:
+        for name, model in responses(episodes).items():
+            if name in seen:
+                continue
+            seen.add(name)
+            for renderer, render in renderers(model).items():
+                body = render()
+                start = time.perf_counter()
+                for _ in range(number):
+                    render()
+                elapsed = (time.perf_counter() - start) / number
+                print(f'{name:<26}{renderer:>16}{elapsed * 1000:>9.2f}{len(body) // 1024:>8}')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--episodes', type=int, nargs='+', default=[24, 1000])
+    arg_parser.add_argument('--number', type=int, default=50)
+    args = arg_parser.parse_args()
+    main(args.episodes, args.number)
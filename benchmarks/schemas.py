@@ -0,0 +1,179 @@
+"""
+Time and allocations of the pydantic schema hot paths.
+
+Covers what a response builds per request: rehydrating cached list pages and
+titles in CacheService and Parser.get_title_data, validating ORM rows into
+TitleShort/Title/TitleEpisode and dumping a title for the cache or the
+response. Sizes are those of real responses: 30-title pages and titles with
+up to 1000 episodes. The *_validated cases are what the cache reads cost
+without the per-process rehydrated schemas, i.e. on the first read of a value.
+
+    python -m benchmarks.schemas --episodes 24 1000 --number 200
+    python -m benchmarks.schemas --cases page title_cache
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+import tracemalloc
+import uuid
+from typing import Callable
+from src.models.parsers import Episode as EpisodeModel, EpisodeSource as EpisodeSourceModel, Title as TitleModel
+from src.redis.services import CacheService
+from src.utils.parsers import short_titles, title_response
+from src.schemas.parsers import (
+    Episode, LinkParsedTitle, ParsedEpisode, ParsedLink, ParsedTitle, ParsedTitleShort, ParsedTitlesPage, Title, TitleEpisode, TitleShort)
+
+
+class MemoryRedis:
+    """Serves fixed values to CacheService, so only the rehydration is measured."""
+
+    def __init__(self, values: dict[str, str]) -> None:
+        self.values = values
+
+    async def get(self, key: str) -> str | None:
+        value = self.values.get(key)
+        # a new string per read, like a redis reply
+        return (value + ' ')[:-1] if value else value
+
+
+def parsed_title_short(index: int) -> ParsedTitleShort:
+    return ParsedTitleShort(
+        id_on_website=str(10000 + index),
+        name=f'Название тайтла {index}',
+        en_name=f'Title name {index}',
+        image_url=f'https://anidub.world/uploads/posts/{index}.jpg',
+        related_titles=[LinkParsedTitle(id_on_website=str(index * 10 + i), name=f'Связанный {i}') for i in range(3)],
+        additional_info='[01-12 из 12]',
+        genres_names=['экшен', 'приключения', 'фэнтези'],
+    )
+
+
+def parsed_title(episodes: int) -> ParsedTitle:
+    return ParsedTitle(
+        **parsed_title_short(0).model_dump(exclude={'recommended_titles'}),
+        description='Описание тайтла. ' * 40,
+        year='2024',
+        kind='tv',
+        recommended_titles=[parsed_title_short(index) for index in range(1, 9)],
+        episodes_list=[ParsedEpisode(
+            name=f'{number} серия',
+            number=number,
+            preview=f'https://api.animetop.info/preview/{number}.jpg',
+            links=[ParsedLink(name=quality, link=f'https://video.example/{number}/{quality}.mp4') for quality in ('720p', '480p')],
+        ) for number in range(1, episodes + 1)],
+    )
+
+
+def title_model(index: int) -> TitleModel:
+    return TitleModel(
+        id=uuid.uuid4(), id_on_website=str(10000 + index), parser_id='anidub', name=f'Название тайтла {index}',
+        en_name=f'Title name {index}', year='2024', kind='tv', image_url=f'https://anidub.world/uploads/posts/{index}.jpg')
+
+
+def episode_model(title: TitleModel, number: int) -> EpisodeModel:
+    episode = EpisodeModel(id=uuid.uuid4(), title_id=title.id, title=title, number=number, name=f'{number} серия', duration=1440)
+    episode.links = [EpisodeSourceModel(id=uuid.uuid4(), episode_id=episode.id, name='720p', link=f'https://video.example/{number}.mp4', is_m3u8=False)]
+    return episode
+
+
+def copy_dumped_fields(title: ParsedTitle, response: Title):
+    for key, value in title.model_dump().items():
+        if hasattr(response, key):
+            setattr(response, key, value)
+
+
+def cases(episodes: int) -> dict[str, Callable[[], object]]:
+    """
+    Returns the measured calls. Inputs are built once, outside the measured
+    call, the way they come out of redis or the database.
+    """
+    loop = asyncio.new_event_loop()
+    parsed_titles = [parsed_title_short(index) for index in range(30)]
+    page_json = json.dumps({'titles': [item.model_dump() for item in parsed_titles], 'total_pages': 480})
+    title = parsed_title(episodes)
+    title_json = json.dumps(title.model_dump())
+    service = CacheService(MemoryRedis({'anidub:titles:1': page_json, 'anidub:title:1': title_json}))
+    db_titles = [title_model(index) for index in range(30)]
+    db_title = db_titles[0]
+    db_episodes = [episode_model(db_title, number) for number in range(1, episodes + 1)]
+    response = Title.model_validate(db_title)
+    response.episodes = [Episode(id=episode.id, name=episode.name, number=episode.number, duration=episode.duration,
+                                 links=parsed.links, image_url=parsed.preview)
+                         for episode, parsed in zip(db_episodes, title.episodes_list)]
+    response.recommended = [TitleShort.model_validate(item) for item in db_titles[1:9]]
+
+    def title_episodes():
+        # TitleEpisode's validator prints the title image
+        with contextlib.redirect_stdout(io.StringIO()):
+            return [TitleEpisode.model_validate(episode, from_attributes=True) for episode in db_episodes[:30]]
+
+    return {
+        'page': lambda: loop.run_until_complete(service.get_titles('anidub', 1)),
+        'page_validated': lambda: ParsedTitlesPage.model_validate(json.loads((page_json + ' ')[:-1])),
+        'page_short': lambda: short_titles(list(zip(db_titles, parsed_titles))),
+        'title_cache': lambda: loop.run_until_complete(service.get_title('anidub', 1)),
+        'title_cache_validated': lambda: ParsedTitle.model_validate(json.loads((title_json + ' ')[:-1])),
+        'title_response': lambda: title_response(db_title, title),
+        'title_copy_dumped': lambda: copy_dumped_fields(title, response),
+        'title_dump': lambda: title.model_dump(),
+        'title_db': lambda: Title.model_validate(db_title),
+        'episodes': lambda: [Episode(id=episode.id, name=episode.name, number=episode.number, duration=episode.duration,
+                                     links=parsed.links, image_url=parsed.preview)
+                             for episode, parsed in zip(db_episodes, title.episodes_list)],
+        'title_episodes': title_episodes,
+        'response_dump': lambda: response.model_dump(mode='json'),
+    }
+
+
+DESCRIPTIONS = {
+    'page': 'CacheService.get_titles, 30 titles',
+    'page_validated': 'decoding and validating the page',
+    'page_short': 'short_titles, 30 titles',
+    'title_cache': 'CacheService.get_title',
+    'title_cache_validated': 'decoding and validating the title',
+    'title_response': 'Title from the parsed title',
+    'title_copy_dumped': 'parsed fields through model_dump',
+    'title_dump': 'ParsedTitle.model_dump',
+    'title_db': 'Title.model_validate(db_title)',
+    'episodes': 'Episode(...) per episode',
+    'title_episodes': 'TitleEpisode.model_validate x30',
+    'response_dump': 'Title response model_dump json',
+}
+
+
+def measure(call: Callable[[], object], number: int) -> dict:
+    call()
+    start = time.perf_counter()
+    for _ in range(number):
+        call()
+    elapsed = (time.perf_counter() - start) / number
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    result = call()
+    allocated = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot, 'filename') if stat.size_diff > 0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {'us': elapsed * 1e6, 'peak_kb': peak / 1024, 'retained_kb': allocated / 1024}
+
+
+def main(episodes_sizes: list[int], names: list[str] | None, number: int):
+    print(f'{"case":<22}{"episodes":>9}  {"what":<34}{"us/call":>11}{"peak KB":>10}{"result KB":>11}')
+    for episodes in episodes_sizes:
+        for name, call in cases(episodes).items():
+            if names and name not in names:
+                continue
+            row = measure(call, number)
+            print(f'{name:<22}{episodes:>9}  {DESCRIPTIONS[name]:<34}{row["us"]:>11.1f}{row["peak_kb"]:>10.1f}{row["retained_kb"]:>11.1f}')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--episodes', type=int, nargs='+', default=[24, 1000])
+    arg_parser.add_argument('--cases', nargs='+', choices=DESCRIPTIONS)
+    arg_parser.add_argument('--number', type=int, default=100)
+    args = arg_parser.parse_args()
+    main(args.episodes, args.cases, args.number)
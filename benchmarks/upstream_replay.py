@@ -0,0 +1,269 @@
+"""
+Stand-in for the parser upstreams: replays recorded responses of anidub,
+animevost, sibnet and shikimori so the parsers can be benchmarked and
+regression-tested without the live sites.
+
+The app is pointed at it with the upstream_replay_url setting, which makes
+every parser request https://<host>/<path> go to <replay url>/<host>/<path>,
+including the player and episode links the parsers find in pages. Bodies are
+served as recorded, so the links and ids the parsers extract stay the real ones.
+
+Recordings are JSON files in a directory, one per request, matched by method,
+host, path, query and form body. A recording without a form matches any body.
+
+    # proxy to the live sites and save what is missed
+    python -m benchmarks.upstream_replay --recordings recordings --record
+    # offline: generate recordings from the page fixtures
+    python -m benchmarks.upstream_replay --recordings /tmp/recordings --seed
+    # replay with 50±20 ms latency and 2% of 503 answers
+    python -m benchmarks.upstream_replay --recordings recordings --latency-ms 50 --jitter-ms 20 --error-rate 0.02
+
+and run the app with upstream_replay_url=http://localhost:8790.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import re
+from pathlib import Path
+import aiohttp
+from aiohttp import web
+from multidict import MultiDict
+from benchmarks.fixtures import GENRES, anidub_page, anidub_title, animevost_page
+
+SKIPPED_HEADERS = {'content-length', 'content-encoding', 'transfer-encoding', 'connection', 'set-cookie'}
+
+
+def request_key(method: str, host: str, path: str, query: list, form: list | None) -> str:
+    data = [method.upper(), host, path, sorted(map(list, query)), sorted(map(list, form)) if form is not None else None]
+    return hashlib.md5(json.dumps(data, ensure_ascii=False).encode()).hexdigest()
+
+
+class Recordings:
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.items: dict[str, dict] = {}
+        self.hosts: set[str] = set()
+        for path in self.directory.glob('*/*.json'):
+            self._index(json.loads(path.read_text(encoding='utf-8')))
+
+    def _index(self, recording: dict) -> str:
+        key = request_key(recording['method'], recording['host'], recording['path'], recording['query'], recording['form'])
+        self.items[key] = recording
+        self.hosts.add(recording['host'])
+        return key
+
+    def add(self, method: str, host: str, path: str, query: list | None = None, form: list | None = None,
+            status: int = 200, headers: dict | None = None, body: str | bytes = '') -> dict:
+        recording = {
+            'method': method.upper(), 'host': host, 'path': path, 'query': query or [], 'form': form,
+            'status': status, 'headers': headers or {},
+        }
+        if isinstance(body, bytes):
+            try:
+                recording['body'] = body.decode('utf-8')
+            except UnicodeDecodeError:
+                recording['body_base64'] = base64.b64encode(body).decode()
+        else:
+            recording['body'] = body
+        key = self._index(recording)
+        (self.directory / host).mkdir(exist_ok=True)
+        (self.directory / host / f'{key}.json').write_text(json.dumps(recording, ensure_ascii=False), encoding='utf-8')
+        return recording
+
+    def find(self, method: str, host: str, path: str, query: list, form: list | None) -> dict | None:
+        return self.items.get(request_key(method, host, path, query, form)) or self.items.get(request_key(method, host, path, query, None))
+
+
+class ReplayServer:
+    def __init__(self, recordings: Recordings, record: bool = False, latency_ms: float = 0, jitter_ms: float = 0,
+                 error_rate: float = 0, error_status: int = 503, seed: int | None = None) -> None:
+        """
+        :param record: Fetch requests that have no recording from the live host and save them.
+        :param latency_ms: Delay added to every response.
+        :param jitter_ms: Maximal random deviation of the delay.
+        :param error_rate: Share of requests answered with `error_status`.
+        """
+        self.recordings = recordings
+        self.record = record
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.stats = {'served': 0, 'not_modified': 0, 'missing': 0, 'errors': 0, 'recorded': 0}
+        self._session: aiohttp.ClientSession | None = None
+
+    async def _fetch(self, request: web.Request, host: str, path: str, raw_path: str, form: list | None) -> dict:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(auto_decompress=True)
+        headers = {name: value for name, value in request.headers.items()
+                   if name.lower() in ('accept', 'accept-language', 'user-agent', 'referer', 'content-type')}
+        body = await request.read()
+        async with self._session.request(request.method, f'https://{host}{raw_path}', headers=headers, data=body or None, allow_redirects=False) as response:
+            content = await response.read()
+            kept = {name: value for name, value in response.headers.items() if name.lower() not in SKIPPED_HEADERS}
+        self.stats['recorded'] += 1
+        return self.recordings.add(request.method, host, path, list(request.query.items()), form,
+                                   status=response.status, headers=kept, body=content)
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        host, _, path = request.path[1:].partition('/')
+        path = f'/{path}'
+        delay = max(0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            return web.Response(status=self.error_status, text='injected error')
+        form = None
+        if request.content_type == 'application/x-www-form-urlencoded':
+            form = list((await request.post()).items())
+        query = list(request.query.items())
+        recording = self.recordings.find(request.method, host, path, query, form)
+        if recording is None and self.record:
+            raw_path = request.raw_path[1:].partition('/')[2]
+            recording = await self._fetch(request, host, path, f'/{raw_path}', form)
+        if recording is None:
+            self.stats['missing'] += 1
+            return web.Response(status=404, text=f'no recording for {request.method} {host}{path}')
+        headers = MultiDict(recording['headers'])
+        etag = headers.get('ETag')
+        if etag and request.headers.get('If-None-Match') == etag:
+            self.stats['not_modified'] += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        self.stats['served'] += 1
+        if 'body_base64' in recording:
+            return web.Response(status=recording['status'], headers=headers, body=base64.b64decode(recording['body_base64']))
+        return web.Response(status=recording['status'], headers=headers, body=recording['body'].encode())
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/_replay/stats', self.get_stats)
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8790) -> web.AppRunner:
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+
+
+def _html(body: str) -> dict:
+    return {'Content-Type': 'text/html; charset=utf-8', 'ETag': f'"{hashlib.md5(body.encode()).hexdigest()}"'}
+
+
+def _json(data) -> tuple[dict, str]:
+    return {'Content-Type': 'application/json'}, json.dumps(data, ensure_ascii=False)
+
+
+def seed_recordings(recordings: Recordings, pages: int = 5, seed: int = 1):
+    """
+    Fills `recordings` with responses generated from the page fixtures: list,
+    genre and title pages, the mobile and v1 apis, sibnet players and an empty
+    shikimori search, enough for every parser endpoint to work offline.
+    """
+    rng = random.Random(seed)
+
+    def page(host: str, path: str, body: str, method: str = 'GET', query: list | None = None, form: list | None = None):
+        recordings.add(method, host, path, query, form, headers=_html(body), body=body)
+
+    # anidub: the main page titles come from the mobile api, the other pages from html
+    main_posts = []
+    for index in range(30):
+        title_id = str(rng.randint(1000, 99999))
+        name = f'Main Title {index} / Main Title {index} En [{rng.randint(1, 12):02d} из 12]'
+        genres = ', '.join(rng.sample(GENRES, 3))
+        main_posts.append({'id': title_id, 'title': name, 'xfields': f'genre|{genres}||poster|{title_id}.jpg&w=300'})
+    headers, body = _json(main_posts)
+    recordings.add('GET', 'isekai.anidub.fun', '/mobile-api.php', [['name', 'main_posts']], headers=headers, body=body)
+    title_ids = [post['id'] for post in main_posts]
+    for number in range(1, pages + 1):
+        body = anidub_page(rng, pages=pages)
+        page('anidub.world', '/' if number == 1 else f'/page/{number}/', body)
+        title_ids += re.findall(r'anime_tv/(\d+)-slug\.html', body)
+    for genre in GENRES:
+        page('anidub.world', f'/xfsearch/genre/{genre}/', anidub_page(rng, pages=pages))
+        for number in range(2, pages + 1):
+            page('anidub.world', f'/xfsearch/genre/{genre}/page/{number}/', anidub_page(rng, pages=pages))
+    for title_id in dict.fromkeys(title_ids):
+        body = anidub_title(rng)
+        page('anidub.world', '/index.php', body, query=[['newsid', title_id]])
+        for video_id in re.findall(r'videoid=(\d+)', body):
+            player = f'<html><body><script>player.src([{{src: "/v/{video_id[:3]}/{video_id}.mp4"}}]);</script></body></html>'
+            page('video.sibnet.ru', '/shell.php', player, query=[['videoid', video_id]])
+            recordings.add('HEAD', 'video.sibnet.ru', f'/v/{video_id[:3]}/{video_id}.mp4', status=302,
+                           headers={'Location': f'//dv.sibnet.ru/{video_id}.mp4'})
+
+    # animevost: html lists, genres posted without a body, v1 api per title
+    title_ids = []
+    for number in range(1, pages + 1):
+        body = animevost_page(rng, pages=pages)
+        page('v5.vost.pw', '/' if number == 1 else f'/page/{number}/', body)
+        title_ids += re.findall(r'animevost\.org/tip/tv/(\d+)-slug\.html">[^<]+</a></h2>', body)
+    for index in range(len(GENRES)):
+        page('v5.vost.pw', f'/zhanr/genre{index}', animevost_page(rng, pages=pages), method='POST')
+        for number in range(2, pages + 1):
+            page('v5.vost.pw', f'/zhanr/genre{index}/page/{number}/', animevost_page(rng, pages=pages), method='POST')
+    page('v5.vost.pw', '/index.php', animevost_page(rng, pages=pages), method='POST', query=[['do', 'search']])
+    for title_id in dict.fromkeys(title_ids):
+        episodes = rng.randint(1, 24)
+        headers, body = _json({'data': [{
+            'title': f'Title {title_id} / Title {title_id} En [1-{episodes} из 24]',
+            'description': 'Описание<br>' * 20,
+            'year': str(rng.randint(2000, 2024)),
+            'genre': ', '.join(rng.sample(GENRES, 3)),
+            'type': 'ТВ',
+            'urlImagePreview': f'/uploads/posts/{title_id}.jpg',
+        }]})
+        recordings.add('POST', 'api.animetop.info', '/v1/info', form=[['id', title_id]], headers=headers, body=body)
+        headers, body = _json([{
+            'name': f'{number} серия',
+            'preview': f'/preview/{title_id}/{number}.jpg',
+            'hd': f'/video/{title_id}/{number}/720.mp4',
+            'std': f'/video/{title_id}/{number}/480.mp4',
+        } for number in range(1, episodes + 1)])
+        recordings.add('POST', 'api.animetop.info', '/v1/playlist', form=[['id', title_id]], headers=headers, body=body)
+
+    headers, body = _json({'data': {'t0': []}})
+    recordings.add('POST', 'shikimori.one', '/api/graphql', headers=headers, body=body)
+
+
+async def main(args: argparse.Namespace):
+    recordings = Recordings(Path(args.recordings))
+    if args.seed:
+        seed_recordings(recordings, pages=args.pages)
+    server = ReplayServer(recordings, record=args.record, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                          error_rate=args.error_rate, error_status=args.error_status)
+    await server.start(args.host, args.port)
+    print(f'Replaying {len(recordings.items)} recordings of {", ".join(sorted(recordings.hosts))} on http://{args.host}:{args.port}')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--recordings', default='recordings')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8790)
+    arg_parser.add_argument('--record', action='store_true')
+    arg_parser.add_argument('--seed', action='store_true')
+    arg_parser.add_argument('--pages', type=int, default=5)
+    arg_parser.add_argument('--latency-ms', type=float, default=0)
+    arg_parser.add_argument('--jitter-ms', type=float, default=0)
+    arg_parser.add_argument('--error-rate', type=float, default=0)
+    arg_parser.add_argument('--error-status', type=int, default=503)
+    asyncio.run(main(arg_parser.parse_args()))
@@ -0,0 +1,96 @@
+"""
+Per-task overhead of the worker runtime compared with the old task model.
+
+Old model: every task calls run_until_complete on the thread's loop and opens
+its own aiohttp session. New model: tasks are submitted from a thread pool
+(the Celery threads pool) to the shared runtime loop and reuse one session.
+
+    python -m benchmarks.worker_runtime --tasks 500 --concurrency 16
+"""
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+from aiohttp import web
+from src.utils.http import http_session
+from src.utils.runtime import WorkerRuntime
+
+REQUESTS_PER_TASK = 3
+
+
+async def handler(request):
+    await asyncio.sleep(float(request.query.get('delay', 0)))
+    return web.Response(text='ok')
+
+
+def start_server(port: int, loop: asyncio.AbstractEventLoop):
+    app = web.Application()
+    app.router.add_get('/', handler)
+    runner = web.AppRunner(app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', port).start())
+    return runner
+
+
+async def old_task(url: str):
+    for _ in range(REQUESTS_PER_TASK):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as response:
+                await response.text()
+
+
+async def new_task(url: str):
+    async with http_session() as session:
+        for _ in range(REQUESTS_PER_TASK):
+            async with session.get(url) as response:
+                await response.text()
+
+
+def bench_old(url: str, tasks: int) -> float:
+    loop = asyncio.new_event_loop()
+    start = time.perf_counter()
+    for _ in range(tasks):
+        loop.run_until_complete(old_task(url))
+    elapsed = time.perf_counter() - start
+    loop.close()
+    return elapsed
+
+
+def bench_new(url: str, tasks: int, concurrency: int) -> float:
+    runtime = WorkerRuntime()
+    runtime.start()
+    runtime.run(new_task(url))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda _: runtime.run(new_task(url)), range(tasks)))
+    elapsed = time.perf_counter() - start
+    runtime.stop()
+    return elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--tasks', type=int, default=500)
+    arg_parser.add_argument('--concurrency', type=int, default=16)
+    arg_parser.add_argument('--delay', type=float, default=0.0,
+                            help='simulated upstream latency in seconds')
+    arg_parser.add_argument('--port', type=int, default=8765)
+    args = arg_parser.parse_args()
+
+    server_loop = asyncio.new_event_loop()
+    runner = start_server(args.port, server_loop)
+    threading.Thread(target=server_loop.run_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{args.port}/?delay={args.delay}'
+
+    old = bench_old(url, args.tasks)
+    new = bench_new(url, args.tasks, args.concurrency)
+    print(f'{"model":<10}{"total s":>10}{"ms/task":>10}{"tasks/s":>10}')
+    for name, elapsed in (('old', old), ('runtime', new)):
+        print(f'{name:<10}{elapsed:>10.2f}{elapsed / args.tasks * 1000:>10.2f}{args.tasks / elapsed:>10.1f}')
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), server_loop).result()
+
+
+if __name__ == '__main__':
+    main()
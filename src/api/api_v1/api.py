@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from src.api.api_v1 import auth
-from src.api.api_v1 import parsers, titles, genres, episodes, users, files, messages
+from src.api.api_v1 import parsers, titles, genres, episodes, users, files, messages, metrics
 api_router = APIRouter()
 
 api_router.include_router(auth.api_router)
@@ -11,3 +11,4 @@ api_router.include_router(parsers.api_router)
 api_router.include_router(titles.api_router)
 api_router.include_router(genres.api_router)
 api_router.include_router(episodes.api_router)
+api_router.include_router(metrics.api_router)
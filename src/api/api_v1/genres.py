@@ -21,7 +21,7 @@ async def get_genre_titles(background_tasks: BackgroundTasks, genre_id: UUID, pa
     if not existing_genre:
         raise HTTPException(status_code=404, detail="Genre not found.")
     parser = parsers_dict[existing_genre.parser_id]
-    return await parser.get_genre(
+    return await parser.get_genre_response(
         db_genre=existing_genre,
         page=page,
         background_tasks=background_tasks,
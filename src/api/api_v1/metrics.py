@@ -0,0 +1,101 @@
+from fastapi import APIRouter, Depends
+from src.parsers import parsers
+from src.redis.services import CacheService
+from src.users_controller import current_superuser
+from src.utils.compression import compressed_bodies
+from src.utils.html import parse_pool
+from src.utils.tasks import get_service
+from src.utils.upstream import upstreams
+from src.worker import CRAWL_QUEUE, INTERACTIVE_QUEUE, PRIORITY_STEPS, scheduler
+api_router = APIRouter(prefix="/metrics", tags=["metrics"], dependencies=[Depends(current_superuser)])
+
+
+async def get_cache_service() -> CacheService:
+    return await get_service()
+
+
+@api_router.get("/durations", response_model=dict)
+async def get_durations_metrics(service: CacheService = Depends(get_cache_service)):
+    stats = await service.get_stats("durations")
+    dispatched = stats.get("dispatched", 0)
+    suppressed = stats.get("suppressed", 0)
+    requested = dispatched + suppressed
+    return {
+        'queue_depth': await service.get_queue_length(INTERACTIVE_QUEUE, PRIORITY_STEPS),
+        'dispatched': dispatched,
+        'suppressed': suppressed,
+        'suppression_ratio': suppressed / requested if requested else 0,
+    }
+
+
+@api_router.get("/shikimori-names", response_model=dict)
+async def get_shikimori_names_metrics(service: CacheService = Depends(get_cache_service)):
+    stats = await service.get_stats("shikimori_names")
+    hits = stats.get("hits", 0)
+    misses = stats.get("misses", 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / lookups if lookups else 0,
+    }
+
+
+@api_router.get("/shikimori-cache", response_model=dict)
+async def get_shikimori_cache_metrics(service: CacheService = Depends(get_cache_service)):
+    stats = await service.get_stats("shikimori_cache")
+    metrics = {}
+    for prefix, name in (("", "titles"), ("ongoings_", "ongoings")):
+        hits = stats.get(f"{prefix}hits", 0)
+        misses = stats.get(f"{prefix}misses", 0)
+        metrics[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0,
+        }
+    return metrics
+
+
+@api_router.get("/queues", response_model=dict)
+async def get_queues_metrics(service: CacheService = Depends(get_cache_service)):
+    return {queue: await service.get_queue_length(queue, PRIORITY_STEPS) for queue in (INTERACTIVE_QUEUE, CRAWL_QUEUE)}
+
+
+@api_router.get("/tasks", response_model=dict)
+async def get_tasks_metrics(service: CacheService = Depends(get_cache_service)):
+    return {'dropped_duplicates': await service.get_stats("dropped_tasks")}
+
+
+@api_router.get("/scheduler", response_model=list[dict])
+async def get_scheduler_metrics(service: CacheService = Depends(get_cache_service)):
+    return await scheduler.get_jobs_info(service)
+
+
+@api_router.get("/upstreams", response_model=dict)
+async def get_upstreams_metrics():
+    return {name: upstream.info() for name, upstream in upstreams.items()}
+
+
+@api_router.get("/parsing", response_model=dict)
+async def get_parsing_metrics():
+    return parse_pool.info()
+
+
+@api_router.get("/compression", response_model=dict)
+async def get_compression_metrics():
+    return compressed_bodies.info()
+
+
+@api_router.get("/conditional-get", response_model=dict)
+async def get_conditional_get_metrics(service: CacheService = Depends(get_cache_service)):
+    stats = await service.get_stats("conditional_get")
+    metrics = {}
+    for parser in parsers:
+        not_modified = stats.get(f"{parser.parser_id}:not_modified", 0)
+        changed = stats.get(f"{parser.parser_id}:changed", 0)
+        metrics[parser.parser_id] = {
+            'not_modified': not_modified,
+            'changed': changed,
+            'short_circuit_ratio': not_modified / (not_modified + changed) if not_modified + changed else 0,
+        }
+    return metrics
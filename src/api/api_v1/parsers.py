@@ -6,8 +6,9 @@ from src.crud.titles_crud import TitlesCrud
 from src.db.session import get_async_session, AsyncSession
 from src.schemas.parsers import Genre, MainPage, ParserInfo,  TitlesPage
 from src.parsers import parsers, parsers_dict, ParserId
-from src.worker import prepare_all_parser_titles_wrapper
+from src.worker import match_titles_wrapper, prepare_all_parser_titles_wrapper
 from src.users_controller import current_superuser
+from src.utils.crawler import Crawler
 
 
 api_router = APIRouter(prefix="/parsers", tags=["parsers"])
@@ -31,7 +32,7 @@ async def get_parsers():
 @api_router.get("/{parser_id}/titles", response_model=TitlesPage)
 async def get_titles(parser_id: ParserId, background_tasks: BackgroundTasks, page: int = Query(1, ge=1), db: AsyncSession = Depends(get_async_session)):  # type: ignore
     parser = parsers_dict[parser_id]
-    return await parser.get_titles(
+    return await parser.get_titles_response(
         page=page,
         background_tasks=background_tasks,
         db=db
@@ -60,10 +61,7 @@ async def resolve_old_id(parser_id: ParserId, genre_name: str, db: AsyncSession
 @api_router.get("/{parser_id}/titles/main", response_model=MainPage)
 async def get_main_titles(parser_id: ParserId, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_session)):  # type: ignore
     parser = parsers_dict[parser_id]
-    page = await parser.get_main_titles(background_tasks=background_tasks, db=db)
-    page_obj = MainPage.model_validate(page, from_attributes=True)
-    page_obj.pages_on_main = parser.main_pages_count
-    return page_obj
+    return await parser.get_main_titles_response(background_tasks=background_tasks, db=db)
 
 
 @api_router.get("/{parser_id}/genres", response_model=list[Genre])
@@ -73,6 +71,20 @@ async def get_genres(parser_id: ParserId, background_tasks: BackgroundTasks, db:
 
 
 @api_router.post("/{parser_id}/prepare-all-titles")
-async def prepare_all_titles(parser_id: ParserId, current_user=Depends(current_superuser)):  # type: ignore
-    prepare_all_parser_titles_wrapper.apply_async((parser_id, ))
+async def prepare_all_titles(parser_id: ParserId, restart: bool = False, current_user=Depends(current_superuser)):  # type: ignore
+    if not await prepare_all_parser_titles_wrapper.enqueue((parser_id, restart)):
+        return {"message": "Preparing titles already started."}
     return {"message": "Preparing titles started."}
+
+
+@api_router.get("/{parser_id}/prepare-all-titles", response_model=dict)
+async def get_prepare_all_titles_progress(parser_id: ParserId, current_user=Depends(current_superuser)):  # type: ignore
+    parser = parsers_dict[parser_id]
+    return await Crawler(parser, await parser.get_service()).progress()
+
+
+@api_router.post("/match-titles")
+async def match_titles(current_user=Depends(current_superuser)):
+    if not await match_titles_wrapper.enqueue():
+        return {"message": "Matching titles already started."}
+    return {"message": "Matching titles started."}
@@ -5,8 +5,9 @@ from src.db.session import get_async_session, AsyncSession
 from src.schemas.parsers import SearchTitle, TitleEpisodes, FavoriteTitle, Title
 from src.parsers import parsers_dict
 from src.users_controller import optional_current_user, current_active_user, current_superuser
-from src.worker import get_episodes_duration
+from src.worker import dispatch_episodes_duration
 from src.utils.titles import TitlesService
+from src.utils.responses import PreserializedJSONResponse
 api_router = APIRouter(prefix="/titles", tags=["titles"])
 
 
@@ -64,13 +65,11 @@ async def get_title(background_tasks: BackgroundTasks, title_id: UUID, db: Async
         background_tasks=background_tasks,
         current_user=current_user
     )
-    episodes = title_obj.episodes
-    has_no_time = any(not episode.duration for episode in episodes)
-    if has_no_time:
-        get_episodes_duration.apply_async(
-            args=[[episode.model_dump() for episode in episodes]]
-        )
-    return title_obj
+    service = await parser.get_service()
+    await dispatch_episodes_duration(
+        parser_id=parser.parser_id, title_id=db_title.id, episodes=title_obj.episodes, service=service)
+    # title_obj is already a Title, so response_model only documents the schema
+    return PreserializedJSONResponse(title_obj.model_dump_json())
 
 
 @api_router.get("/{title_id}/episodes", response_model=TitleEpisodes)
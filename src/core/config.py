@@ -30,9 +30,50 @@ class Settings(BaseSettings):
     GITHUB_CLIENT_SECRET: str
 
     SHIKIMORI_EXPIRATION_HOURS: int = 24
+    shikimori_requests_per_minute: int = 90
+    shikimori_batch_size: int = 10
+    shikimori_refresh_interval_minutes: int = 60
+    shikimori_refresh_top: int = 200
+    shikimori_refresh_ahead_days: int = 6
+    popular_ongoings_refresh_pages: int = 3
+    popular_ongoings_refresh_ahead_hours: int = 3
     titles_cache_hours: int = 24
     genres_cache_hours: int = 24 * 7
     USERS_OPEN_REGISTRATION: bool = True
+    duration_probe_host_limit: int = 4
+    duration_probe_timeout_seconds: int = 60 * 10
+    duration_probe_backoff_seconds: int = 60
+    duration_probe_max_backoff_seconds: int = 60 * 60 * 24
+    duration_probe_max_attempts: int = 8
+    title_match_threshold: float = 0.6
+    task_lock_timeout_seconds: int = 60 * 60
+    scheduler_tick_seconds: int = 15
+    scheduler_jitter_ratio: float = 0.1
+    parser_check_interval_minutes: int = 10
+    title_match_interval_hours: int = 24
+    cache_maintenance_interval_hours: int = 6
+    crawl_chunk_pages: int = 20
+    crawl_concurrency: int = 4
+    crawl_requests_per_second: int = 4
+    incremental_crawl_max_pages: int = 50
+    incremental_crawl_stop_run: int = 20
+    upstream_requests_per_second: float = 10
+    upstream_burst: int = 20
+    upstream_initial_concurrency: int = 8
+    upstream_max_concurrency: int = 32
+    upstream_latency_target_seconds: float = 3
+    upstream_failure_threshold: int = 5
+    upstream_reset_timeout_seconds: int = 30
+    html_parser_backend: str = "lxml"
+    html_parse_executor: str = "process"
+    html_parse_workers: int = 2
+    upstream_replay_url: str = ""
+    rehydrated_cache_size: int = 256
+    response_cache_seconds: int = 300
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 5
+    compression_cache_size: int = 512
 
     shikimori_kinds: List[str] = ["tv", "movie", "ova", "ona", "special",
                                   "tv_special", "music", "pv", "cm", "tv_13", "tv_24", "tv_48"]
@@ -1,5 +1,5 @@
 from uuid import UUID
-from sqlalchemy import func, select
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import selectinload
 from src.schemas.parsers import HistoryDay, TitleEpisode
 from src.crud.base import BaseCRUD
@@ -89,6 +89,20 @@ class EpisodesCrud(BaseCRUD):
         episode.duration_fetched = True
         return await self.update(episode)
 
+    async def get_episodes_ids_without_duration(self, episodes_ids: list[UUID]) -> set[UUID]:
+        query = select(Episode.id).where(
+            Episode.id.in_(episodes_ids), Episode.duration_fetched.isnot(True))
+        return set((await self.db.execute(query)).scalars().all())
+
+    async def update_episodes_duration(self, durations: dict[UUID, int | None]):
+        if not durations:
+            return
+        await self.db.execute(update(Episode), [
+            {'id': episode_id, 'duration': duration, 'duration_fetched': True}
+            for episode_id, duration in durations.items()
+        ])
+        await self.db.commit()
+
     async def get_current_title_episode(self, title_id: UUID, user_id: UUID) -> CurrentEpisode:
         query = select(CurrentEpisode).join(Episode, Episode.id == CurrentEpisode.episode_id).join(
             Title, Title.id == Episode.title_id).where(Title.id == title_id, CurrentEpisode.user_id == user_id)
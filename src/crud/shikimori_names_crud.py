@@ -0,0 +1,23 @@
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from src.crud.base import BaseCRUD
+from src.models.parsers import ShikimoriName
+
+
+class ShikimoriNamesCrud(BaseCRUD):
+
+    async def get_shikimori_ids(self, names: list[str]) -> dict[str, int]:
+        if not names:
+            return {}
+        query = select(ShikimoriName).where(ShikimoriName.name.in_(names))
+        return {row.name: row.shikimori_id for row in (await self.db.execute(query)).scalars().all()}
+
+    async def add_shikimori_ids(self, shikimori_ids: dict[str, int]):
+        if not shikimori_ids:
+            return
+        query = insert(ShikimoriName).values([
+            {'name': name, 'shikimori_id': shikimori_id}
+            for name, shikimori_id in shikimori_ids.items()
+        ]).on_conflict_do_nothing(index_elements=[ShikimoriName.name])
+        await self.db.execute(query)
+        await self.db.commit()
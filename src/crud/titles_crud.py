@@ -1,10 +1,14 @@
-from uuid import UUID
-from sqlalchemy import String, case, cast, func, select
+from uuid import UUID, uuid4
+from sqlalchemy import String, cast, delete, func, insert, select, update
 from src.crud.base import BaseCRUD
-from src.models.parsers import FavoriteTitle, Title, RelatedLink, RelatedTitle
+from src.models.parsers import FavoriteTitle, Title, RelatedLink, RelatedTitle, TitleMatch
 from src.schemas.parsers import LinkParsedTitle, ParsedTitleShort, ParsedTitle, FavoriteTitle as FavoriteTitleShema, SearchTitle, TitleShortLink
 
 
+def title_group_key():
+    return func.coalesce(cast(Title.shikimori_id, String), Title.match_key, cast(Title.id, String))
+
+
 class TitlesCrud(BaseCRUD):
 
     async def get_titles_by_website_ids(self, website_ids: list[str]) -> list[Title]:
@@ -13,10 +17,7 @@ class TitlesCrud(BaseCRUD):
 
     async def search_titles(self, query: str,  page_size: int = 20) -> list[Title]:
         query = select(
-            case(
-                (Title.shikimori_id.isnot(None), cast(Title.shikimori_id, String)),
-                else_=cast(Title.id, String)
-            ).label('group_id'),
+            title_group_key().label('group_id'),
             func.array_agg(
                 func.row(*[getattr(Title, col).label(col)
                          for col in FavoriteTitleShema.model_fields])
@@ -67,6 +68,38 @@ class TitlesCrud(BaseCRUD):
         )
         return await self.create(title)
 
+    async def upsert_titles(self, titles: list[ParsedTitleShort], parser_id: str) -> list[Title]:
+        titles = list({title.id_on_website: title for title in titles}.values())
+        website_ids = [title.id_on_website for title in titles]
+        query = select(Title).where(Title.parser_id == parser_id, Title.id_on_website.in_(website_ids))
+        existing = {title.id_on_website: title for title in (await self.db.execute(query)).scalars().all()}
+        created = [{
+            'id': uuid4(),
+            'id_on_website': title.id_on_website,
+            'parser_id': parser_id,
+            'name': title.name,
+            'en_name': title.en_name,
+            'image_url': title.image_url,
+            'year': title.year,
+            'kind': title.kind,
+        } for title in titles if title.id_on_website not in existing]
+        changed = [{
+            'id': db_title.id,
+            'name': title.name,
+            'en_name': title.en_name or db_title.en_name,
+            'image_url': title.image_url or db_title.image_url,
+            'year': title.year or db_title.year,
+            'kind': title.kind or db_title.kind,
+        } for title in titles if (db_title := existing.get(title.id_on_website)) and (
+            db_title.name != title.name or (title.en_name and db_title.en_name != title.en_name) or (title.image_url and db_title.image_url != title.image_url)
+            or (title.year and db_title.year != title.year) or (title.kind and db_title.kind != title.kind))]
+        if created:
+            await self.db.execute(insert(Title), created)
+        if changed:
+            await self.db.execute(update(Title), changed)
+        await self.db.commit()
+        return (await self.db.execute(query.execution_options(populate_existing=True))).scalars().all()
+
     async def get_related_link_by_title_id(self, title_id: UUID) -> RelatedLink:
         query = select(RelatedLink).join(RelatedTitle, RelatedLink.id ==
                                          RelatedTitle.link_id).where(RelatedTitle.title_id == title_id)
@@ -99,6 +132,10 @@ class TitlesCrud(BaseCRUD):
         db_title.image_url = title.image_url
         if title.en_name:
             db_title.en_name = title.en_name
+        if title.year:
+            db_title.year = title.year
+        if title.kind:
+            db_title.kind = title.kind
         return await self.update(db_title)
 
     async def update_shikimori_info(self, db_title: Title, shikimori_id: int) -> Title:
@@ -106,19 +143,50 @@ class TitlesCrud(BaseCRUD):
         db_title.shikimori_fetched = True
         return await self.update(db_title)
 
+    async def update_shikimori_ids(self, shikimori_ids: dict[UUID, int | None]):
+        if not shikimori_ids:
+            return
+        await self.db.execute(update(Title), [
+            {'id': title_id, 'shikimori_id': shikimori_id, 'shikimori_fetched': True}
+            for title_id, shikimori_id in shikimori_ids.items()
+        ])
+        await self.db.commit()
+
+    async def get_titles_by_ids(self, titles_ids: list[UUID]) -> list[Title]:
+        query = select(Title).where(Title.id.in_(titles_ids)).execution_options(populate_existing=True)
+        return (await self.db.execute(query)).scalars().all()
+
     async def get_title_by_id(self, title_id: UUID) -> Title:
         query = select(Title).where(Title.id == title_id)
         return (await self.db.execute(query)).scalar()
 
     async def get_title_on_other_parsers(self, title: Title) -> list[Title]:
-        if not title.shikimori_id:
+        group_key = str(title.shikimori_id) if title.shikimori_id else title.match_key
+        if not group_key:
             return []
         query = select(Title).where(
-            Title.shikimori_id == title.shikimori_id,
+            title_group_key() == group_key,
             Title.parser_id != title.parser_id, Title.id != title.id
         )
         return (await self.db.execute(query)).scalars().all()
 
+    async def get_titles_for_matching(self):
+        query = select(Title.id, Title.parser_id, Title.name, Title.en_name,
+                       Title.year, Title.kind, Title.shikimori_id)
+        return (await self.db.execute(query)).all()
+
+    async def replace_title_matches(self, matches: list[dict], match_keys: dict[UUID, str]):
+        await self.db.execute(delete(TitleMatch))
+        if matches:
+            await self.db.execute(insert(TitleMatch), matches)
+        await self.db.execute(update(Title).where(Title.match_key.isnot(None)).values(match_key=None))
+        if match_keys:
+            await self.db.execute(update(Title), [
+                {'id': title_id, 'match_key': match_key}
+                for title_id, match_key in match_keys.items()
+            ])
+        await self.db.commit()
+
     async def get_titles_by_shikimori_id(self, shikimori_id: int) -> list[Title]:
         query = select(Title).where(Title.shikimori_id == shikimori_id)
         return (await self.db.execute(query)).scalars().all()
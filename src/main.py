@@ -1,6 +1,7 @@
 from contextlib import asynccontextmanager
 from pathlib import Path
 from fastapi import FastAPI, applications
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.cors import CORSMiddleware
 from src.redis.containers import Container
@@ -9,11 +10,15 @@ from src.core.config import settings
 from src.db.init import init_superuser
 from src.db.session import create_db_and_tables
 from src.utils.files import init_folders
+from src.utils.compression import CompressionMiddleware
+from src.utils.html import parse_pool
+from src.utils.http import close_http_sessions
 import src.models.event_watcher
 from fastapi.openapi.docs import get_swagger_ui_html
 
 app = FastAPI(title=settings.PROJECT_NAME,
-              openapi_url=f"{settings.API_V1_STR}/openapi.json")
+              openapi_url=f"{settings.API_V1_STR}/openapi.json",
+              default_response_class=ORJSONResponse)
 print(Path("static/swagger-ui.css").exists())
 if Path("static/swagger-ui.css").exists() and Path("static/swagger-ui-bundle.js").exists():
     app.mount("/assets", StaticFiles(directory='static'), name="static")
@@ -40,8 +45,11 @@ async def lifespan_wrapper(app):
     init_folders()
     async with main_app_lifespan(app) as maybe_state:
         yield maybe_state
+    await close_http_sessions()
+    parse_pool.shutdown()
 
 app.router.lifespan_context = lifespan_wrapper
+app.add_middleware(CompressionMiddleware)
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
         CORSMiddleware,
@@ -1,4 +1,4 @@
 from src.models.users import User, OAuthAccount
-from src.models.parsers import Title, Episode, EpisodeProgress, CurrentEpisode, FavoriteTitle, Genre, RelatedTitle, RelatedLink
+from src.models.parsers import Title, Episode, EpisodeProgress, CurrentEpisode, FavoriteTitle, Genre, RelatedTitle, RelatedLink, ShikimoriName, TitleMatch
 from src.models.files import Image
 from src.models.messages import Message
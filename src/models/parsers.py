@@ -1,6 +1,6 @@
 from uuid import uuid4
 from src.db.base import Base
-from sqlalchemy import UUID,  Column, Integer, String, DateTime, func, ForeignKey, Boolean
+from sqlalchemy import UUID,  Column, Integer, String, DateTime, func, ForeignKey, Boolean, Float, Index, cast
 from sqlalchemy.orm import relationship, Mapped
 
 
@@ -12,8 +12,11 @@ class Title(Base):
     parser_id = Column(String, nullable=False)
     name = Column(String, nullable=False)
     en_name = Column(String, nullable=True)
+    year = Column(String, nullable=True)
+    kind = Column(String, nullable=True)
     shikimori_fetched = Column(Boolean, default=False)
     shikimori_id = Column(Integer, nullable=True)
+    match_key = Column(String, nullable=True)
     updated_at = Column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -26,6 +29,10 @@ class Title(Base):
     image_url = Column(String)
 
 
+# the expression titles_crud.title_group_key groups titles across parsers by
+Index('ix_titles_group_key', func.coalesce(cast(Title.shikimori_id, String), Title.match_key, cast(Title.id, String)))
+
+
 class Episode(Base):
     __tablename__ = "episodes"
 
@@ -125,3 +132,28 @@ class RelatedTitle(Base):
         RelatedLink.id), primary_key=True)
     title_id = Column(UUID(as_uuid=True), ForeignKey(
         Title.id), primary_key=True)
+
+
+class ShikimoriName(Base):
+    __tablename__ = "shikimori_names"
+
+    name = Column(String, primary_key=True)
+    shikimori_id = Column(Integer, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now()
+    )
+
+
+class TitleMatch(Base):
+    __tablename__ = "title_matches"
+
+    title_id = Column(UUID(as_uuid=True), ForeignKey(
+        Title.id), primary_key=True)
+    matched_title_id = Column(UUID(as_uuid=True), ForeignKey(
+        Title.id), primary_key=True)
+    score = Column(Float, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now()
+    )
@@ -1,4 +1,5 @@
 import os
+import sys
 import importlib.util
 from fastapi.logger import logger
 from typing import Literal
@@ -10,12 +11,14 @@ def import_all_modules():
     directory = os.path.dirname(__file__)
     for filename in os.listdir(directory):
         if filename.endswith(".py") and filename != "__init__.py" and filename != "example_parser.py":
-            module_name = filename[:-3]
+            module_name = f"{__name__}.{filename[:-3]}"
             module_path = os.path.join(directory, filename)
             try:
                 spec = importlib.util.spec_from_file_location(
                     module_name, module_path)
                 module = importlib.util.module_from_spec(spec)
+                # registered so that parse functions can be pickled for the parse pool
+                sys.modules[module_name] = module
                 spec.loader.exec_module(module)
                 modules.append(module.parser)
                 print(f"Imported parser: {module.parser.parser_id}")
@@ -1,5 +1,8 @@
 import re
+import json
 import aiohttp
+from src.utils.conditional import fetch_page
+from src.utils.http import http_session, upstream_url
 import requests
 from src.schemas.parsers import Episode, Genre, ParsedGenre, ParsedEpisode, ParsedLink, ParsedTitle, ParsedTitleShort, ParsedTitlesPage, TitlesPage
 from src.redis.services import CacheService
@@ -8,14 +11,19 @@ from fastapi import APIRouter, BackgroundTasks, HTTPException
 from fastapi.responses import RedirectResponse, StreamingResponse
 from src.db.session import AsyncSession
 from src.core.config import settings
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from src.utils.html import parsed_html, parse_pool
 from src.crud.genres_crud import GenresCrud
 from typing import List
 import hashlib
 from src.db.session import get_async_session_context
-WEBSITE_URL = "https://anidub.world"
-API_URL = "https://isekai.anidub.fun"
+WEBSITE_URL = upstream_url("https://anidub.world")
+API_URL = upstream_url("https://isekai.anidub.fun")
 LINK_SPLITTER = "~"
+# subtrees the parse functions read, the rest of a page is skipped while parsing
+LIST_PAGE_ONLY = SoupStrainer(id='dle-content')
+TITLE_PAGE_ONLY = SoupStrainer(class_='wrap-main')
+PLAYER_PAGE_ONLY = SoupStrainer(class_='tabs-sel')
 
 kinds = {
     "anime_tv": "tv",
@@ -26,53 +34,53 @@ kinds = {
 
 
 async def get_main_page(session: aiohttp.ClientSession) -> list[ParsedTitleShort]:
-    async with session.get(f'{API_URL}/mobile-api.php?name=main_posts') as response:
-        titles_json = await response.json()
-        titles = []
-        for title in titles_json:
-            xfields = title['xfields'].split('||')
-            genres_names = []
-            img = None
-            if xfields:
-                for xfield in xfields:
-                    parts = xfield.split('|')
-                    if 'genre' == parts[0]:
-                        genres_names = parts[1].split(', ')
-                    if 'upposter2' == parts[0]:
-                        img = f'{WEBSITE_URL}/uploads/posts/{parts[1].split("&")[0]}'
-                    if 'poster' == parts[0]:
-                        img = f'{WEBSITE_URL}/uploads/posts/{parts[1].split("&")[0]}'
-            if not img:
-                continue
-            titles.append(ParsedTitleShort(
-                id_on_website=title['id'],
-                name=get_original_title(title['title']),
-                image_url=img,
-                en_name=get_en_title(title['title']),
-                additional_info=series_from_title(title['title']),
-                poster=img,
-                genres_names=genres_names
-            ))
-        return titles
+    titles_json = json.loads(await fetch_page(session, f'{API_URL}/mobile-api.php?name=main_posts'))
+    titles = []
+    for title in titles_json:
+        xfields = title['xfields'].split('||')
+        genres_names = []
+        img = None
+        if xfields:
+            for xfield in xfields:
+                parts = xfield.split('|')
+                if 'genre' == parts[0]:
+                    genres_names = parts[1].split(', ')
+                if 'upposter2' == parts[0]:
+                    img = f'{WEBSITE_URL}/uploads/posts/{parts[1].split("&")[0]}'
+                if 'poster' == parts[0]:
+                    img = f'{WEBSITE_URL}/uploads/posts/{parts[1].split("&")[0]}'
+        if not img:
+            continue
+        titles.append(ParsedTitleShort(
+            id_on_website=title['id'],
+            name=get_original_title(title['title']),
+            image_url=img,
+            en_name=get_en_title(title['title']),
+            additional_info=series_from_title(title['title']),
+            poster=img,
+            genres_names=genres_names
+        ))
+    return titles
 
 
 async def get_titles(page: int) -> ParsedTitlesPage:
-    async with aiohttp.ClientSession() as session:
-        url = WEBSITE_URL
+    async with http_session() as session:
         if page > 1:
-            url += f'/page/{page}/'
-        async with session.get(url) as response:
-            html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
-            pages_count = get_pages_count(soup)
-            titles = get_titles_from_page(soup) if page > 1 else await get_main_page(session)
-            if not titles or not pages_count:
-                raise HTTPException(
-                    status_code=404, detail="Page not found on anidub.")
-            return ParsedTitlesPage(
-                titles=titles,
-                total_pages=pages_count
-            )
+            html = await fetch_page(session, f'{WEBSITE_URL}/page/{page}/')
+            pages_count, titles = await parse_pool.run(parse_titles_page, html)
+        else:
+            # titles of the main page come from the mobile api, its html only has the pages count
+            titles = await get_main_page(session)
+            async with session.get(WEBSITE_URL) as response:
+                html = await response.text()
+            pages_count, _ = await parse_pool.run(parse_titles_page, html, False)
+        if not titles or not pages_count:
+            raise HTTPException(
+                status_code=404, detail="Page not found on anidub.")
+        return ParsedTitlesPage(
+            titles=titles,
+            total_pages=pages_count
+        )
 
 
 def get_original_title(name: str) -> str:
@@ -146,7 +154,28 @@ def get_pages_count(soup: BeautifulSoup):
     return int(pagination[-1].text)
 
 
-async def get_series_data(soup: BeautifulSoup, session: aiohttp.ClientSession) -> list[ParsedEpisode]:
+def parse_titles_page(html: str, with_titles: bool = True) -> tuple[int | None, list[ParsedTitleShort]]:
+    with parsed_html(html, LIST_PAGE_ONLY) as soup:
+        return get_pages_count(soup), get_titles_from_page(soup) if with_titles else []
+
+
+def episodes_from_tabs(tabs: list[BeautifulSoup], is_m3u8: bool = False) -> list[ParsedEpisode]:
+    return [
+        ParsedEpisode(
+            is_m3u8=is_m3u8,
+            number=int(re.search(r'\d+', tab.text).group()),
+            name=tab.text,
+            links=[ParsedLink(
+                name='playlist', link=tab.get('data'))]
+        ) for tab in tabs
+    ]
+
+
+def get_series_data(soup: BeautifulSoup) -> tuple[list[ParsedEpisode], str | None]:
+    """
+    Returns the episodes listed in the player tabs, or the link of the
+    external player page that lists them instead.
+    """
     player = soup.select_one('.fplayer')
     if player:
         tabs_sel = player.select_one('.tabs-sel')
@@ -154,118 +183,121 @@ async def get_series_data(soup: BeautifulSoup, session: aiohttp.ClientSession) -
             tabs = tabs_sel.select('span')
             if tabs:
                 link = tabs[0].get('data')
-                is_m3u8 = False
                 if 'https://player.ladonyvesna2005.info' in link:
-                    async with session.get(link) as response:
-                        html = await response.text()
-                        soup = BeautifulSoup(html, 'html.parser')
-                        tabs = soup.select('.tabs-sel span')
-                        is_m3u8 = True
-                return [
-                    ParsedEpisode(
-                        is_m3u8=is_m3u8,
-                        number=int(re.search(r'\d+', tab.text).group()),
-                        name=tab.text,
-                        links=[ParsedLink(
-                            name='playlist', link=tab.get('data'))]
-                    ) for tab in tabs
-                ]
-    return []
+                    return [], link
+                return episodes_from_tabs(tabs), None
+    return [], None
+
+
+def parse_player_page(html: str) -> list[ParsedEpisode]:
+    with parsed_html(html, PLAYER_PAGE_ONLY) as soup:
+        return episodes_from_tabs(soup.select('.tabs-sel span'), is_m3u8=True)
+
+
+def parse_title_page(html: str, title_id: str) -> tuple[ParsedTitle, str | None]:
+    with parsed_html(html, TITLE_PAGE_ONLY) as soup:
+        return extract_title(soup, title_id)
+
+
+def extract_title(soup: BeautifulSoup, title_id: str) -> tuple[ParsedTitle, str | None]:
+    data = soup.select_one('.wrap-main')
+    if not data:
+        raise HTTPException(
+            status_code=500, detail="Can't get title from page")
+    fright = data.select_one('.fright')
+    title_block = fright.select_one('h1')
+    title_name = title_block.text
+    name = get_original_title(title_name)
+    en_name = get_en_title(title_name)
+    series = series_from_title(title_name)
+    fleft = data.select_one('.fleft')
+    poster = fleft.select_one('.fposter > img').get('src')
+    poster = (poster if 'http' in poster else WEBSITE_URL+poster)
+    description = fright.select_one('.fdesc')
+    description = description.text.replace(
+        '\n', '') if description else None
+    flist = fright.select('.flist > li')
+
+    links = fright.select('.fmeta > span > a')
+    year = None
+    for link in links:
+        href = link.get('href')
+        if not href:
+            continue
+        if 'year' in href.split('/'):
+            year = link.text
+            break
+    kind = None
+    if links:
+        kind_link = links[-1]
+        if kind_link:
+            kind_name = kind_link.get('href').split('/')[-1]
+            kind = kinds.get(kind_name)
+    genres_names = []
+    if flist:
+        for flist_item in flist:
+            block_name = flist_item.select_one('span')
+            if block_name and block_name.text == 'Жанр:':
+                genres_names = [genre.text
+                                for genre in flist_item.select('a')]
+                break
+
+    series_data, player_link = get_series_data(data)
+    episodes_message = None
+    if not series_data:
+        episodes_message_container = soup.select_one(
+            '.fplayer .anidub__info_mess')
+        if episodes_message_container:
+            episodes_message = episodes_message_container.text
+    recommendations = data.select(
+        '.sect > .sect-content > .th-item')
+    recommended_titles = [
+        get_title_data(
+            recommendation) for recommendation in recommendations]
+    return ParsedTitle(
+        id_on_website=title_id,
+        name=name,
+        en_name=en_name,
+        episodes_list=series_data,
+        series_info=series,
+        image_url=poster,
+        year=year,
+        description=description,
+        genres_names=genres_names,
+        recommended_titles=recommended_titles,
+        kind=kind,
+        episodes_message=episodes_message
+    ), player_link
 
 
 async def get_title(title_id: str) -> ParsedTitle:
-    async with aiohttp.ClientSession() as session:
+    async with http_session() as session:
         async with session.get(f'{WEBSITE_URL}/index.php', params={'newsid': title_id}) as response:
             html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
-            data = soup.select_one('.wrap > .wrap-main')
-            if not data:
-                raise HTTPException(
-                    status_code=500, detail="Can't get title from page")
-            fright = data.select_one('.fright')
-            title_block = fright.select_one('h1')
-            title_name = title_block.text
-            name = get_original_title(title_name)
-            en_name = get_en_title(title_name)
-            series = series_from_title(title_name)
-            fleft = data.select_one('.fleft')
-            poster = fleft.select_one('.fposter > img').get('src')
-            poster = (poster if 'http' in poster else WEBSITE_URL+poster)
-            description = fright.select_one('.fdesc')
-            description = description.text.replace(
-                '\n', '') if description else None
-            flist = fright.select('.flist > li')
-
-            links = fright.select('.fmeta > span > a')
-            year = None
-            for link in links:
-                href = link.get('href')
-                if not href:
-                    continue
-                if 'year' in href.split('/'):
-                    year = link.text
-                    break
-            kind = None
-            if links:
-                kind_link = links[-1]
-                if kind_link:
-                    kind_name = kind_link.get('href').split('/')[-1]
-                    kind = kinds.get(kind_name)
-            genres_names = []
-            if flist:
-                for flist_item in flist:
-                    block_name = flist_item.select_one('span')
-                    if block_name and block_name.text == 'Жанр:':
-                        genres_names = [genre.text
-                                        for genre in flist_item.select('a')]
-                        break
-
-            series_data = await get_series_data(data, session)
-            episodes_message = None
-            if not series_data:
-                episodes_message_container = soup.select_one(
-                    '.fplayer .anidub__info_mess')
-                if episodes_message_container:
-                    episodes_message = episodes_message_container.text
-            recommendations = data.select(
-                '.sect > .sect-content > .th-item')
-            recommended_titles = [
-                get_title_data(
-                    recommendation) for recommendation in recommendations]
-            return ParsedTitle(
-                id_on_website=title_id,
-                name=name,
-                en_name=en_name,
-                episodes_list=series_data,
-                series_info=series,
-                image_url=poster,
-                year=year,
-                description=description,
-                genres_names=genres_names,
-                recommended_titles=recommended_titles,
-                kind=kind,
-                episodes_message=episodes_message
-            )
+        title, player_link = await parse_pool.run(parse_title_page, html, title_id)
+        if player_link:
+            async with session.get(upstream_url(player_link)) as response:
+                html = await response.text()
+            title.episodes_list = await parse_pool.run(parse_player_page, html)
+            if title.episodes_list:
+                title.episodes_message = None
+        return title
 
 
 async def get_genre(genre_website_id: str, page: int) -> ParsedTitlesPage:
-    async with aiohttp.ClientSession() as session:
+    async with http_session() as session:
         url = f'{WEBSITE_URL}/xfsearch/genre/{requests.utils.requote_uri(genre_website_id)}/'
         if page > 1:
             url += f'page/{page}/'
-        async with session.get(url) as response:
-            html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
-            titles = get_titles_from_page(soup)
-            pages_count = get_pages_count(soup)
-
-            if not titles:
-                raise HTTPException(
-                    status_code=404, detail="Page not found on anidub.")
-            return ParsedTitlesPage(
-                titles=titles,
-                total_pages=pages_count or 1
-            )
+        html = await fetch_page(session, url)
+        pages_count, titles = await parse_pool.run(parse_titles_page, html)
+        if not titles:
+            raise HTTPException(
+                status_code=404, detail="Page not found on anidub.")
+        return ParsedTitlesPage(
+            titles=titles,
+            total_pages=pages_count or 1
+        )
 
 functions = ParserFunctions(
     get_titles=get_titles, get_title=get_title, get_genres=None, get_genre=get_genre)
@@ -324,15 +356,15 @@ class AnidubParser(Parser):
         if content:
             return RedirectResponse(content)
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(link) as response:
+        async with http_session() as session:
+            async with session.get(upstream_url(link)) as response:
                 html = await response.text()
                 p = next(re.finditer(r"\/v\/.+\d+.mp4", html), None)
                 if not p:
                     raise HTTPException(
                         status_code=404, detail="Link not found")
                 file_url = 'https://video.sibnet.ru' + p.group(0)
-                async with session.head(file_url, headers={'Referer': link}) as response:
+                async with session.head(upstream_url(file_url), headers={'Referer': link}) as response:
                     if response.status == 200:
                         content = await response.text()
                     elif response.status == 302:
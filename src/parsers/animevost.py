@@ -1,17 +1,23 @@
 import re
-import aiohttp
+from src.utils.conditional import fetch_page
+from src.utils.http import http_session, upstream_url
 from src.models.parsers import Episode
 from src.utils.parsers import Parser, ParserFunctions
 from src.schemas.parsers import LinkParsedTitle, ParsedEpisode, ParsedLink, ParsedTitle, ParsedTitleShort, ParsedGenre, ParsedTitlesPage, Episode as EpisodeSchema
 from fastapi import HTTPException
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from src.utils.html import parsed_html, parse_pool
 from src.redis.services import CacheService
 from src.db.session import AsyncSession
 from typing import List
 
 
-API_URL = "https://api.animetop.info/v1"
-WEBSITE_URL = "https://v5.vost.pw"
+API_URL = upstream_url("https://api.animetop.info/v1")
+WEBSITE_URL = upstream_url("https://v5.vost.pw")
+# subtrees the parse functions read, the rest of a page is skipped while parsing
+LIST_PAGE_ONLY = SoupStrainer(id='dle-content')
+SEARCH_PAGE_ONLY = SoupStrainer('div', class_='shortstory')
+GENRES_PAGE_ONLY = SoupStrainer('ul', id='topnav')
 
 kinds = {
     "ТВ": "tv",
@@ -55,25 +61,58 @@ def get_pages_count(soup: BeautifulSoup) -> int:
     return int(pagination[-1].text) if pagination else 1
 
 
+def parse_titles_page(html: str) -> ParsedTitlesPage:
+    with parsed_html(html, LIST_PAGE_ONLY) as soup:
+        titles = get_titles_from_page(soup)
+        return ParsedTitlesPage(titles=titles, total_pages=get_pages_count(soup) if titles else 0)
+
+
 async def get_titles(page: int) -> ParsedTitlesPage:
-    async with aiohttp.ClientSession() as session:
+    async with http_session() as session:
         url = WEBSITE_URL
         if page > 1:
             url += f'/page/{page}/'
-        async with session.get(url) as response:
-            html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
-            titles = get_titles_from_page(soup)
-            if len(titles) == 0:
-                raise HTTPException(
-                    status_code=404, detail="No titles found on page.")
-            pages = get_pages_count(soup)
-            return ParsedTitlesPage(titles=titles, total_pages=pages)
+        html = await fetch_page(session, url)
+        titles_page = await parse_pool.run(parse_titles_page, html)
+        if len(titles_page.titles) == 0:
+            raise HTTPException(
+                status_code=404, detail="No titles found on page.")
+        return titles_page
+
+
+def get_story_info(story: BeautifulSoup, label: str) -> str | None:
+    """
+    Returns the text of the info row of a shortstory, e.g. "Год выхода: ".
+    """
+    info_tags = story.select(
+        'div.shortstoryContent > table > tr > td > p')
+    for tag in info_tags:
+        strong = tag.select_one('strong')
+        if strong and strong.text == label:
+            return tag.text.split(label, 1)[-1].strip()
+    return None
+
+
+def get_title_duration(story: BeautifulSoup) -> str | None:
+    episodes = get_story_info(story, "Количество серий: ")
+    if not episodes:
+        return None
+    match = re.search(r'\(([^)]+)', episodes)
+    return match.group(1) if match else None
 
 
-async def get_title_page(full_title: str, title_id: int):
+def parse_search_page(html: str, title_id: str) -> tuple[List[LinkParsedTitle], str | None]:
+    with parsed_html(html, SEARCH_PAGE_ONLY) as soup:
+        short_stories = soup.select('div.shortstory')
+        for story in short_stories:
+            if get_id_from_url(story.select_one('div.shortstoryHead > h2 > a')['href']) == str(title_id):
+                return get_title_related(story), get_title_duration(story)
+        return [], None
+
+
+async def get_title_page(full_title: str, title_id: int) -> tuple[List[LinkParsedTitle], str | None]:
     try:
-        async with aiohttp.ClientSession() as session:
+        async with http_session() as session:
             async with session.post(
                     f'{WEBSITE_URL}/index.php?do=search',
                     data={
@@ -96,18 +135,13 @@ async def get_title_page(full_title: str, title_id: int):
                     }
             ) as data:
                 html = await data.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                short_stories = soup.select('div.shortstory')
-                for story in short_stories:
-                    if get_id_from_url(story.select_one('div.shortstoryHead > h2 > a')['href']) == str(title_id):
-                        return story
-                return None
+            return await parse_pool.run(parse_search_page, html, title_id)
     except Exception as e:
         print("Error while getting related titles from animevost:", e)
-        return None
+        return [], None
 
 
-async def get_title_related(story: BeautifulSoup) -> List[LinkParsedTitle]:
+def get_title_related(story: BeautifulSoup) -> List[LinkParsedTitle]:
 
     return [
         LinkParsedTitle(
@@ -123,25 +157,13 @@ async def get_title(title_id: str) -> ParsedTitle:
     if not title_id.isdigit():
         raise HTTPException(
             status_code=404, detail="Title ID for animevost must be a number.")
-    async with aiohttp.ClientSession() as session:
+    async with http_session() as session:
         async with session.post(f'{API_URL}/info', data={'id': int(title_id)}) as data:
             json = await data.json()
             data = json['data'][0]
             series = series_from_title(data['title'])
             match = re.match(r'^[^\[]+', data['title'])
-            title_page = await get_title_page(match.group(), title_id) if match else None
-            related_titles = await get_title_related(title_page) if title_page else []
-            duration = None
-            if title_page:
-                info_tags = title_page.select(
-                    'div.shortstoryContent > table > tr > td > p')
-                for tag in info_tags:
-                    strong = tag.select_one('strong')
-                    if not strong:
-                        continue
-                    if "Количество серий: " == strong.text:
-                        duration = re.search(r'\(([^)]+)', tag.text).group(1)
-                        break
+            related_titles, duration = await get_title_page(match.group(), title_id) if match else ([], None)
             async with session.post(f'{API_URL}/playlist', data={'id': int(title_id)}) as episodes_data:
                 episodes_json = await episodes_data.json()
 
@@ -189,19 +211,23 @@ async def get_title(title_id: str) -> ParsedTitle:
 
 
 async def get_genres() -> list[ParsedGenre]:
-    async with aiohttp.ClientSession() as session:
+    async with http_session() as session:
         async with session.get(WEBSITE_URL) as response:
             html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
-            menus = soup.select('ul#topnav > li')
-            genres_links = menus[1].select('div > span > a')
-            return [
-                ParsedGenre(
-                    name=genre.text,
-                    id_on_website=genre['href'].split('/')[-2]
-                )
-                for genre in genres_links
-            ]
+            return await parse_pool.run(parse_genres_page, html)
+
+
+def parse_genres_page(html: str) -> list[ParsedGenre]:
+    with parsed_html(html, GENRES_PAGE_ONLY) as soup:
+        menus = soup.select('ul#topnav > li')
+        genres_links = menus[1].select('div > span > a')
+        return [
+            ParsedGenre(
+                name=genre.text,
+                id_on_website=genre['href'].split('/')[-2]
+            )
+            for genre in genres_links
+        ]
 
 
 def get_id_from_url(url: str) -> str:
@@ -232,7 +258,9 @@ def get_titles_from_page(soup: BeautifulSoup) -> list[ParsedTitleShort]:
                 name=get_original_title(name),
                 en_name=get_en_title(name),
                 additional_info=series_from_title(name),
-                image_url=WEBSITE_URL+title.select_one('img')['src']
+                image_url=WEBSITE_URL+title.select_one('img')['src'],
+                year=get_story_info(title, "Год выхода: "),
+                kind=kinds.get(get_story_info(title, "Тип: "))
             ))
         except Exception as e:
             print(f"Error while parsing title {name} on animevost: {e}")
@@ -241,18 +269,12 @@ def get_titles_from_page(soup: BeautifulSoup) -> list[ParsedTitleShort]:
 
 
 async def get_genre(genre_website_id: str, page: int) -> ParsedTitlesPage:
-    async with aiohttp.ClientSession() as session:
+    async with http_session() as session:
         url = f'{WEBSITE_URL}/zhanr/{genre_website_id}'
         if page > 1:
             url += f'/page/{page}/'
-        async with session.post(url) as response:
-            html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
-            titles = get_titles_from_page(soup)
-            if len(titles) == 0:
-                return ParsedTitlesPage(titles=[], total_pages=0)
-            pages = get_pages_count(soup)
-            return ParsedTitlesPage(titles=titles, total_pages=pages)
+        html = await fetch_page(session, url, method='POST')
+        return await parse_pool.run(parse_titles_page, html)
 
 functions = ParserFunctions(
     get_titles=get_titles, get_title=get_title, get_genres=get_genres, get_genre=get_genre)
@@ -1,9 +1,72 @@
+from collections import OrderedDict
 from datetime import datetime
 import json
+import threading
+import time
+from typing import Any, Callable
 from uuid import UUID
 from aioredis import Redis
 
-from src.schemas.parsers import ParsedGenre, ParsedTitleShort, ParsedTitlesPage, ShikimoriTitle
+from src.core.config import settings
+from src.schemas.parsers import ParsedGenre, ParsedTitle, ParsedTitlesPage, ShikimoriTitle
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+# KEYS are backoff, given up and in-flight keys per episode, returns the
+# positions of the claimed episodes
+CLAIM_PROBES_SCRIPT = """
+local claimed = {}
+for i = 1, #KEYS, 3 do
+    if redis.call('exists', KEYS[i], KEYS[i + 1]) == 0 and redis.call('set', KEYS[i + 2], 1, 'EX', ARGV[1], 'NX') then
+        table.insert(claimed, (i - 1) / 3)
+    end
+end
+return claimed
+"""
+LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+if redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2], 'NX') then
+    return 1
+end
+return 0
+"""
+
+
+class RehydratedCache:
+    """
+    Schemas built from cached JSON, kept per process by redis key. An entry is
+    reused while the stored JSON is unchanged, so a repeated read skips both
+    decoding and validating it and only pays for comparing the strings.
+    Returned objects are shared between requests and must not be mutated.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._items: OrderedDict[str, tuple[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, data: str, build: Callable[[dict], Any]) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item and item[0] == data:
+                self._items.move_to_end(key)
+                return item[1]
+        value = build(json.loads(data))
+        with self._lock:
+            self._items[key] = (data, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        return value
+
+
+rehydrated = RehydratedCache(settings.rehydrated_cache_size)
 
 
 class CacheService:
@@ -29,10 +92,10 @@ class CacheService:
         return seconds
 
     async def get_genre_titles(self, parser_id: str, genre_id: UUID, page: int) -> ParsedTitlesPage:
-        data = await self._redis.get(f"{parser_id}:titles:{genre_id}:{page}")
+        key = f"{parser_id}:titles:{genre_id}:{page}"
+        data = await self._redis.get(key)
         if data:
-            data = json.loads(data)
-            return ParsedTitlesPage(titles=[ParsedTitleShort(**title) for title in data['titles']], total_pages=data['total_pages'])
+            return rehydrated.get(key, data, ParsedTitlesPage.model_validate)
 
     async def get_genres(self, parser_id: str):
         data = await self._redis.get(f"{parser_id}:genres")
@@ -43,30 +106,48 @@ class CacheService:
         return await self._redis.set(f"{parser_id}:genres", json.dumps(genres))
 
     async def set_genre_titles(self, parser_id: str, genre_id: UUID, page: int, titles_page: dict):
-        return await self._redis.set(f"{parser_id}:titles:{genre_id}:{page}", json.dumps(titles_page))
+        key = f"{parser_id}:titles:{genre_id}:{page}"
+        await self._redis.delete(f"response:{key}")
+        return await self._redis.set(key, json.dumps(titles_page))
 
     async def get_titles(self, parser_id: str, page: int) -> ParsedTitlesPage:
-        data = await self._redis.get(f"{parser_id}:titles:{page}")
+        key = f"{parser_id}:titles:{page}"
+        data = await self._redis.get(key)
         if data:
-            data = json.loads(data)
-            return ParsedTitlesPage(titles=[ParsedTitleShort(**title) for title in data['titles']], total_pages=data['total_pages'])
+            return rehydrated.get(key, data, ParsedTitlesPage.model_validate)
 
     async def set_titles(self, parser_id: str, page: int, titles_page: dict):
-        return await self._redis.set(f"{parser_id}:titles:{page}", json.dumps(titles_page))
+        key = f"{parser_id}:titles:{page}"
+        # the main page is made of the first pages
+        await self._redis.delete(f"response:{key}", f"response:{parser_id}:titles:main")
+        return await self._redis.set(key, json.dumps(titles_page))
 
-    async def get_title(self, parser_id: str, title_id: UUID):
-        data = await self._redis.get(f"{parser_id}:title:{title_id}")
+    async def get_title(self, parser_id: str, title_id: UUID) -> ParsedTitle | None:
+        key = f"{parser_id}:title:{title_id}"
+        data = await self._redis.get(key)
         if data:
-            return json.loads(data)
+            return rehydrated.get(key, data, ParsedTitle.model_validate)
 
     async def set_title(self, parser_id: str, title_id: UUID, title: dict):
         return await self._redis.set(f"{parser_id}:title:{title_id}", json.dumps(title))
 
     async def delete_parser_data(self, parser_id: str):
-        keys = await self._redis.keys(f"{parser_id}:titles:*")
+        keys = await self._redis.keys(f"{parser_id}:titles:*") + await self._redis.keys(f"response:{parser_id}:titles:*")
         if keys:
             await self._redis.delete(*keys)
 
+    async def get_response(self, key: str) -> dict[str, str]:
+        """
+        Returns the JSON body and ETag rendered for the cached data under `key`.
+        """
+        return await self._redis.hgetall(f"response:{key}")
+
+    async def set_response(self, key: str, body: str, etag: str, seconds: int):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(f"response:{key}", mapping={"body": body, "etag": etag})
+            pipe.expire(f"response:{key}", seconds)
+            await pipe.execute()
+
     async def get_shikimori_title(self, title_id: UUID):
         cached = await self._redis.get(f"shikimori:{title_id}")
         if cached:
@@ -79,6 +160,25 @@ class CacheService:
         await self._redis.set(f"shikimori:{title_id}", json.dumps(obj))
         return title_data
 
+    async def track_shikimori_read(self, title_id: int):
+        await self._redis.zincrby("shikimori:reads", 1, title_id)
+
+    async def get_most_read_shikimori_titles(self, count: int) -> list[int]:
+        return [int(title_id) for title_id in await self._redis.zrevrange("shikimori:reads", 0, count - 1)]
+
+    async def trim_shikimori_reads(self, keep: int):
+        await self._redis.zremrangebyrank("shikimori:reads", 0, -keep - 1)
+
+    async def get_shikimori_titles_last_fetch(self, titles_ids: list[int]) -> dict[int, datetime | None]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for title_id in titles_ids:
+                pipe.get(f"shikimori:{title_id}")
+            cached = await pipe.execute()
+        return {
+            title_id: ShikimoriTitle(**json.loads(data)).last_fetch if data else None
+            for title_id, data in zip(titles_ids, cached)
+        }
+
     async def set_shikimori_fail(self, title_id: UUID):
         await self._redis.set(f"shikimori:{title_id}:fail", 1, ex=60*5)
 
@@ -97,6 +197,150 @@ class CacheService:
     async def set_link_by_hash(self, hash: str, link: str):
         return await self._redis.set(f"link:{hash}", link)
 
+    async def get_hls_duration(self, url_hash: str) -> float | None:
+        duration = await self._redis.get(f"hls:{url_hash}:duration")
+        if duration is not None:
+            return float(duration)
+
+    async def set_hls_duration(self, url_hash: str, duration: float):
+        return await self._redis.set(f"hls:{url_hash}:duration", duration, ex=60*60*24*30)
+
+    async def claim_duration_probes(self, episodes_ids: list[UUID], seconds: int) -> list[UUID]:
+        if not episodes_ids:
+            return []
+        keys = [f"duration:{episode_id}:{name}" for episode_id in episodes_ids for name in ("backoff", "given_up", "inflight")]
+        claimed = await self._redis.eval(CLAIM_PROBES_SCRIPT, len(keys), *keys, seconds)
+        return [episodes_ids[index] for index in claimed]
+
+    async def release_duration_probes(self, episodes_ids: list[UUID]):
+        if episodes_ids:
+            await self._redis.delete(*[f"duration:{episode_id}:inflight" for episode_id in episodes_ids])
+
+    async def add_duration_failure(self, episode_id: UUID) -> int:
+        failures = await self._redis.incr(f"duration:{episode_id}:failures")
+        await self._redis.expire(f"duration:{episode_id}:failures", 60*60*24*30)
+        return failures
+
+    async def set_duration_backoff(self, episode_id: UUID, seconds: int):
+        await self._redis.set(f"duration:{episode_id}:backoff", 1, ex=seconds)
+
+    async def set_duration_given_up(self, episode_id: UUID):
+        await self._redis.set(f"duration:{episode_id}:given_up", 1)
+
+    async def claim_duration_title_job(self, title_id: UUID, seconds: int) -> bool:
+        return bool(await self._redis.set(f"duration:title:{title_id}", 1, ex=seconds, nx=True))
+
+    async def release_duration_title_job(self, title_id: UUID):
+        await self._redis.delete(f"duration:title:{title_id}")
+
+    async def acquire_task_lock(self, key: str, token: str, seconds: int) -> bool:
+        return bool(await self._redis.set(f"task:{key}", token, ex=seconds, nx=True))
+
+    async def release_task_lock(self, key: str, token: str) -> bool:
+        return bool(await self._redis.eval(RELEASE_LOCK_SCRIPT, 1, f"task:{key}", token))
+
+    async def set_task_run(self, key: str, **fields):
+        await self._redis.hset(f"task:{key}:run", mapping=fields)
+
+    async def get_task_run(self, key: str) -> dict[str, str]:
+        return await self._redis.hgetall(f"task:{key}:run")
+
+    async def acquire_lease(self, name: str, token: str, seconds: int) -> bool:
+        return bool(await self._redis.eval(LEASE_SCRIPT, 1, f"lease:{name}", token, seconds))
+
+    async def get_schedule(self, name: str) -> dict[str, str]:
+        return await self._redis.hgetall(f"schedule:{name}")
+
+    async def set_schedule(self, name: str, **fields):
+        await self._redis.hset(f"schedule:{name}", mapping=fields)
+
+    async def acquire_rate_slot(self, name: str, limit: int) -> bool:
+        key = f"ratelimit:{name}:{int(time.time())}"
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, 2)
+            count, _ = await pipe.execute()
+        return count <= limit
+
+    async def init_crawl(self, parser_id: str, total_pages: int, chunk_size: int):
+        await self._redis.delete(f"crawl:{parser_id}", f"crawl:{parser_id}:done", f"crawl:{parser_id}:failed")
+        await self._redis.hset(f"crawl:{parser_id}", mapping={
+            'status': 'running',
+            'total_pages': total_pages,
+            'chunk_size': chunk_size,
+            'started_at': time.time(),
+            'pages_done': 0,
+            'titles': 0,
+        })
+
+    async def get_crawl(self, parser_id: str) -> dict[str, str]:
+        return await self._redis.hgetall(f"crawl:{parser_id}")
+
+    async def update_crawl(self, parser_id: str, **fields):
+        await self._redis.hset(f"crawl:{parser_id}", mapping=fields)
+
+    async def get_crawl_pages(self, parser_id: str) -> tuple[set[int], set[int]]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.smembers(f"crawl:{parser_id}:done")
+            pipe.smembers(f"crawl:{parser_id}:failed")
+            done, failed = await pipe.execute()
+        return {int(page) for page in done}, {int(page) for page in failed}
+
+    async def checkpoint_crawl(self, parser_id: str, done: list[int], failed: list[int], titles: int) -> int:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            if done:
+                pipe.sadd(f"crawl:{parser_id}:done", *done)
+                pipe.srem(f"crawl:{parser_id}:failed", *done)
+            if failed:
+                pipe.sadd(f"crawl:{parser_id}:failed", *failed)
+            pipe.hincrby(f"crawl:{parser_id}", 'titles', titles)
+            pipe.scard(f"crawl:{parser_id}:done")
+            results = await pipe.execute()
+        pages_done = results[-1]
+        await self._redis.hset(f"crawl:{parser_id}", mapping={'pages_done': pages_done, 'updated_at': time.time()})
+        return pages_done
+
+    async def get_title_fingerprints(self, parser_id: str, website_ids: list[str]) -> dict[str, str]:
+        if not website_ids:
+            return {}
+        fingerprints = await self._redis.hmget(f"crawl:{parser_id}:fingerprints", website_ids)
+        return {website_id: fingerprint for website_id, fingerprint in zip(website_ids, fingerprints) if fingerprint}
+
+    async def set_title_fingerprints(self, parser_id: str, fingerprints: dict[str, str]):
+        if fingerprints:
+            await self._redis.hset(f"crawl:{parser_id}:fingerprints", mapping=fingerprints)
+
+    async def get_crawl_watermark(self, parser_id: str) -> dict[str, str]:
+        return await self._redis.hgetall(f"crawl:{parser_id}:watermark")
+
+    async def set_crawl_watermark(self, parser_id: str, **fields):
+        await self._redis.hset(f"crawl:{parser_id}:watermark", mapping=fields)
+
+    async def get_page_validators(self, key: str) -> dict[str, str]:
+        return await self._redis.hgetall(f"validators:{key}")
+
+    async def set_page_validators(self, key: str, validators: dict[str, str], days: int = 7):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(f"validators:{key}")
+            pipe.hset(f"validators:{key}", mapping=validators)
+            pipe.expire(f"validators:{key}", days * 24 * 3600)
+            await pipe.execute()
+
+    async def incr_stats(self, group: str, field: str, amount: int = 1):
+        await self._redis.hincrby(f"stats:{group}", field, amount)
+
+    async def get_stats(self, group: str) -> dict[str, int]:
+        stats = await self._redis.hgetall(f"stats:{group}")
+        return {field: int(value) for field, value in stats.items()}
+
+    async def get_queue_length(self, queue: str, priority_steps: list[int] | None = None) -> int:
+        # kombu keeps every priority step of a redis queue in its own list
+        keys = [queue] + [f"{queue}\x06\x16{step}" for step in priority_steps or [] if step]
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.llen(key)
+            return sum(await pipe.execute())
+
     async def get_popular_ongoings(self, page: int):
         data = await self._redis.get(f"popular_ongoings:{page}")
         if data:
@@ -104,3 +348,6 @@ class CacheService:
 
     async def set_popular_ongoings(self, page: int, data: dict):
         return await self._redis.set(f"popular_ongoings:{page}", json.dumps(data), ex=60*60*24)
+
+    async def get_popular_ongoings_ttl(self, page: int) -> int:
+        return await self._redis.ttl(f"popular_ongoings:{page}")
@@ -29,6 +29,8 @@ class ParsedTitleShort(LinkParsedTitle):
     recommended_titles: list['ParsedTitleShort'] = []
     additional_info: str | None = None
     genres_names: list[str] = []
+    year: str | None = None
+    kind: Literal[tuple(settings.shikimori_kinds)] | None = None  # nopep8 # type: ignore
 
 
 class ParsedTitlesPage(BaseModel):
@@ -53,9 +55,7 @@ class ParsedEpisode(BaseModel):
 class ParsedTitle(ParsedTitleShort):
     description: str | None = None
     series_info: str | None = None
-    year: str | None = None
     episodes_list: list[ParsedEpisode] = []
-    kind: Literal[tuple(settings.shikimori_kinds)] | None = None  # nopep8 # type: ignore
     duration: str | None = None
     episodes_message: str | None = None
 
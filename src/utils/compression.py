@@ -0,0 +1,165 @@
+import gzip
+import threading
+from collections import OrderedDict
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.core.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    encodings = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if params and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+def opaque_tag(etag: str) -> str:
+    return etag.strip().removeprefix("W/")
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, so a weak tag of a compressed body matches its strong one."""
+    if if_none_match.strip() == "*":
+        return True
+    return opaque_tag(etag) in {opaque_tag(tag) for tag in if_none_match.split(",")}
+
+
+class CompressedBodies:
+    """
+    Compressed bodies of versioned responses, kept per process by ETag and
+    encoding, so a pre-serialized body is compressed once per content version.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._items: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag: str, encoding: str) -> bytes | None:
+        with self._lock:
+            body = self._items.get((etag, encoding))
+            if body is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end((etag, encoding))
+            self.hits += 1
+            return body
+
+    def set(self, etag: str, encoding: str, body: bytes):
+        with self._lock:
+            self._items[(etag, encoding)] = body
+            self._items.move_to_end((etag, encoding))
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def info(self) -> dict:
+        return {'entries': len(self._items), 'hits': self.hits, 'misses': self.misses}
+
+
+compressed_bodies = CompressedBodies(settings.compression_cache_size)
+
+
+class CompressionMiddleware:
+    """
+    Compresses text and JSON responses with brotli (when the package is
+    installed) or gzip, as negotiated from Accept-Encoding, once they are at
+    least `minimum_size` bytes. Responses with an ETag, like
+    PreserializedJSONResponse, get their compressed body cached under it.
+    Compressed responses carry Vary: Accept-Encoding and the weak form of the
+    ETag, since their bytes differ from the uncompressed ones, and a request
+    whose If-None-Match matches either form gets a 304. Streamed responses,
+    i.e. sent in several body messages, are passed through unchanged.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = settings.compression_minimum_size,
+                 gzip_level: int = settings.compression_gzip_level, brotli_quality: int = settings.compression_brotli_quality) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        if brotli and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            encoding = None
+        if_none_match = request_headers.get("if-none-match") if scope["method"] in ("GET", "HEAD") else None
+        if not encoding and not if_none_match:
+            await self.app(scope, receive, send)
+            return
+        start_message: Message | None = None
+
+        async def send_compressed(message: Message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if message.get("more_body"):
+                await send(start)
+                await send(message)
+                return
+            compress = encoding and self._compressible(headers, body)
+            etag = headers.get("etag")
+            if compress:
+                headers.add_vary_header("Accept-Encoding")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+            if if_none_match and etag and start["status"] == 200 and etag_matches(if_none_match, etag):
+                del headers["Content-Length"]
+                await send({**start, "status": 304})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            if not compress:
+                await send(start)
+                await send(message)
+                return
+            compressed = compressed_bodies.get(etag, encoding) if etag else None
+            if compressed is None:
+                compressed = self._compress(body, encoding)
+                if etag:
+                    compressed_bodies.set(etag, encoding, compressed)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, headers: MutableHeaders, body: bytes) -> bool:
+        return (len(body) >= self.minimum_size
+                and "content-encoding" not in headers
+                and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES))
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
@@ -0,0 +1,83 @@
+import hashlib
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator
+import aiohttp
+from src.redis.services import CacheService
+
+
+class PageNotModified(Exception):
+    pass
+
+
+class ConditionalFetch:
+    """
+    Validators of the pages fetched with `fetch_page` inside `conditional_fetch`:
+    the upstream ETag and Last-Modified and an md5 of the body.
+
+    A page the server answers with 304, or whose body hashes to the stored
+    value, raises PageNotModified instead of being returned, so the caller can
+    keep its cached copy without parsing the page. New validators are saved only
+    when the block exits normally, i.e. after the caller cached what it fetched.
+    """
+
+    def __init__(self, service: CacheService, conditional: bool = True) -> None:
+        self.service = service
+        self.conditional = conditional
+        self.pending: dict[str, dict[str, str]] = {}
+
+    async def commit(self):
+        for key, validators in self.pending.items():
+            await self.service.set_page_validators(key, validators)
+
+
+current_fetch: ContextVar[ConditionalFetch | None] = ContextVar("conditional_fetch", default=None)
+
+
+@asynccontextmanager
+async def conditional_fetch(service: CacheService, conditional: bool = True) -> AsyncIterator[ConditionalFetch]:
+    """
+    :param conditional: Whether unchanged pages raise PageNotModified. Only set it
+        when the caller has a cached copy to fall back to; otherwise the validators
+        are just recorded for the next fetch.
+    """
+    fetch = ConditionalFetch(service, conditional)
+    token = current_fetch.set(fetch)
+    try:
+        yield fetch
+    finally:
+        current_fetch.reset(token)
+    await fetch.commit()
+
+
+async def fetch_page(session: aiohttp.ClientSession, url: str, method: str = "GET", **kwargs) -> str:
+    """
+    Returns the body of a list page. Inside `conditional_fetch` the request is
+    conditional and an unchanged page raises PageNotModified. The query must be
+    part of `url`, since validators are stored per method and url.
+    """
+    fetch = current_fetch.get()
+    if not fetch:
+        async with session.request(method, url, **kwargs) as response:
+            return await response.text()
+    key = f"{method}:{url}"
+    validators = await fetch.service.get_page_validators(key) if fetch.conditional else {}
+    headers = dict(kwargs.pop("headers", None) or {})
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    async with session.request(method, url, headers=headers, **kwargs) as response:
+        if response.status == 304:
+            raise PageNotModified(url)
+        body = await response.read()
+        text = await response.text()
+        body_hash = hashlib.md5(body).hexdigest()
+        if body_hash == validators.get("hash"):
+            raise PageNotModified(url)
+        fetch.pending[key] = {
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", ""),
+            "hash": body_hash,
+        }
+        return text
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import time
+from typing import TYPE_CHECKING
+from src.core.config import settings
+from src.crud.titles_crud import TitlesCrud
+from src.db.session import get_async_session_context
+from src.models.parsers import Title as TitleModel
+from src.redis.services import CacheService
+from src.schemas.parsers import ParsedTitleShort, ParsedTitlesPage
+
+if TYPE_CHECKING:
+    from src.utils.parsers import Parser
+
+
+def title_fingerprint(title: ParsedTitleShort) -> str:
+    data = title.model_dump_json(include={'name', 'en_name', 'image_url', 'additional_info'})
+    return hashlib.md5(data.encode()).hexdigest()
+
+
+class Crawler:
+    """
+    Full catalog crawl of one parser, split into page chunks.
+
+    `plan` stores the crawl state in redis and returns the chunks that still
+    have pages to fetch, so calling it again for a running crawl resumes it.
+    Each chunk fetches its pages concurrently under the per-site rate limit
+    shared by all workers, upserts the titles in one statement per page batch
+    and checkpoints finished pages.
+
+    `crawl_incremental` walks the newest pages instead, and stops at a run of
+    titles whose fingerprints are unchanged since they were last seen. Where
+    the last run stopped and why is kept as its watermark, which is only
+    reported by `progress`: the next run starts from the first page anyway,
+    and titles a failed run did not reach still have their old fingerprints.
+    """
+
+    def __init__(self, parser: 'Parser', service: CacheService, chunk_size: int = settings.crawl_chunk_pages, concurrency: int = settings.crawl_concurrency, requests_per_second: int = settings.crawl_requests_per_second) -> None:
+        self.parser = parser
+        self.service = service
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+
+    async def _rate_limit(self):
+        while not await self.service.acquire_rate_slot(self.parser.parser_id, self.requests_per_second):
+            await asyncio.sleep(1 - time.time() % 1)
+
+    async def _fetch_page(self, page: int) -> tuple[ParsedTitlesPage, bool]:
+        await self._rate_limit()
+        return await self.parser.refresh_titles(page=page, service=self.service)
+
+    async def plan(self, restart: bool = False) -> list[tuple[int, int]]:
+        crawl = await self.service.get_crawl(self.parser.parser_id)
+        if restart or crawl.get('status') != 'running':
+            first_page, _ = await self._fetch_page(1)
+            await self.service.init_crawl(self.parser.parser_id, total_pages=first_page.total_pages, chunk_size=self.chunk_size)
+            crawl = await self.service.get_crawl(self.parser.parser_id)
+        total_pages = int(crawl['total_pages'])
+        chunk_size = int(crawl['chunk_size'])
+        done, _ = await self.service.get_crawl_pages(self.parser.parser_id)
+        chunks = []
+        for start in range(1, total_pages + 1, chunk_size):
+            end = min(start + chunk_size - 1, total_pages)
+            if any(page not in done for page in range(start, end + 1)):
+                chunks.append((start, end))
+        return chunks
+
+    async def crawl_chunk(self, start: int, end: int) -> list[TitleModel]:
+        done, _ = await self.service.get_crawl_pages(self.parser.parser_id)
+        pages = [page for page in range(start, end + 1) if page not in done]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(page: int) -> ParsedTitlesPage | None:
+            async with semaphore:
+                try:
+                    titles_page, _ = await self._fetch_page(page)
+                    return titles_page
+                except Exception as e:
+                    print(f"Error while crawling page {page} of {self.parser.parser_id}: {e}")
+
+        results = await asyncio.gather(*[fetch(page) for page in pages])
+        fetched = [page for page, result in zip(pages, results) if result]
+        titles = [title for result in results if result for title in result.titles]
+        db_titles = await self._upsert(titles)
+        await self.service.set_title_fingerprints(
+            self.parser.parser_id, {title.id_on_website: title_fingerprint(title) for title in titles})
+        await self.service.checkpoint_crawl(
+            self.parser.parser_id, done=fetched, failed=[page for page in pages if page not in fetched], titles=len(titles))
+        return db_titles
+
+    async def _upsert(self, titles: list[ParsedTitleShort]) -> list[TitleModel]:
+        if not titles:
+            return []
+        async with get_async_session_context() as session:
+            return await TitlesCrud(session).upsert_titles(titles, parser_id=self.parser.parser_id)
+
+    async def crawl_incremental(self, min_pages: int = 1, max_pages: int = settings.incremental_crawl_max_pages, stop_run: int = settings.incremental_crawl_stop_run) -> list[TitleModel]:
+        changed: list[ParsedTitleShort] = []
+        fingerprints = {}
+        unchanged_run = 0
+        page = 0
+        total_pages = max_pages
+        error = None
+        while page < min(total_pages, max_pages):
+            page += 1
+            try:
+                titles_page, page_changed = await self._fetch_page(page)
+            except Exception as e:
+                print(f"Error while crawling page {page} of {self.parser.parser_id}: {e}")
+                error = str(e) or type(e).__name__
+                break
+            total_pages = titles_page.total_pages
+            if not page_changed:
+                # cached pages were either crawled or shown, both of which stored their titles
+                unchanged_run += len(titles_page.titles)
+                if unchanged_run >= stop_run and page >= min_pages:
+                    break
+                continue
+            page_fingerprints = {title.id_on_website: title_fingerprint(title) for title in titles_page.titles}
+            known = await self.service.get_title_fingerprints(self.parser.parser_id, list(page_fingerprints))
+            for title in titles_page.titles:
+                if known.get(title.id_on_website) == page_fingerprints[title.id_on_website]:
+                    unchanged_run += 1
+                else:
+                    unchanged_run = 0
+                    changed.append(title)
+            fingerprints.update(page_fingerprints)
+            if unchanged_run >= stop_run and page >= min_pages:
+                break
+        db_titles = await self._upsert(changed)
+        await self.service.set_title_fingerprints(self.parser.parser_id, fingerprints)
+        await self.service.set_crawl_watermark(
+            self.parser.parser_id, status='failed' if error else 'complete', error=error or '',
+            pages=page - 1 if error else page, changed=len(changed), unchanged_run=unchanged_run, updated_at=time.time())
+        return db_titles
+
+    async def finish_if_done(self) -> bool:
+        crawl = await self.service.get_crawl(self.parser.parser_id)
+        if crawl.get('status') != 'running' or int(crawl['pages_done']) < int(crawl['total_pages']):
+            return False
+        await self.service.update_crawl(self.parser.parser_id, status='finished', finished_at=time.time())
+        return True
+
+    async def progress(self) -> dict:
+        crawl = await self.service.get_crawl(self.parser.parser_id)
+        watermark = await self.service.get_crawl_watermark(self.parser.parser_id)
+        if not crawl:
+            return {'status': 'idle', 'watermark': watermark}
+        _, failed = await self.service.get_crawl_pages(self.parser.parser_id)
+        started_at = float(crawl['started_at'])
+        pages_done = int(crawl['pages_done'])
+        elapsed = float(crawl.get('finished_at') or crawl.get('updated_at') or time.time()) - started_at
+        return {
+            'status': crawl['status'],
+            'total_pages': int(crawl['total_pages']),
+            'pages_done': pages_done,
+            'pages_failed': len(failed),
+            'titles': int(crawl['titles']),
+            'elapsed_seconds': elapsed,
+            'pages_per_second': pages_done / elapsed if elapsed > 0 else 0,
+            'watermark': watermark,
+        }
@@ -0,0 +1,92 @@
+import hashlib
+import re
+from urllib.parse import urljoin
+import aiohttp
+from dependency_injector.wiring import Provide, inject
+from src.redis.services import CacheService
+from src.redis.containers import Container
+
+
+ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def parse_attributes(line: str) -> dict[str, str]:
+    return {key: value.strip('"') for key, value in ATTRIBUTE_RE.findall(line)}
+
+
+class PlaylistScanner:
+    """Incremental m3u8 reader, fed one line at a time."""
+
+    def __init__(self) -> None:
+        self.duration = 0.0
+        self.segments = 0
+        self.ended = False
+        self.variants: list[tuple[int, str]] = []
+        self._stream_inf: dict[str, str] | None = None
+
+    @property
+    def is_master(self) -> bool:
+        return bool(self.variants)
+
+    def feed(self, line: str) -> bool:
+        """Returns False once the rest of the playlist is not needed."""
+        line = line.strip()
+        if not line:
+            return True
+        if line.startswith('#EXTINF:'):
+            self.duration += float(line[8:].split(',', 1)[0] or 0)
+            self.segments += 1
+        elif line.startswith('#EXT-X-STREAM-INF'):
+            self._stream_inf = parse_attributes(line)
+        elif line.startswith('#EXT-X-ENDLIST'):
+            self.ended = True
+            return False
+        elif not line.startswith('#') and self._stream_inf is not None:
+            bandwidth = self._stream_inf.get('BANDWIDTH', '0')
+            self.variants.append(
+                (int(bandwidth) if bandwidth.isdigit() else 0, line))
+            self._stream_inf = None
+        return True
+
+    def shortest_variant(self) -> str | None:
+        if not self.variants:
+            return None
+        return min(self.variants, key=lambda variant: variant[0])[1]
+
+
+class HlsProber:
+    def __init__(self, timeout: aiohttp.ClientTimeout, headers: dict | None = None) -> None:
+        self.timeout = timeout
+        self.headers = headers or {}
+
+    async def _scan(self, session: aiohttp.ClientSession, url: str) -> PlaylistScanner:
+        scanner = PlaylistScanner()
+        # the rest of the body is left unread, so the connection must not go
+        # back to the pool with a paused transport
+        headers = {**self.headers, 'Connection': 'close'}
+        async with session.get(url, headers=headers, timeout=self.timeout) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                if not scanner.feed(line.decode('utf-8', errors='ignore')):
+                    break
+        return scanner
+
+    async def probe(self, session: aiohttp.ClientSession, url: str) -> tuple[float | None, bool]:
+        scanner = await self._scan(session, url)
+        if scanner.is_master:
+            url = urljoin(url, scanner.shortest_variant())
+            scanner = await self._scan(session, url)
+        if not scanner.segments:
+            return None, False
+        return scanner.duration, scanner.ended
+
+    @inject
+    async def get_duration(self, session: aiohttp.ClientSession, url: str, service: CacheService = Provide[Container.service]) -> float | None:
+        url_hash = hashlib.md5(url.encode()).hexdigest()
+        cached = await service.get_hls_duration(url_hash)
+        if cached is not None:
+            return cached
+        duration, ended = await self.probe(session, url)
+        if duration and ended:
+            await service.set_hls_duration(url_hash, duration)
+        return duration
@@ -0,0 +1,140 @@
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
+from fastapi import HTTPException
+from src.core.config import settings
+from src.utils.stats import percentile
+
+FALLBACK_BACKEND = "html.parser"
+
+
+def resolve_backend(backend: str) -> str:
+    """
+    Returns the tree builder to use for `backend`, falling back to the
+    pure-Python html.parser if the builder's package (lxml, html5lib) is not installed.
+    """
+    try:
+        BeautifulSoup("", backend)
+    except FeatureNotFound:
+        print(f"HTML backend {backend} is not installed, using {FALLBACK_BACKEND}")
+        return FALLBACK_BACKEND
+    return backend
+
+
+html_backend = resolve_backend(settings.html_parser_backend)
+
+
+def parse_html(html: str | bytes, backend: str | None = None, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+    """
+    Builds a soup with the configured tree builder. The returned object is a
+    regular BeautifulSoup, so `select`/`select_one` CSS selectors work the same
+    for every backend.
+    :param parse_only: Keep only the elements matched by the strainer, with their
+        descendants. Ignored by html5lib.
+    """
+    return BeautifulSoup(html, backend or html_backend, parse_only=parse_only)
+
+
+@contextmanager
+def parsed_html(html: str | bytes, parse_only: SoupStrainer | None = None, backend: str | None = None) -> Iterator[BeautifulSoup]:
+    """
+    Yields the soup of the subtrees the caller needs and decomposes it on exit,
+    so the tree is freed as soon as the data is extracted instead of waiting for
+    the garbage collector to break its parent/child reference cycles.
+    Extracted values must be plain strings, not elements of the tree.
+    """
+    soup = parse_html(html, backend, parse_only)
+    try:
+        yield soup
+    finally:
+        soup.decompose()
+
+
+def _call(function: Callable, args: tuple) -> tuple[Any, tuple[int, Any] | None]:
+    # HTTPException can't be unpickled, so it is passed back as a value
+    try:
+        return function(*args), None
+    except HTTPException as e:
+        return None, (e.status_code, e.detail)
+
+
+class ParsePool:
+    """
+    Runs page parsing functions off the event loop.
+
+    With the "process" executor the function and its arguments are pickled, so
+    it must be a module-level function taking the raw page and returning plain
+    data or schemas, never soup objects. Celery prefork children are daemonic
+    and can't start processes, so there the parsing runs inline.
+    """
+
+    def __init__(self, executor: str = settings.html_parse_executor, workers: int = settings.html_parse_workers, latency_window: int = 1000) -> None:
+        """
+        :param executor: "process", "thread" or "inline".
+        :param workers: Size of the process or thread pool.
+        :param latency_window: Number of latest calls used for latency percentiles.
+        """
+        if executor == "process" and multiprocessing.current_process().daemon:
+            executor = "inline"
+        self.executor_type = executor
+        self.workers = workers
+        self._executor: Executor | None = None
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.latencies: deque[float] = deque(maxlen=latency_window)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="html-parse")
+        return self._executor
+
+    async def run(self, function: Callable, *args: Any) -> Any:
+        started = time.monotonic()
+        self.pending += 1
+        try:
+            if self.executor_type == "inline":
+                result, error = _call(function, args)
+            else:
+                result, error = await asyncio.get_running_loop().run_in_executor(self._get_executor(), _call, function, args)
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+            self.latencies.append(time.monotonic() - started)
+        self.completed += 1
+        if error:
+            raise HTTPException(status_code=error[0], detail=error[1])
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def info(self) -> dict:
+        return {
+            'executor': self.executor_type,
+            'workers': self.workers,
+            'in_flight': min(self.pending, self.workers),
+            'queue_depth': max(0, self.pending - self.workers),
+            'completed': self.completed,
+            'failed': self.failed,
+            'latency_p50_ms': percentile(self.latencies, 0.5) * 1000,
+            'latency_p95_ms': percentile(self.latencies, 0.95) * 1000,
+            'latency_max_ms': max(self.latencies, default=0) * 1000,
+        }
+
+
+parse_pool = ParsePool()
@@ -0,0 +1,42 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+import aiohttp
+from src.core.config import settings
+
+_sessions: dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300))
+        _sessions[loop] = session
+    return session
+
+
+@asynccontextmanager
+async def http_session() -> AsyncIterator[aiohttp.ClientSession]:
+    yield get_http_session()
+
+
+def upstream_url(url: str) -> str:
+    """
+    Routes an upstream url through the stand-in server if upstream_replay_url
+    is set: https://anidub.world/page/2/ becomes {upstream_replay_url}/anidub.world/page/2/.
+    """
+    if not settings.upstream_replay_url:
+        return url
+    parts = urlsplit(url)
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{settings.upstream_replay_url.rstrip('/')}/{parts.netloc}{parts.path}{query}"
+
+
+async def close_http_sessions():
+    loop = asyncio.get_running_loop()
+    session = _sessions.pop(loop, None)
+    if session and not session.closed:
+        await session.close()
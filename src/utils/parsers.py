@@ -1,24 +1,64 @@
 import asyncio
+import hashlib
 from dataclasses import dataclass
-from typing import Callable, List
+from typing import Awaitable, Callable, List
 from uuid import UUID
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from dependency_injector.wiring import Provide
 from fastapi.logger import logger
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from src.crud.episodes_crud import EpisodesCrud
 from src.crud.genres_crud import GenresCrud
 from src.db.session import AsyncSession
 from src.crud.titles_crud import TitlesCrud
-from src.schemas.parsers import Genre, LinkParsedTitle, ParsedGenre, ParsedEpisode, ParsedTitle, ParsedTitleShort, ParsedTitlesPage, Episode, Title, TitleLink, TitleShort, ShikimoriTitle, TitlesPage
+from src.schemas.parsers import Genre, LinkParsedTitle, ParsedGenre, ParsedEpisode, ParsedTitle, ParsedTitleShort, ParsedTitlesPage, Episode, Title, TitleLink, TitleShort, ShikimoriTitle, TitlesPage, MainPage
 from src.redis.services import CacheService
 from src.redis.containers import Container
 from src.models.parsers import EpisodeSource, Title as TitleModel, Genre as GenreModel
 from src.models.users import User as UserModel
 from src.utils.shikimori import Shikimori
+from src.utils.conditional import PageNotModified, conditional_fetch
+from src.utils.upstream import CircuitOpenError, get_upstream
+from src.utils.responses import PreserializedJSONResponse
 from src.core.config import settings
 from abc import ABC, abstractmethod
 
 
+# response fields filled from the parsed title, all of them strings, so the
+# values of the shared cached title are immutable
+TITLE_FIELDS = tuple(key for key in ParsedTitle.model_fields if key in Title.model_fields)
+SHORT_TITLES = TypeAdapter(List[TitleShort])
+
+
+def title_response(db_title: TitleModel, title_obj: ParsedTitle) -> Title:
+    return Title.model_validate({
+        'id': db_title.id,
+        'parser_id': db_title.parser_id,
+        **{key: getattr(title_obj, key) for key in TITLE_FIELDS},
+    })
+
+
+def short_titles(titles: List[tuple[TitleModel, ParsedTitleShort]]) -> List[TitleShort]:
+    """
+    Validates a page of titles in one call, from plain values rather than the
+    ORM rows' attributes. Titles that fail validation are logged and left out.
+    """
+    rows = [{
+        'id': db_title.id,
+        'parser_id': db_title.parser_id,
+        'name': db_title.name,
+        'image_url': db_title.image_url,
+        'en_name': parsed_title.en_name,
+        'additional_info': parsed_title.additional_info,
+    } for db_title, parsed_title in titles]
+    try:
+        return SHORT_TITLES.validate_python(rows)
+    except ValidationError as e:
+        logger.error(f'Failed to validate titles: {e}')
+        invalid = {error['loc'][0] for error in e.errors()}
+        return SHORT_TITLES.validate_python([row for index, row in enumerate(rows) if index not in invalid])
+
+
 @dataclass
 class ParserFunctions:
     get_titles: Callable[[int], ParsedTitlesPage]
@@ -41,7 +81,8 @@ class Parser(ABC):
         self.parser_id = id
         self.titles_cache_period = settings.titles_cache_hours
         self.genres_cache_period = settings.genres_cache_hours
-        self.functions = functions
+        self.upstream = get_upstream(id)
+        self.functions = self.upstream.wrap(functions)
         self.main_pages_count = main_pages_count
         self.order = order
 
@@ -51,11 +92,18 @@ class Parser(ABC):
     async def get_title_data(self, db_title: TitleModel, service: CacheService) -> ParsedTitle:
         title_id = db_title.id
         is_expired, cached_title = await self._get_cached_title(title_id, service)
-        if not cached_title or is_expired or not db_title.image_url:
-            title_obj = await self._update_title_cache(db_title.id_on_website, title_id, service)
-        else:
-            title_obj = ParsedTitle(**cached_title)
-        return title_obj
+        if cached_title and (self.upstream.is_open or not (is_expired or not db_title.image_url)):
+            return cached_title
+        try:
+            return await self._update_title_cache(db_title.id_on_website, title_id, service)
+        except CircuitOpenError:
+            raise HTTPException(
+                status_code=503, detail='Source is temporarily unavailable.')
+        except Exception:
+            if not cached_title:
+                raise
+            logger.error(f'Failed to update title {title_id}, using stale data')
+            return cached_title
 
     async def get_title(self, db_title: TitleModel, background_tasks: BackgroundTasks, db: AsyncSession, current_user: UserModel, service: CacheService = Depends(Provide[Container.service])) -> Title:
         title_obj = await self.get_title_data(db_title=db_title, service=service)
@@ -69,7 +117,7 @@ class Parser(ABC):
     async def get_titles(self, page: int, db: AsyncSession, background_tasks: BackgroundTasks | None = None, service: CacheService = Depends(Provide[Container.service])) -> TitlesPage:
         is_expired = await service.expire_status(parser_id=self.parser_id)
         cached_titles_page = await service.get_titles(parser_id=self.parser_id, page=page)
-        if is_expired and cached_titles_page and background_tasks:
+        if is_expired and cached_titles_page and background_tasks and not self.upstream.is_open:
             background_tasks.add_task(self.update_titles, page, service)
         titles_page = cached_titles_page if cached_titles_page else await self.update_titles(page=page, service=service, raise_error=True)
         return await self._prepare_titles(titles_page=titles_page, db=db, background_tasks=background_tasks)
@@ -87,7 +135,7 @@ class Parser(ABC):
     async def get_genres_data(self, service: CacheService, background_tasks: BackgroundTasks) -> List[ParsedGenre]:
         is_expired = await service.genres_expire_status(parser_id=self.parser_id)
         cached_genres = await service.get_genres(parser_id=self.parser_id)
-        if is_expired and cached_genres:
+        if is_expired and cached_genres and not self.upstream.is_open:
             background_tasks.add_task(self.update_genres, service)
         genres_objs = cached_genres if cached_genres else await self.update_genres(service, raise_error=True)
         return genres_objs
@@ -100,12 +148,51 @@ class Parser(ABC):
         genre_id = db_genre.id
         is_expired = await service.expire_status(parser_id=self.parser_id)
         cached_titles_page = await service.get_genre_titles(parser_id=self.parser_id, genre_id=genre_id, page=page)
-        if is_expired and cached_titles_page:
+        if is_expired and cached_titles_page and not self.upstream.is_open:
             background_tasks.add_task(self.update_genre, genre_id=genre_id, page=page,
                                       service=service, genre_website_id=db_genre.id_on_website)
         titles_page = cached_titles_page if cached_titles_page else await self.update_genre(genre_id=genre_id, page=page, service=service, raise_error=True, genre_website_id=db_genre.id_on_website)
         return await self._prepare_titles(titles_page=titles_page, db=db, background_tasks=background_tasks)
 
+    async def get_titles_response(self, page: int, db: AsyncSession, background_tasks: BackgroundTasks, service: CacheService = Depends(Provide[Container.service])) -> PreserializedJSONResponse:
+        return await self._cached_response(
+            key=f"{self.parser_id}:titles:{page}",
+            prepare=lambda: self.get_titles(page=page, db=db, background_tasks=background_tasks, service=service),
+            service=service
+        )
+
+    async def get_main_titles_response(self, background_tasks: BackgroundTasks, db: AsyncSession, service: CacheService = Depends(Provide[Container.service])) -> PreserializedJSONResponse:
+        async def prepare() -> MainPage:
+            page = await self.get_main_titles(background_tasks=background_tasks, db=db, service=service)
+            return MainPage(titles=page.titles, total_pages=page.total_pages, pages_on_main=self.main_pages_count)
+
+        return await self._cached_response(key=f"{self.parser_id}:titles:main", prepare=prepare, service=service)
+
+    async def get_genre_response(self, db_genre: GenreModel, page: int, background_tasks: BackgroundTasks, db: AsyncSession, service: CacheService = Depends(Provide[Container.service])) -> PreserializedJSONResponse:
+        return await self._cached_response(
+            key=f"{self.parser_id}:titles:{db_genre.id}:{page}",
+            prepare=lambda: self.get_genre(db_genre=db_genre, page=page, background_tasks=background_tasks, db=db, service=service),
+            service=service
+        )
+
+    async def _cached_response(self, key: str, prepare: Callable[[], Awaitable[BaseModel]], service: CacheService) -> PreserializedJSONResponse:
+        """
+        Serves the JSON rendered from the cached page `key` while the parser data
+        is fresh, so a hit skips preparing, validating and encoding the page.
+        An expired page is prepared as usual, which schedules its refresh, and is
+        not stored; rewriting the page drops the rendered response.
+        """
+        is_expired = await service.expire_status(parser_id=self.parser_id)
+        if not is_expired:
+            cached = await service.get_response(key)
+            if cached:
+                return PreserializedJSONResponse(cached["body"], etag=cached["etag"])
+        body = (await prepare()).model_dump_json()
+        etag = hashlib.md5(body.encode()).hexdigest()
+        if not is_expired:
+            await service.set_response(key, body, etag, seconds=settings.response_cache_seconds)
+        return PreserializedJSONResponse(body, etag=etag)
+
     async def _get_cached_title(self, title_id: UUID, service: CacheService):
         is_expired = await service.expire_status(parser_id=self.parser_id)
         cached_title = await service.get_title(parser_id=self.parser_id, title_id=title_id)
@@ -123,9 +210,9 @@ class Parser(ABC):
         if not fail_status:
             try:
                 if not db_title.shikimori_fetched:
-                    shikimori_title = await Shikimori(service=service).get_title(title_obj)
-                    db_title = await TitlesCrud(db).update_shikimori_info(db_title=db_title, shikimori_id=int(shikimori_title.data['id']) if shikimori_title else None)
-                elif db_title.shikimori_id:
+                    match = await Shikimori(service=service, db=db).match_title(title_obj)
+                    db_title = await TitlesCrud(db).update_shikimori_info(db_title=db_title, shikimori_id=int(match['id']) if match else None)
+                if db_title.shikimori_id:
                     shikimori_title = await Shikimori(service=service).get_shikimori_title(title_id=db_title.shikimori_id, background_tasks=background_tasks)
             except Exception as e:
                 logger.error(f'Failed to fetch shikimori info: {e}')
@@ -183,10 +270,7 @@ class Parser(ABC):
             background_tasks.add_task(
                 self.update_title_in_db, title_id=db_title.id, db=db, title_data=title_obj)
         db_title, shikimori_title, fetch_failed = await self._prepare_title_shikimori(title_obj=title_obj, db_title=db_title, db=db, service=service, background_tasks=background_tasks)
-        title_db_obj = Title.model_validate(db_title)
-        for key, value in title_obj.model_dump().items():
-            if hasattr(title_db_obj, key):
-                setattr(title_db_obj, key, value)
+        title_db_obj = title_response(db_title, title_obj)
         title_db_obj.episodes = await self.prepare_episodes(title=title_obj, title_id=db_title.id, db=db, service=service, current_user=current_user)
         title_db_obj.shikimori = shikimori_title
         title_db_obj.shikimori_failed = fetch_failed
@@ -216,18 +300,42 @@ class Parser(ABC):
 
     async def update_titles(self, page: int, service: CacheService, raise_error: bool = False) -> List[ParsedTitleShort]:
         try:
-            titles_page = await self.functions.get_titles(page)
-            await self._cache_titles(titles_page=titles_page, page=page, service=service)
+            titles_page, _ = await self.refresh_titles(page=page, service=service)
             return titles_page
         except HTTPException as e:
             if raise_error:
                 raise e
+        except CircuitOpenError as e:
+            logger.error(f'Failed to fetch titles: {e}')
+            if raise_error:
+                raise HTTPException(
+                    status_code=503, detail='Source is temporarily unavailable.')
         except Exception as e:
             logger.error(f'Failed to fetch titles: {e}')
             if raise_error:
                 raise HTTPException(
                     status_code=500, detail='Failed to fetch titles.')
 
+    async def refresh_titles(self, page: int, service: CacheService) -> tuple[ParsedTitlesPage, bool]:
+        """
+        Fetches and caches a titles page. If the page is cached the fetch is
+        conditional, and when the upstream page hasn't changed the cached copy is
+        returned without parsing or re-caching it.
+        :return: The page and whether it changed.
+        """
+        cached_titles_page = await service.get_titles(parser_id=self.parser_id, page=page)
+        try:
+            async with conditional_fetch(service, conditional=cached_titles_page is not None):
+                titles_page = await self.functions.get_titles(page)
+                await self._cache_titles(titles_page=titles_page, page=page, service=service)
+        except PageNotModified:
+            await self.update_expire_status(service=service)
+            await service.incr_stats("conditional_get", f"{self.parser_id}:not_modified")
+            return cached_titles_page, False
+        if cached_titles_page is not None:
+            await service.incr_stats("conditional_get", f"{self.parser_id}:changed")
+        return titles_page, True
+
     async def _cache_titles(self, titles_page: ParsedTitlesPage, page: int, service: CacheService):
         await service.set_titles(titles_page=titles_page.model_dump(), page=page, parser_id=self.parser_id)
         await self.update_expire_status(service=service)
@@ -252,6 +360,11 @@ class Parser(ABC):
         except HTTPException as e:
             if raise_error:
                 raise e
+        except CircuitOpenError as e:
+            logger.error(f'Failed to fetch title: {e}')
+            if raise_error:
+                raise HTTPException(
+                    status_code=503, detail='Source is temporarily unavailable.')
         except Exception as e:
             logger.error(f'Failed to fetch title: {e}')
             if raise_error:
@@ -272,6 +385,11 @@ class Parser(ABC):
         except HTTPException as e:
             if raise_error:
                 raise e
+        except CircuitOpenError as e:
+            logger.error(f'Failed to fetch genres: {e}')
+            if raise_error:
+                raise HTTPException(
+                    status_code=503, detail='Source is temporarily unavailable.')
         except Exception as e:
             logger.error(f'Failed to fetch genres: {e}')
             if raise_error:
@@ -280,12 +398,24 @@ class Parser(ABC):
 
     async def update_genre(self, genre_website_id: str, genre_id: UUID, page: int, service: CacheService, raise_error: bool = False) -> List[ParsedTitleShort]:
         try:
-            titles_page = await self.functions.get_genre(genre_website_id, page)
-            await service.set_genre_titles(parser_id=self.parser_id, genre_id=genre_id, page=page, titles_page=titles_page.model_dump())
+            cached_titles_page = await service.get_genre_titles(parser_id=self.parser_id, genre_id=genre_id, page=page)
+            async with conditional_fetch(service, conditional=cached_titles_page is not None):
+                titles_page = await self.functions.get_genre(genre_website_id, page)
+                await service.set_genre_titles(parser_id=self.parser_id, genre_id=genre_id, page=page, titles_page=titles_page.model_dump())
+            if cached_titles_page is not None:
+                await service.incr_stats("conditional_get", f"{self.parser_id}:changed")
             return titles_page
+        except PageNotModified:
+            await service.incr_stats("conditional_get", f"{self.parser_id}:not_modified")
+            return cached_titles_page
         except HTTPException as e:
             if raise_error:
                 raise e
+        except CircuitOpenError as e:
+            logger.error(f'Failed to fetch genre titles: {e}')
+            if raise_error:
+                raise HTTPException(
+                    status_code=503, detail='Source is temporarily unavailable.')
         except Exception as e:
             logger.error(f'Failed to fetch genre titles: {e}')
             if raise_error:
@@ -326,7 +456,7 @@ class Parser(ABC):
         return await TitlesCrud(db).get_related_titles_by_link_id(link_id=related_link.id)
 
     async def _prepare_titles(self, titles_page: ParsedTitlesPage, db: AsyncSession, background_tasks: BackgroundTasks) -> TitlesPage:
-        db_titles = []
+        titles = []
         existing_titles = await TitlesCrud(db).get_titles_by_website_ids(website_ids=[title.id_on_website for title in titles_page.titles])
         existing_ids_set = {title.id_on_website for title in existing_titles}
         for parsed_title in titles_page.titles:
@@ -338,16 +468,9 @@ class Parser(ABC):
                 if await self.title_data_changed(parsed_title, title) and background_tasks:
                     background_tasks.add_task(
                         self.update_title_in_db, title_id=title.id, db=db, title_data=parsed_title)
-            if not title.image_url:
-                continue
-            try:
-                title_obj = TitleShort.model_validate(title)
-                title_obj.additional_info = parsed_title.additional_info
-                title_obj.en_name = parsed_title.en_name
-                db_titles.append(title_obj)
-            except Exception as e:
-                logger.error(f'Failed to validate title: {e}')
-        return TitlesPage(titles=db_titles, total_pages=titles_page.total_pages)
+            if title.image_url:
+                titles.append((title, parsed_title))
+        return TitlesPage(titles=short_titles(titles), total_pages=titles_page.total_pages)
 
     async def _prepare_genres_names(self, genres_names: List[str], db: AsyncSession, background_tasks: BackgroundTasks, service: CacheService = Depends(Provide[Container.service])) -> List[Genre]:
         all_genres = await self.get_genres_data(service=service, background_tasks=background_tasks)
@@ -394,4 +517,5 @@ class Parser(ABC):
 container = Container()
 container.config.redis_host.from_value(settings.REDIS_HOST)
 container.config.redis_password.from_value(settings.REDIS_PASSWORD)
-container.wire(modules=[__name__])
+# the worker helpers are wired here too, so they share this container's redis pool
+container.wire(modules=[__name__, "src.utils.hls", "src.utils.tasks"])
@@ -0,0 +1,26 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        :param rate: Tokens added per second.
+        :param capacity: Maximum number of tokens, i.e. the allowed burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens +
+                          (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, tokens: float = 1):
+        self._refill()
+        self.tokens -= tokens
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
@@ -0,0 +1,19 @@
+from fastapi.responses import Response
+
+
+class PreserializedJSONResponse(Response):
+    """
+    JSON body rendered ahead of time, e.g. kept in the cache tier. Returned from
+    an endpoint it is sent as is, skipping FastAPI's validation and encoding of
+    the response model, which then only documents the schema.
+    """
+    media_type = "application/json"
+
+    def __init__(self, body: str | bytes, etag: str | None = None, **kwargs) -> None:
+        """
+        :param etag: Version of the body, the same for the same content. Left out
+            for bodies rendered per request, which would only fill the caches keyed by it.
+        """
+        super().__init__(body, **kwargs)
+        if etag:
+            self.headers["ETag"] = f'"{etag}"'
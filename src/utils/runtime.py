@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine
+from src.db.session import engine
+from src.utils.http import close_http_sessions
+
+
+class WorkerRuntime:
+    """
+    One long-lived event loop per worker process.
+
+    The loop runs in a background thread, so every Celery task (whatever pool
+    it runs in) submits its coroutine to the same loop and reuses the asyncpg
+    pool, the redis pool and the aiohttp session created on it.
+    """
+
+    def __init__(self) -> None:
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.loop is not None and self.loop.is_running()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            engine.sync_engine.dispose(close=False)
+            self.loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(self.loop)
+                self.loop.call_soon(started.set)
+                self.loop.run_forever()
+
+            self._thread = threading.Thread(
+                target=run_loop, name="worker-runtime", daemon=True)
+            self._thread.start()
+            started.wait()
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return
+            asyncio.run_coroutine_threadsafe(
+                self._close_resources(), self.loop).result(timeout=10)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=10)
+            self.loop.close()
+            self.loop = None
+            self._thread = None
+
+    async def _close_resources(self):
+        await close_http_sessions()
+        await engine.dispose()
+
+    def submit(self, coro: Coroutine) -> Future:
+        if not self.running:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine) -> Any:
+        return self.submit(coro).result()
+
+
+runtime = WorkerRuntime()
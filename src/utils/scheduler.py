@@ -0,0 +1,95 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from uuid import uuid4
+from src.core.config import settings
+from src.redis.services import CacheService
+from src.utils.tasks import IdempotentTask, get_service
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    task: IdempotentTask
+    interval: int
+    args: tuple = field(default_factory=tuple)
+
+
+class Scheduler:
+    """
+    Enqueues periodic jobs from whichever worker holds the scheduler lease.
+
+    Every worker runs the loop, but only the lease holder dispatches, so a
+    crashed worker is replaced as soon as its lease expires. Schedule records
+    (next run, last enqueue) live in redis, so a new leader continues the same
+    schedule; the jobs themselves are IdempotentTask, so a run that is still
+    queued or in progress is never enqueued twice.
+    """
+
+    def __init__(self, jobs: list[ScheduledJob], tick: int = settings.scheduler_tick_seconds, jitter: float = settings.scheduler_jitter_ratio) -> None:
+        self.jobs = jobs
+        self.tick = tick
+        self.jitter = jitter
+        self.token = str(uuid4())
+        self._task: asyncio.Task | None = None
+
+    def _next_run(self, job: ScheduledJob, now: float) -> float:
+        return now + job.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def dispatch(self, service: CacheService) -> bool:
+        if not await service.acquire_lease("scheduler", self.token, seconds=self.tick * 3):
+            return False
+        now = time.time()
+        for job in self.jobs:
+            schedule = await service.get_schedule(job.name)
+            if 'next_run' not in schedule:
+                # spread the first runs of a fresh schedule over one tick
+                await service.set_schedule(job.name, next_run=now + random.uniform(0, self.tick))
+                continue
+            if float(schedule['next_run']) > now:
+                continue
+            try:
+                enqueued = await job.task.enqueue(job.args)
+            except Exception as e:
+                print(f"Error while enqueuing {job.name}: {e}")
+                continue
+            fields = {'next_run': self._next_run(job, now)}
+            if enqueued:
+                fields['last_enqueued'] = now
+            await service.set_schedule(job.name, **fields)
+        return True
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.dispatch(await get_service())
+            except Exception as e:
+                print(f"Scheduler error: {e}")
+            await asyncio.sleep(self.tick)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        def create_task():
+            self._task = loop.create_task(self.run_forever())
+        loop.call_soon_threadsafe(create_task)
+
+    def stop(self):
+        if self._task:
+            self._task.get_loop().call_soon_threadsafe(self._task.cancel)
+            self._task = None
+
+    async def get_jobs_info(self, service: CacheService) -> list[dict]:
+        jobs = []
+        for job in self.jobs:
+            schedule = await service.get_schedule(job.name)
+            run = await service.get_task_run(job.task.lock_key(job.args))
+            jobs.append({
+                'name': job.name,
+                'interval': job.interval,
+                'next_run': float(schedule['next_run']) if 'next_run' in schedule else None,
+                'last_enqueued': float(schedule['last_enqueued']) if 'last_enqueued' in schedule else None,
+                'last_started': float(run['last_started']) if 'last_started' in run else None,
+                'last_duration': float(run['last_duration']) if 'last_duration' in run else None,
+                'last_status': run.get('last_status'),
+            })
+        return jobs
@@ -1,11 +1,30 @@
 from datetime import datetime, timedelta
 import json
+import re
+import unicodedata
 from fastapi import BackgroundTasks
-from src.schemas.parsers import ParsedTitle, ShikimoriTitle
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.crud.shikimori_names_crud import ShikimoriNamesCrud
+from src.schemas.parsers import ParsedTitle, ParsedTitleShort, ShikimoriTitle
+from src.models.parsers import Title as TitleModel
 from src.redis.services import CacheService
 import aiohttp
+from src.utils.http import http_session, upstream_url
+from src.utils.rate_limit import TokenBucket
+from src.core.config import settings
 
-API_URL = "https://shikimori.one/api/graphql"
+API_URL = upstream_url("https://shikimori.one/api/graphql")
+anime_light_schema = """
+{
+    id
+    name
+    russian
+    english
+    synonyms
+    kind
+    airedOn { year }
+}
+"""
 anime_schema = """
 {
     id
@@ -37,77 +56,151 @@ anime_schema = """
     }
     screenshots { id originalUrl x166Url x332Url }
     description
-  }
 }
 """
 
 
+rate_limiter = TokenBucket(
+    rate=settings.shikimori_requests_per_minute / 60, capacity=5)
+
+
+def normalize_name(name: str | None) -> str | None:
+    if not name:
+        return None
+    name = unicodedata.normalize('NFKC', name).casefold().replace('ё', 'е')
+    name = re.sub(r'[^\w]+', ' ', name)
+    return ' '.join(name.split()) or None
+
+
+def title_names(title: ParsedTitleShort | TitleModel) -> list[str]:
+    names = [normalize_name(title.en_name), normalize_name(title.name)]
+    return [name for name in dict.fromkeys(names) if name]
+
+
 class Shikimori:
-    def __init__(self, service: CacheService) -> None:
+    def __init__(self, service: CacheService, db: AsyncSession | None = None) -> None:
         self.service = service
+        self.db = db
         self.timeout = aiohttp.ClientTimeout(total=5)
 
-    async def get_title(self, title: ParsedTitle) -> ShikimoriTitle:
-        async with aiohttp.ClientSession(
-            timeout=self.timeout
-        ) as session:
-            name = json.dumps(title.en_name or title.name)
-            name = name[1:-1]
-            query = "{" + \
-                f'animes(search: "{name}", limit: 1)' + anime_schema + "}"
+    async def _query(self, query: str, timeout: aiohttp.ClientTimeout | None = None) -> dict:
+        await rate_limiter.acquire()
+        async with http_session() as session:
             async with session.post(API_URL, json={
                 "query": query
-            }) as response:
+            }, timeout=timeout or self.timeout) as response:
                 data = await response.json()
                 if not data.get('data'):
-                    return
-                title_info = data['data']['animes']
-                if len(title_info) > 0:
-                    return await self.service.set_shikimori_title(title_info[0]['id'], title_info[0])
+                    raise ValueError(
+                        f"Shikimori query failed: {data.get('errors')}")
+                return data['data']
+
+    def _search_field(self, title: ParsedTitleShort | TitleModel) -> str:
+        name = json.dumps(title.en_name or title.name)
+        name = name[1:-1]
+        return f'animes(search: "{name}", limit: 1)'
+
+    async def _search_titles(self, titles: list[ParsedTitleShort | TitleModel]) -> list[dict | None]:
+        matches = []
+        batch_size = settings.shikimori_batch_size
+        for start in range(0, len(titles), batch_size):
+            batch = titles[start:start + batch_size]
+            query = "{" + "".join(
+                f't{index}: {self._search_field(title)}' + anime_light_schema
+                for index, title in enumerate(batch)
+            ) + "}"
+            data = await self._query(query, timeout=aiohttp.ClientTimeout(total=5 * len(batch)))
+            for index in range(len(batch)):
+                title_info = data.get(f't{index}') or []
+                matches.append(title_info[0] if title_info else None)
+        return matches
+
+    async def match_titles(self, titles: list[ParsedTitleShort | TitleModel]) -> list[dict | None]:
+        """
+        Names already matched by any parser are resolved from the shikimori_names
+        table and come back as {'id': ...} without an upstream search.
+        """
+        if self.db is None:
+            return await self._search_titles(titles)
+        names_crud = ShikimoriNamesCrud(self.db)
+        known = await names_crud.get_shikimori_ids(
+            [name for title in titles for name in title_names(title)])
+        matches: list[dict | None] = []
+        missed = []
+        for title in titles:
+            shikimori_id = next((known[name] for name in title_names(title) if name in known), None)
+            matches.append({'id': str(shikimori_id)} if shikimori_id else None)
+            if not shikimori_id:
+                missed.append(len(matches) - 1)
+        await self.service.incr_stats("shikimori_names", "hits", len(titles) - len(missed))
+        await self.service.incr_stats("shikimori_names", "misses", len(missed))
+        if not missed:
+            return matches
+        found = {}
+        for index, match in zip(missed, await self._search_titles([titles[index] for index in missed])):
+            matches[index] = match
+            if not match:
+                continue
+            for name in title_names(titles[index]) + [normalize_name(match.get('name')), normalize_name(match.get('russian'))]:
+                if name:
+                    found.setdefault(name, int(match['id']))
+        await names_crud.add_shikimori_ids(found)
+        return matches
+
+    async def match_title(self, title: ParsedTitle) -> dict | None:
+        return (await self.match_titles([title]))[0]
 
     async def update_shikimori_title(self, title_id: int):
-        async with aiohttp.ClientSession(
-            timeout=self.timeout
-        ) as session:
-            async with session.post(API_URL, json={
-                "query": "{" + f'animes(ids: "{title_id}")' + anime_schema + "}"
-            }) as response:
-                data = await response.json()
-                title_json = data['data']['animes'][0]
+        data = await self._query("{" + f'animes(ids: "{title_id}")' + anime_schema + "}")
+        title_json = data['animes'][0]
         title = await self.service.set_shikimori_title(title_id, title_json)
         return title
 
+    async def update_shikimori_titles(self, titles_ids: list[int]) -> int:
+        updated = 0
+        batch_size = settings.shikimori_batch_size
+        for start in range(0, len(titles_ids), batch_size):
+            batch = titles_ids[start:start + batch_size]
+            ids = ",".join(str(title_id) for title_id in batch)
+            data = await self._query("{" + f'animes(ids: "{ids}", limit: {len(batch)})' + anime_schema + "}",
+                                     timeout=aiohttp.ClientTimeout(total=5 * len(batch)))
+            for title_json in data['animes']:
+                await self.service.set_shikimori_title(int(title_json['id']), title_json)
+                updated += 1
+        return updated
+
     async def get_shikimori_title(self, title_id: int, background_tasks: BackgroundTasks) -> ShikimoriTitle:
+        await self.service.track_shikimori_read(title_id)
         cached = await self.service.get_shikimori_title(title_id)
         if not cached:
+            await self.service.incr_stats("shikimori_cache", "misses")
             title = await self.update_shikimori_title(title_id)
         else:
+            await self.service.incr_stats("shikimori_cache", "hits")
             title = cached
             if title.last_fetch < datetime.now() - timedelta(days=7):
                 background_tasks.add_task(
                     self.update_shikimori_title, title_id)
         return title
 
+    async def update_popular_ongoings(self, page: int):
+        query = '''{
+            animes(limit: 15, status: "ongoing", order: popularity, page: %s) {
+                id
+                name
+                russian
+                score
+                poster { mainUrl }
+            }
+        }''' % page
+        data = (await self._query(query))['animes']
+        await self.service.set_popular_ongoings(page, data)
+        return data
+
     async def get_popular_ongoings(self, page: int):
         cached = await self.service.get_popular_ongoings(page)
         if cached:
+            await self.service.incr_stats("shikimori_cache", "ongoings_hits")
             return cached
-        async with aiohttp.ClientSession(
-            timeout=self.timeout
-        ) as session:
-            query = '''{
-                animes(limit: 15, status: "ongoing", order: popularity, page: %s) {
-                    id
-                    name
-                    russian
-                    score
-                    poster { mainUrl }
-                }
-            }''' % page
-            async with session.post(API_URL, json={
-                "query": query
-            }) as response:
-                data = await response.json()
-                data = data['data']['animes']
-                await self.service.set_popular_ongoings(page, data)
-                return data
+        await self.service.incr_stats("shikimori_cache", "ongoings_misses")
+        return await self.update_popular_ongoings(page)
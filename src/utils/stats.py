@@ -0,0 +1,11 @@
+from typing import Iterable
+
+
+def percentile(values: Iterable[float], value: float) -> float:
+    """
+    Nearest-rank percentile, 0 for no values.
+
+    :param value: Fraction of the values at or below the result, e.g. 0.95.
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * value))] if values else 0
@@ -0,0 +1,70 @@
+import inspect
+import time
+from typing import Any
+from uuid import uuid4
+from celery import Task
+from dependency_injector.wiring import Provide, inject
+from src.redis.services import CacheService
+from src.redis.containers import Container
+from src.core.config import settings
+from src.utils.runtime import runtime
+
+
+@inject
+async def get_service(service: CacheService = Provide[Container.service]) -> CacheService:
+    return service
+
+
+class IdempotentTask(Task):
+    """
+    Celery task with at most one queued or running instance per idempotency key.
+
+    `enqueue` takes a redis lock named after the task and key, holding the new
+    task id, and counts the call as dropped if the lock is taken. The lock is
+    released when the task returns. Start time, duration and status of the last
+    run are kept per key for the scheduler.
+    """
+    abstract = True
+    # format string over the task arguments, e.g. "{parser_id}"
+    idempotency_key: str = ""
+    lock_timeout: int = settings.task_lock_timeout_seconds
+
+    def lock_key(self, args: tuple | list = (), kwargs: dict | None = None) -> str:
+        arguments = inspect.signature(self.run).bind(*args, **(kwargs or {})).arguments
+        return f"{self.name}:{self.idempotency_key.format(**arguments)}"
+
+    async def enqueue(self, args: tuple | list = (), kwargs: dict | None = None, countdown: int = 0, **options: Any) -> bool:
+        service = await get_service()
+        task_id = str(uuid4())
+        key = self.lock_key(args, kwargs)
+        if not await service.acquire_task_lock(key, task_id, seconds=countdown + self.lock_timeout):
+            await service.incr_stats("dropped_tasks", self.name)
+            return False
+        try:
+            self.apply_async(args=args, kwargs=kwargs,
+                             countdown=countdown, task_id=task_id, **options)
+        except Exception:
+            await service.release_task_lock(key, task_id)
+            raise
+        return True
+
+    async def release(self, token: str, args: tuple | list = (), kwargs: dict | None = None):
+        service = await get_service()
+        await service.release_task_lock(self.lock_key(args, kwargs), token)
+
+    async def record_run(self, args: tuple | list = (), kwargs: dict | None = None, **fields):
+        service = await get_service()
+        await service.set_task_run(self.lock_key(args, kwargs), **fields)
+
+    async def finish(self, token: str, args: tuple | list = (), kwargs: dict | None = None, **fields):
+        await self.record_run(args, kwargs, **fields)
+        await self.release(token, args, kwargs)
+
+    def before_start(self, task_id, args, kwargs):
+        self.request.started_at = time.time()
+        # the task body waits on the same loop, so the start is not waited for
+        runtime.submit(self.record_run(args, kwargs, last_started=self.request.started_at))
+
+    def after_return(self, status, retval, task_id, args, kwargs, einfo):
+        duration = time.time() - getattr(self.request, 'started_at', time.time())
+        runtime.run(self.finish(task_id, args, kwargs, last_duration=duration, last_status=status))
@@ -0,0 +1,155 @@
+import math
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Iterable
+from uuid import UUID
+from src.utils.shikimori import title_names
+
+NGRAM_SIZE = 3
+
+
+def ngrams(name: str, size: int = NGRAM_SIZE) -> frozenset[str]:
+    padded = f' {name} '
+    return frozenset(padded[i:i + size] for i in range(max(len(padded) - size + 1, 1)))
+
+
+def parse_year(year: str | None) -> int | None:
+    if year and year[:4].isdigit():
+        return int(year[:4])
+    return None
+
+
+@dataclass
+class TitleEntry:
+    id: UUID
+    parser_id: str
+    shikimori_id: int | None
+    year: int | None
+    kind: str | None
+    names: list[frozenset[str]]
+
+
+@dataclass
+class TitleMatchProposal:
+    title_id: UUID
+    matched_title_id: UUID
+    score: float
+
+
+class TitleMatcher:
+    """
+    Proposes links between titles of different parsers without Shikimori.
+
+    Every normalized name/en_name is split into character trigrams. Candidates
+    come from an inverted index over the rarest trigrams of each name (prefix
+    filtering) and are scored by Jaccard similarity of their best pair of
+    names; year and kind are used as filters.
+    A pair is proposed only if each title is the other's best candidate.
+    """
+
+    def __init__(self, threshold: float = 0.6, year_tolerance: int = 1, kind_penalty: float = 0.8) -> None:
+        """
+        :param threshold: Minimal score of a proposal.
+        :param year_tolerance: Maximal difference of known years.
+        :param kind_penalty: Score multiplier for titles of different known kinds.
+        """
+        self.threshold = threshold
+        self.year_tolerance = year_tolerance
+        self.kind_penalty = kind_penalty
+
+    def _entries(self, titles: Iterable[Any]) -> list[TitleEntry]:
+        entries = []
+        for title in titles:
+            names = [ngrams(name) for name in title_names(title)]
+            if not names:
+                continue
+            entries.append(TitleEntry(
+                id=title.id,
+                parser_id=title.parser_id,
+                shikimori_id=title.shikimori_id,
+                year=parse_year(title.year),
+                kind=title.kind,
+                names=names,
+            ))
+        return entries
+
+    def _allowed(self, first: TitleEntry, second: TitleEntry) -> bool:
+        if first.parser_id == second.parser_id:
+            return False
+        if first.shikimori_id and second.shikimori_id:
+            return False
+        return not (first.year and second.year and abs(first.year - second.year) > self.year_tolerance)
+
+    def _prefix(self, grams: frozenset[str], frequency: Counter) -> list[str]:
+        # two names with jaccard >= threshold always share one of the rarest
+        # len - ceil(threshold * len) + 1 trigrams of each of them
+        length = len(grams) - math.ceil(self.threshold * len(grams)) + 1
+        return sorted(grams, key=lambda gram: (frequency[gram], gram))[:length]
+
+    def propose(self, titles: Iterable[Any]) -> list[TitleMatchProposal]:
+        entries = self._entries(titles)
+        names = [(position, grams) for position, entry in enumerate(entries) for grams in entry.names]
+        frequency = Counter(gram for _, grams in names for gram in grams)
+        prefixes = [self._prefix(grams, frequency) for _, grams in names]
+        index: dict[str, list[int]] = defaultdict(list)
+        for name_id, prefix in enumerate(prefixes):
+            for gram in prefix:
+                index[gram].append(name_id)
+
+        best: dict[tuple[int, str], tuple[float, int]] = {}
+        for name_id, (position, grams) in enumerate(names):
+            entry = entries[position]
+            candidates = {other_id for gram in prefixes[name_id] for other_id in index[gram]}
+            for other_id in candidates:
+                other, other_grams = names[other_id]
+                if not self._allowed(entry, entries[other]):
+                    continue
+                shared = len(grams & other_grams)
+                score = shared / (len(grams) + len(other_grams) - shared)
+                if entry.kind and entries[other].kind and entry.kind != entries[other].kind:
+                    score *= self.kind_penalty
+                key = (position, entries[other].parser_id)
+                if score >= self.threshold and score > best.get(key, (0.0, -1))[0]:
+                    best[key] = (score, other)
+
+        proposals = []
+        for (position, _), (score, other) in best.items():
+            if best.get((other, entries[position].parser_id), (0.0, -1))[1] == position:
+                proposals.append(TitleMatchProposal(
+                    title_id=entries[position].id, matched_title_id=entries[other].id, score=score))
+        return proposals
+
+    @staticmethod
+    def match_keys(titles: Iterable[Any], proposals: list[TitleMatchProposal]) -> dict[UUID, str]:
+        """
+        Groups proposals into connected components and returns the key shared by
+        every title of a component that has no shikimori_id: the component's
+        shikimori_id if exactly one is known, otherwise the smallest title id.
+        """
+        shikimori_ids = {title.id: title.shikimori_id for title in titles}
+        parents: dict[UUID, UUID] = {}
+
+        def find(title_id: UUID) -> UUID:
+            parents.setdefault(title_id, title_id)
+            while parents[title_id] != title_id:
+                parents[title_id] = parents[parents[title_id]]
+                title_id = parents[title_id]
+            return title_id
+
+        for proposal in proposals:
+            parents[find(proposal.title_id)] = find(proposal.matched_title_id)
+
+        components: dict[UUID, list[UUID]] = defaultdict(list)
+        for title_id in list(parents):
+            components[find(title_id)].append(title_id)
+
+        keys = {}
+        for members in components.values():
+            known = {shikimori_ids.get(member) for member in members} - {None}
+            if len(known) > 1:
+                continue
+            key = str(known.pop()) if known else str(min(members))
+            for member in members:
+                if not shikimori_ids.get(member):
+                    keys[member] = key
+        return keys
@@ -0,0 +1,183 @@
+import asyncio
+import time
+from dataclasses import fields
+from functools import wraps
+from typing import Any, Callable, TYPE_CHECKING
+from fastapi import HTTPException
+from src.core.config import settings
+from src.utils.conditional import PageNotModified
+from src.utils.rate_limit import TokenBucket
+
+if TYPE_CHECKING:
+    from src.utils.parsers import ParserFunctions
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = settings.upstream_failure_threshold, reset_timeout: float = settings.upstream_reset_timeout_seconds) -> None:
+        """
+        :param failure_threshold: Consecutive failures that open the breaker.
+        :param reset_timeout: Seconds the breaker stays open before a probe request is let through,
+            and the longest a probe may take before another one is let through.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self.probe_started_at = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == "open" and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if (self.state == "open" and not self.is_open) or \
+                (self.state == "half_open" and time.monotonic() - self.probe_started_at >= self.reset_timeout):
+            self.state = "half_open"
+            self.probe_started_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_cancel(self):
+        # a cancelled probe tells nothing, so the next call probes again
+        if self.state == "half_open":
+            self.state = "open"
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened_count += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: grows by one per limit-many fast successes and is
+    halved on a failure or a response slower than the latency target.
+    """
+
+    def __init__(self, initial: int = settings.upstream_initial_concurrency, minimum: int = 1, maximum: int = settings.upstream_max_concurrency, latency_target: float = settings.upstream_latency_target_seconds) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._condition: asyncio.Condition | None = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, ok: bool | None, latency: float):
+        """
+        :param ok: Whether the call succeeded, None leaves the limit as is.
+        """
+        if ok is None:
+            pass
+        elif ok and latency <= self.latency_target:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        else:
+            self.limit = max(self.minimum, self.limit / 2)
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    # parsers raise 4xx HTTPException for missing pages, which the upstream served fine
+    if isinstance(error, PageNotModified):
+        return False
+    if isinstance(error, HTTPException):
+        return error.status_code >= 500
+    return True
+
+
+class Upstream:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.bucket = TokenBucket(rate=settings.upstream_requests_per_second,
+                                  capacity=settings.upstream_burst)
+        self.limiter = AdaptiveLimiter()
+        self.breaker = CircuitBreaker()
+        self.rejected = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.breaker.is_open
+
+    async def call(self, function: Callable, *args: Any, **kwargs: Any) -> Any:
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} is unavailable")
+        # None while no outcome is known, e.g. when cancelled on our side
+        ok = None
+        acquired = False
+        started = time.monotonic()
+        try:
+            await self.bucket.acquire()
+            await self.limiter.acquire()
+            acquired = True
+            started = time.monotonic()
+            result = await function(*args, **kwargs)
+            ok = True
+            return result
+        except Exception as e:
+            ok = not is_upstream_failure(e)
+            if not ok:
+                self.breaker.record_failure()
+            raise
+        finally:
+            if ok:
+                self.breaker.record_success()
+            elif ok is None:
+                self.breaker.record_cancel()
+            if acquired:
+                await self.limiter.release(ok, time.monotonic() - started)
+
+    def wrap(self, functions: 'ParserFunctions') -> 'ParserFunctions':
+        def guarded(function: Callable) -> Callable:
+            @wraps(function)
+            async def wrapper(*args, **kwargs):
+                return await self.call(function, *args, **kwargs)
+            return wrapper
+        return type(functions)(**{field.name: guarded(getattr(functions, field.name)) for field in fields(functions)})
+
+    def info(self) -> dict:
+        return {
+            'state': "open" if self.breaker.is_open else self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'opened_count': self.breaker.opened_count,
+            'rejected': self.rejected,
+            'concurrency_limit': int(self.limiter.limit),
+            'in_flight': self.limiter.in_flight,
+        }
+
+
+upstreams: dict[str, Upstream] = {}
+
+
+def get_upstream(name: str) -> Upstream:
+    if name not in upstreams:
+        upstreams[name] = Upstream(name)
+    return upstreams[name]
@@ -1,71 +1,138 @@
-import m3u8
+import asyncio
 import struct
-import requests
-
-
-class VideoDuration:
-    def __init__(self, url, use_m3u8=False):
-        self.url = url
-        self.seek = 0
-        self.duration = 0
-        self.s = requests.session()
-        self.timeout = 6
-        self.use_m3u8 = use_m3u8
-        self.s.headers = {
-            'Connection': 'keep-alive',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Encoding': 'gzip, deflate',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7',
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_13_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/66.0.3359.139 Safari/537.36'
-        }
-
-    def _set_headers(self, seek, type):
-        if type in ['moov', 'duration']:
-            self.s.headers['Range'] = 'bytes={}-{}'.format(seek, seek + 7)
-
-    def _send_request(self, url=None):
-        try:
-            data = self.s.get(url=url or self.url, stream=True if not self.use_m3u8 else False,
-                              timeout=self.timeout)
-            if self.use_m3u8:
-                return data.content
+import sys
+from urllib.parse import urlparse
+from uuid import UUID
+import aiohttp
+from src.core.config import settings
+from src.schemas.parsers import Episode
+from src.utils.http import http_session
+from src.utils.hls import HlsProber
+
+HEADERS = {
+    'Accept': '*/*',
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_13_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/66.0.3359.139 Safari/537.36'
+}
+HEADER_WINDOW = 256 * 1024
+MAX_WINDOWS = 8
+# a box header and the mvhd fields up to the duration of a version 1 box
+MVHD_READ = 16 + 32
+
+
+def _box_header(data: bytes, pos: int) -> tuple[int, bytes, int] | None:
+    if pos + 8 > len(data):
+        return None
+    size, box_type = struct.unpack('>I4s', data[pos:pos + 8])
+    if size == 1:
+        if pos + 16 > len(data):
+            return None
+        size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+        return size, box_type, 16
+    return size, box_type, 8
+
+
+def parse_mvhd(moov: bytes) -> float | None:
+    pos = 0
+    while (header := _box_header(moov, pos)) is not None:
+        size, box_type, header_size = header
+        if box_type == b'mvhd':
+            body = moov[pos + header_size:]
+            if body[0] == 1:
+                time_scale, duration = struct.unpack('>IQ', body[20:32])
             else:
-                return data.raw.read()
-        except requests.Timeout:
-            raise "Request timeout"
-
-    def _find_moov_request(self):
-        self._set_headers(self.seek, type='moov')
-        data = self._send_request()
-        size = int(struct.unpack('>I', data[:4])[0])
-        flag = data[-4:].decode('ascii')
-        return size, flag
-
-    def _find_duration_request(self):
-        self._set_headers(seek=self.seek+4+4+20, type='duration')
-        data = self._send_request()
-        time_scale = int(struct.unpack('>I', data[:4])[0])
-        duration = int(struct.unpack('>I', data[-4:])[0])
-        return time_scale, duration
-
-    def get_duration(self):
-        if self.use_m3u8:
-            playlist_data = self._send_request().decode('utf-8')
-            lines = playlist_data.splitlines()
-            for line in lines:
-                if line.startswith("https"):
-                    playlist_data = self._send_request(line).decode('utf-8')
-                    playlist = m3u8.loads(playlist_data)
-                    for segment in playlist.segments:
-                        if segment.duration:
-                            self.duration += segment.duration
-                    return self.duration
-        else:
-            while True:
-                size, flag = self._find_moov_request()
-                if flag == 'moov':
-                    time_scale, duration = self._find_duration_request()
-                    self.duration = duration/time_scale
-                    return self.duration
-                else:
-                    self.seek += size
+                time_scale, duration = struct.unpack('>II', body[12:20])
+            return duration / time_scale if time_scale else None
+        if size < header_size:
+            return None
+        pos += size
+    return None
+
+
+class VideoDurationProber:
+    def __init__(self, per_host_limit: int = settings.duration_probe_host_limit, timeout: int = 10):
+        self.per_host_limit = per_host_limit
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self.hls = HlsProber(timeout=self.timeout, headers=HEADERS)
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._semaphores[host]
+
+    async def _read_range(self, session: aiohttp.ClientSession, url: str, start: int, length: int) -> bytes:
+        headers = {**HEADERS, 'Range': f'bytes={start}-{start + length - 1}'}
+        async with session.get(url, headers=headers, timeout=self.timeout) as response:
+            if response.status == 200 and start > 0:
+                raise ValueError(f'{url} does not support range requests')
+            response.raise_for_status()
+            data = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                data += chunk
+                if len(data) >= length:
+                    break
+            return bytes(data[:length])
+
+    async def _get_mp4_duration(self, session: aiohttp.ClientSession, url: str) -> float | None:
+        offset = 0
+        for _ in range(MAX_WINDOWS):
+            data = await self._read_range(session, url, offset, HEADER_WINDOW)
+            pos = 0
+            while (header := _box_header(data, pos)) is not None:
+                size, box_type, header_size = header
+                if box_type == b'moov':
+                    end = pos + size if size else sys.maxsize
+                    return await self._read_mvhd(session, url, data, offset, pos + header_size, end)
+                if size < header_size:
+                    return None
+                pos += size
+            if len(data) < HEADER_WINDOW and pos >= len(data):
+                return None
+            offset += pos
+        return None
+
+    async def _read_mvhd(self, session: aiohttp.ClientSession, url: str, data: bytes, offset: int, pos: int, end: int) -> float | None:
+        """
+        Walks the moov children from `pos` to `end`, offsets in `data` which
+        starts at `offset` in the file, up to mvhd. Past the window only the
+        child box headers are fetched, mvhd usually being the first child.
+        """
+        while pos < end:
+            if pos + MVHD_READ > len(data):
+                data = await self._read_range(session, url, offset + pos, MVHD_READ)
+                offset, end, pos = offset + pos, end - pos, 0
+            header = _box_header(data, pos)
+            if header is None:
+                return None
+            size, box_type, header_size = header
+            if box_type == b'mvhd':
+                return parse_mvhd(data[pos:])
+            if size < header_size:
+                return None
+            pos += size
+        return None
+
+    async def get_duration(self, url: str, is_m3u8: bool = False) -> float | None:
+        async with self._host_semaphore(url):
+            async with http_session() as session:
+                if is_m3u8:
+                    return await self.hls.get_duration(session, url)
+                return await self._get_mp4_duration(session, url)
+
+    async def get_episode_duration(self, episode: Episode) -> int | None:
+        try:
+            duration = await self.get_duration(episode.links[0].link, is_m3u8=episode.is_m3u8)
+            print(f"Duration for {episode.id}: {duration}")
+            return round(duration) if duration else None
+        except Exception as e:
+            print(f"Error while getting duration for {episode.id}: {e}")
+            return None
+
+    async def get_episodes_duration(self, episodes: list[Episode]) -> dict[UUID, int | None]:
+        episodes = [episode for episode in episodes if episode.links]
+        durations = await asyncio.gather(*[self.get_episode_duration(episode) for episode in episodes])
+        return {episode.id: duration for episode, duration in zip(episodes, durations)}
+
+
+duration_prober = VideoDurationProber()
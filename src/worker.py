@@ -1,11 +1,13 @@
-import asyncio
 import os
+import time
+from datetime import datetime, timedelta
+from dataclasses import asdict
 from uuid import UUID
-from celery import Celery
+from celery import Celery, signals
 from fastapi_mail import FastMail, MessageSchema, MessageType
 from src.models.parsers import Title
 from src.redis.services import CacheService
-from src.schemas.parsers import Episode, TitlesPage
+from src.schemas.parsers import Episode, TitleShort, TitlesPage
 from src.crud.episodes_crud import EpisodesCrud
 from src.crud.titles_crud import TitlesCrud
 from src.models.users import User
@@ -13,13 +15,53 @@ from src.parsers import parsers_dict
 from src.utils.parsers import Parser
 from src.core.config import settings
 from src.mail.conf import conf
-from src.db.session import get_async_session_context
-from src.utils.videos import VideoDuration
+from src.db.session import AsyncSession, get_async_session_context
+from src.utils.videos import duration_prober
 from src.utils.shikimori import Shikimori
+from src.utils.title_matcher import TitleMatcher
+from src.utils.runtime import runtime
+from src.utils.tasks import IdempotentTask, get_service
+from src.utils.scheduler import ScheduledJob, Scheduler
+from src.utils.crawler import Crawler
+
+INTERACTIVE_QUEUE = "interactive"
+CRAWL_QUEUE = "crawl"
+PRIORITY_STEPS = list(range(10))
 
 celery = Celery(__name__)
 celery.conf.broker_url = os.environ.get("CELERY_BROKER_URL")
 celery.conf.result_backend = os.environ.get("CELERY_RESULT_BACKEND")
+celery.conf.task_default_queue = INTERACTIVE_QUEUE
+# with the redis broker 0 is the highest priority
+celery.conf.broker_transport_options = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': PRIORITY_STEPS,
+}
+celery.conf.task_default_priority = 5
+celery.conf.task_routes = {
+    'send_reset_password_email_task': {'queue': INTERACTIVE_QUEUE, 'priority': 0},
+    'send_verify_email_task': {'queue': INTERACTIVE_QUEUE, 'priority': 0},
+    'prepare_title_task': {'queue': INTERACTIVE_QUEUE, 'priority': 3},
+    'get_episodes_duration_task': {'queue': INTERACTIVE_QUEUE, 'priority': 5},
+    'check_parser_task': {'queue': CRAWL_QUEUE},
+    'prepare_all_parser_titles_task': {'queue': CRAWL_QUEUE, 'priority': 7},
+    'crawl_chunk_task': {'queue': CRAWL_QUEUE, 'priority': 7},
+    'match_titles_task': {'queue': CRAWL_QUEUE},
+    'refresh_shikimori_cache_task': {'queue': CRAWL_QUEUE},
+    'cache_maintenance_task': {'queue': CRAWL_QUEUE},
+}
+
+
+@signals.worker_process_init.connect
+def start_worker_runtime(**kwargs):
+    runtime.start()
+
+
+@signals.worker_process_shutdown.connect
+@signals.worker_shutdown.connect
+def stop_worker_runtime(**kwargs):
+    scheduler.stop()
+    runtime.stop()
 
 
 async def send_reset_password_email(user: dict, token: str):
@@ -94,92 +136,172 @@ async def send_verify_email(user: dict, token: str):
 
 @celery.task(name="send_reset_password_email_task")
 def send_reset_password_email_wrapper(user: User, token: str):
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(send_reset_password_email(user, token))
+    runtime.run(send_reset_password_email(user, token))
 
 
 @celery.task(name="send_verify_email_task")
 def send_verify_email_wrapper(user: User, token: str):
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(send_verify_email(user, token))
+    runtime.run(send_verify_email(user, token))
 
 
-async def fetch_shikimori(parsed_title, db_title, service, db):
-    shikimori_title = await Shikimori(service=service).get_title(parsed_title)
-    if shikimori_title:
-        print(
-            f"Title {parsed_title.id} linked to shikimori {shikimori_title.data['id']}")
-    else:
-        print(f"Title {parsed_title.id} not found on shikimori")
-    await TitlesCrud(db).update_shikimori_info(db_title=db_title, shikimori_id=int(shikimori_title.data['id']) if shikimori_title else None)
+async def link_shikimori_titles(titles: list[TitleShort | Title], service: CacheService, db: AsyncSession):
+    db_titles = await TitlesCrud(db).get_titles_by_ids(titles_ids=[title.id for title in titles])
+    unfetched = [db_title for db_title in db_titles if not db_title.shikimori_fetched]
+    if not unfetched:
+        return
+    try:
+        matches = await Shikimori(service=service, db=db).match_titles(unfetched)
+    except Exception as e:
+        print(f"Error while linking titles to shikimori: {e}")
+        return
+    shikimori_ids = {}
+    for db_title, match in zip(unfetched, matches):
+        if match:
+            print(f"Title {db_title.id} linked to shikimori {match['id']}")
+        else:
+            print(f"Title {db_title.id} not found on shikimori")
+        shikimori_ids[db_title.id] = int(match['id']) if match else None
+    await TitlesCrud(db).update_shikimori_ids(shikimori_ids=shikimori_ids)
 
 
 async def update_parser(parser: Parser):
     service = await parser.get_service()
-    async with get_async_session_context() as session:
-        for i in range(1, parser.main_pages_count+1):
-            titles_page = await parser.update_titles(page=i, service=service, raise_error=False)
-            titles_page = await parser._prepare_titles(
-                titles_page=titles_page, db=session, background_tasks=None)
-            for title in titles_page.titles:
-                print(title)
-                db_title = await TitlesCrud(session).get_title_by_id(title_id=title.id)
-                if not db_title.shikimori_fetched:
-                    await fetch_shikimori(parsed_title=title, db_title=db_title, service=service, db=session)
-                    await asyncio.sleep(5)
+    db_titles = await Crawler(parser, service).crawl_incremental(min_pages=parser.main_pages_count)
+    print(f"{len(db_titles)} titles changed on {parser.parser_id}")
+    if db_titles:
+        async with get_async_session_context() as session:
+            await link_shikimori_titles(titles=db_titles, service=service, db=session)
 
 
 async def check_parser(parser_id: str):
     parser: Parser = parsers_dict.get(parser_id)
-    timeout = await parser.get_parser_expires_in()
-    if timeout <= 0:
+    if await parser.get_parser_expires_in() <= 0:
         print(f"Updating {parser_id}")
         await update_parser(parser)
         print(f"Updated {parser_id}")
-        timeout = settings.titles_cache_hours * 3600
-    check_parser_wrapper.apply_async((parser_id,), countdown=timeout)
+        await match_titles_wrapper.enqueue()
+
+
+async def resolve_durations_failures(durations: dict[UUID, int | None], service: CacheService) -> dict[UUID, int | None]:
+    resolved = {}
+    for episode_id, duration in durations.items():
+        if duration:
+            resolved[episode_id] = duration
+            continue
+        failures = await service.add_duration_failure(episode_id)
+        if failures >= settings.duration_probe_max_attempts:
+            print(f"Giving up on duration for {episode_id} after {failures} attempts")
+            await service.set_duration_given_up(episode_id)
+            resolved[episode_id] = None
+            continue
+        backoff = min(settings.duration_probe_backoff_seconds * 2 ** (failures - 1),
+                      settings.duration_probe_max_backoff_seconds)
+        await service.set_duration_backoff(episode_id, backoff)
+    return resolved
+
+
+async def get_episodes_duration(parser_id: str, episodes: list[Episode], title_id: UUID | None = None):
+    parser: Parser = parsers_dict.get(parser_id)
+    service = await parser.get_service()
+    try:
+        async with get_async_session_context() as session:
+            pending_ids = await EpisodesCrud(session).get_episodes_ids_without_duration(
+                episodes_ids=[episode.id for episode in episodes])
+        pending = [episode for episode in episodes if episode.id in pending_ids]
+        if not pending:
+            return
+        # no session is held while probing, which can take minutes
+        durations = await duration_prober.get_episodes_duration(pending)
+        durations = await resolve_durations_failures(durations, service)
+        async with get_async_session_context() as session:
+            await EpisodesCrud(session).update_episodes_duration(durations=durations)
+    finally:
+        await service.release_duration_probes([episode.id for episode in episodes])
+        if title_id:
+            await service.release_duration_title_job(title_id)
 
 
-async def get_episode_duration(episode: Episode):
+@celery.task(name="get_episodes_duration_task")
+def get_episodes_duration_wrapper(parser_id: str, title_id: str, title_episodes: list[dict]):
+    runtime.run(get_episodes_duration(
+        parser_id, [Episode(**episode) for episode in title_episodes], title_id=UUID(title_id)))
+
+
+async def dispatch_episodes_duration(parser_id: str, title_id: UUID, episodes: list[Episode], service: CacheService) -> bool:
+    missing = [episode for episode in episodes if not episode.duration]
+    if not missing:
+        return False
+    if not await service.claim_duration_title_job(title_id, seconds=settings.duration_probe_timeout_seconds):
+        await service.incr_stats("durations", "suppressed", len(missing))
+        return False
+    claimed = set(await service.claim_duration_probes(
+        [episode.id for episode in missing], seconds=settings.duration_probe_timeout_seconds))
+    await service.incr_stats("durations", "suppressed", len(missing) - len(claimed))
+    if not claimed:
+        await service.release_duration_title_job(title_id)
+        return False
+    await service.incr_stats("durations", "dispatched", len(claimed))
+    get_episodes_duration_wrapper.apply_async(args=[parser_id, str(title_id), [
+        episode.model_dump() for episode in missing if episode.id in claimed]])
+    return True
+
+
+async def match_titles():
+    started = time.perf_counter()
     async with get_async_session_context() as session:
-        episode_id = episode.id
-        episodes_crud = EpisodesCrud(session)
-        db_episode = await episodes_crud.get_by_id(episode_id)
-        if not db_episode or db_episode.duration_fetched:
-            return
-        video_duration = None
-        try:
-            video_duration = VideoDuration(
-                episode.links[0].link, use_m3u8=episode.is_m3u8)
-            duration = video_duration.get_duration()
-            print(f"Duration for {episode_id}: {duration}")
-        except Exception as e:
-            print(f"Error while getting duration for {episode_id}: {e}")
-            duration = None
-        episode.seconds = duration
-        await episodes_crud.update_episode_duration(episode=db_episode, duration=duration)
-
-
-@celery.task(name="get_episode_duration_task")
-def get_episode_duration_wrapper(episode: dict):
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(get_episode_duration(Episode(**episode)))
-
-
-@celery.task(name="check_parser_task")
-def check_parser_wrapper(parser_id: str):
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(check_parser(parser_id))
+        titles_crud = TitlesCrud(session)
+        titles = await titles_crud.get_titles_for_matching()
+        matcher = TitleMatcher(threshold=settings.title_match_threshold)
+        proposals = matcher.propose(titles)
+        match_keys = matcher.match_keys(titles, proposals)
+        await titles_crud.replace_title_matches(
+            matches=[asdict(proposal) for proposal in proposals], match_keys=match_keys)
+    print(f"Matched {len(titles)} titles: {len(proposals)} proposals, {len(match_keys)} titles linked in {time.perf_counter() - started:.2f}s")
 
 
-@celery.task(name="get_episodes_duration_task")
-def get_episodes_duration(title_episodes: list[dict]):
-    wait = 0
-    for episode in title_episodes:
-        if not episode['seconds']:
-            get_episode_duration_wrapper.apply_async(
-                (episode,), countdown=wait)
-            wait += 5
+@celery.task(name="match_titles_task", base=IdempotentTask)
+def match_titles_wrapper():
+    runtime.run(match_titles())
+
+
+async def refresh_shikimori_cache():
+    service = await get_service()
+    shikimori = Shikimori(service=service)
+    try:
+        for page in range(1, settings.popular_ongoings_refresh_pages + 1):
+            if await service.get_popular_ongoings_ttl(page) < settings.popular_ongoings_refresh_ahead_hours * 3600:
+                await shikimori.update_popular_ongoings(page)
+                print(f"Refreshed popular ongoings page {page}")
+        titles_ids = await service.get_most_read_shikimori_titles(settings.shikimori_refresh_top)
+        refresh_before = datetime.now() - timedelta(days=settings.shikimori_refresh_ahead_days)
+        last_fetch = await service.get_shikimori_titles_last_fetch(titles_ids)
+        stale = [title_id for title_id in titles_ids
+                 if last_fetch[title_id] and last_fetch[title_id] < refresh_before]
+        if stale:
+            updated = await shikimori.update_shikimori_titles(stale)
+            print(f"Refreshed {updated} of {len(stale)} shikimori titles")
+    except Exception as e:
+        print(f"Error while refreshing shikimori cache: {e}")
+
+
+@celery.task(name="refresh_shikimori_cache_task", base=IdempotentTask)
+def refresh_shikimori_cache_wrapper():
+    runtime.run(refresh_shikimori_cache())
+
+
+async def cache_maintenance():
+    service = await get_service()
+    await service.trim_shikimori_reads(keep=settings.shikimori_refresh_top * 5)
+
+
+@celery.task(name="cache_maintenance_task", base=IdempotentTask)
+def cache_maintenance_wrapper():
+    runtime.run(cache_maintenance())
+
+
+@celery.task(name="check_parser_task", base=IdempotentTask, idempotency_key="{parser_id}")
+def check_parser_wrapper(parser_id: str):
+    runtime.run(check_parser(parser_id))
 
 
 async def prepare_title(parser: Parser, title_id: UUID, id_on_website: str):
@@ -190,55 +312,67 @@ async def prepare_title(parser: Parser, title_id: UUID, id_on_website: str):
             title_obj = await parser._update_title_cache(id_on_website=id_on_website, title_id=title_id, service=service)
             db_title = await parser.update_title_in_db(title_id=title_id, title_data=title_obj, db=session)
             if not db_title.shikimori_fetched:
-                shikimori_title = await Shikimori(service=service).get_title(title_obj)
-                await TitlesCrud(session).update_shikimori_info(db_title=db_title, shikimori_id=int(shikimori_title.data['id']) if shikimori_title else None)
+                match = await Shikimori(service=service, db=session).match_title(title_obj)
+                await TitlesCrud(session).update_shikimori_info(db_title=db_title, shikimori_id=int(match['id']) if match else None)
             await session.commit()
     except Exception as e:
         print(f"Error while preparing title {title_id}: {e}")
 
 
-@celery.task(name="prepare_title_task")
+@celery.task(name="prepare_title_task", base=IdempotentTask, idempotency_key="{title_id}", lock_timeout=60 * 10)
 def prepare_title_wrapper(title_id: UUID, parser_id: str, id_on_website: str):
-    loop = asyncio.get_event_loop()
     parser = parsers_dict.get(parser_id)
-    loop.run_until_complete(prepare_title(
+    runtime.run(prepare_title(
         parser=parser, title_id=title_id, id_on_website=id_on_website))
 
 
-async def prepare_all_parser_titles(parser_id: str):
-    print(f"Preparing all titles for {parser_id}")
+async def prepare_all_parser_titles(parser_id: str, restart: bool = False):
     parser: Parser = parsers_dict.get(parser_id)
     service = await parser.get_service()
-    async with get_async_session_context() as session:
-        first_page = await parser.get_titles(page=1, db=session, service=service)
-        total_pages = first_page.total_pages
-        for page in range(1, total_pages+1):
-            print(f"Preparing page {page} for {parser_id}")
-            try:
-                if page == 1:
-                    page_data = first_page
-                else:
-                    page_data = await parser.get_titles(page=page, db=session, service=service)
-                for title in page_data.titles:
-                    db_title = await TitlesCrud(session).get_title_by_id(title.id)
-                    if not db_title.shikimori_fetched:
-                        await fetch_shikimori(parsed_title=title, db_title=db_title, service=service, db=session)
-                        await asyncio.sleep(5)
-                await asyncio.sleep(5)
-            except Exception as e:
-                print(f"Error while getting page {page} for {parser_id}: {e}")
-
-    print(f"Titles for {parser_id} prepared")
-
-
-@celery.task(name="prepare_all_parser_titles_task")
-def prepare_all_parser_titles_wrapper(parser_id: str):
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(prepare_all_parser_titles(parser_id))
-
-
-@celery.on_after_configure.connect
-def setup_periodic_tasks(sender, **kwargs):
-    sender.control.purge()
-    for parser_id in parsers_dict.keys():
-        check_parser_wrapper.apply_async((parser_id,))
+    chunks = await Crawler(parser, service).plan(restart=restart)
+    print(f"Crawling {len(chunks)} chunks for {parser_id}")
+    for start, end in chunks:
+        await crawl_chunk_wrapper.enqueue((parser_id, start, end))
+
+
+@celery.task(name="prepare_all_parser_titles_task", base=IdempotentTask, idempotency_key="{parser_id}")
+def prepare_all_parser_titles_wrapper(parser_id: str, restart: bool = False):
+    runtime.run(prepare_all_parser_titles(parser_id, restart))
+
+
+async def crawl_chunk(parser_id: str, start: int, end: int):
+    parser: Parser = parsers_dict.get(parser_id)
+    service = await parser.get_service()
+    crawler = Crawler(parser, service)
+    db_titles = await crawler.crawl_chunk(start, end)
+    print(f"Crawled pages {start}-{end} of {parser_id}: {len(db_titles)} titles")
+    if db_titles:
+        async with get_async_session_context() as session:
+            await link_shikimori_titles(titles=db_titles, service=service, db=session)
+    if await crawler.finish_if_done():
+        print(f"Titles for {parser_id} prepared")
+        await match_titles_wrapper.enqueue()
+
+
+@celery.task(name="crawl_chunk_task", base=IdempotentTask, idempotency_key="{parser_id}:{start}")
+def crawl_chunk_wrapper(parser_id: str, start: int, end: int):
+    runtime.run(crawl_chunk(parser_id, start, end))
+
+
+scheduler = Scheduler(jobs=[
+    *[ScheduledJob(name=f"check_parser:{parser_id}", task=check_parser_wrapper, args=(parser_id,),
+                   interval=settings.parser_check_interval_minutes * 60)
+      for parser_id in parsers_dict.keys()],
+    ScheduledJob(name="refresh_shikimori_cache", task=refresh_shikimori_cache_wrapper,
+                 interval=settings.shikimori_refresh_interval_minutes * 60),
+    ScheduledJob(name="match_titles", task=match_titles_wrapper,
+                 interval=settings.title_match_interval_hours * 3600),
+    ScheduledJob(name="cache_maintenance", task=cache_maintenance_wrapper,
+                 interval=settings.cache_maintenance_interval_hours * 3600),
+])
+
+
+@signals.worker_ready.connect
+def start_scheduler(**kwargs):
+    runtime.start()
+    scheduler.start(runtime.loop)
@@ -0,0 +1,13 @@
+import os
+
+# settings the app requires at import time; the tests talk to fakeredis only
+for name, value in {
+    'SERVER_NAME': 'test', 'PROJECT_NAME': 'test', 'API_DOMAIN': 'localhost', 'FRONTEND_DOMAIN': 'localhost',
+    'BACKEND_CORS_ORIGINS': 'http://localhost', 'FIRST_SUPERUSER_EMAIL': 'admin@example.com',
+    'POSTGRES_SCHEME': 'postgresql+asyncpg', 'POSTGRES_SERVER': 'localhost', 'POSTGRES_USER': 'test',
+    'POSTGRES_PASSWORD': 'test', 'POSTGRES_DB': 'test', 'REDIS_HOST': 'localhost',
+    'GOOGLE_CLIENT_ID': 'test', 'GOOGLE_CLIENT_SECRET': 'test', 'GITHUB_CLIENT_ID': 'test', 'GITHUB_CLIENT_SECRET': 'test',
+    'EMAIL_USERNAME': 'test', 'EMAIL_PASSWORD': 'test', 'EMAIL_FROM': 'admin@example.com', 'EMAIL_PORT': '25',
+    'EMAIL_SERVER': 'localhost',
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,59 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.utils.compression import CompressionMiddleware
+from src.utils.responses import PreserializedJSONResponse
+
+BODY = '{"titles":"' + 'a' * 4000 + '"}'
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+
+@app.get("/page")
+def page():
+    return PreserializedJSONResponse(BODY, etag="page-1")
+
+
+@app.get("/small")
+def small():
+    return PreserializedJSONResponse('{"titles":[]}', etag="small-1")
+
+
+client = TestClient(app)
+
+
+def test_compressed_response_headers():
+    for encoding in ("br", "gzip"):
+        response = client.get("/page", headers={"Accept-Encoding": encoding})
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["vary"] == "Accept-Encoding"
+        # the compressed bytes differ from the uncompressed ones
+        assert response.headers["etag"] == 'W/"page-1"'
+        assert int(response.headers["content-length"]) < len(BODY)
+        # decoded by the test client
+        assert response.text == BODY
+        # served from the compressed bytes cache the second time
+        assert client.get("/page", headers={"Accept-Encoding": encoding}).text == BODY
+
+
+def test_uncompressed_responses():
+    response = client.get("/page", headers={"Accept-Encoding": "identity, br;q=0"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"page-1"'
+    assert response.text == BODY
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"small-1"'
+
+
+def test_conditional_requests_match_either_tag():
+    for accept_encoding, etag in (("gzip", 'W/"page-1"'), ("br", '"page-1"'), ("identity", 'W/"page-1"'), ("identity", '"page-1"')):
+        response = client.get("/page", headers={"Accept-Encoding": accept_encoding, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+    response = client.get("/page", headers={"Accept-Encoding": "gzip", "If-None-Match": '"page-0", W/"page-1"'})
+    assert response.status_code == 304
+    assert response.headers["etag"] == 'W/"page-1"'
+    response = client.get("/page", headers={"Accept-Encoding": "gzip", "If-None-Match": 'W/"page-0"'})
+    assert response.status_code == 200
+    assert response.text == BODY
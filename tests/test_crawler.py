@@ -0,0 +1,65 @@
+import asyncio
+from fakeredis import aioredis
+from src.redis.services import CacheService
+from src.schemas.parsers import ParsedTitleShort, ParsedTitlesPage
+from src.utils.crawler import Crawler
+
+
+class FakeParser:
+    parser_id = 'fake'
+
+    def __init__(self, pages: dict[int, list[str]]) -> None:
+        self.pages = pages
+        self.unchanged_pages: set[int] = set()
+
+    async def refresh_titles(self, page: int, service: CacheService) -> tuple[ParsedTitlesPage, bool]:
+        titles = [ParsedTitleShort(id_on_website=name, name=name, image_url=f'https://example.com/{name}.jpg')
+                  for name in self.pages[page]]
+        return ParsedTitlesPage(titles=titles, total_pages=len(self.pages)), page not in self.unchanged_pages
+
+
+def crawl(parser: FakeParser, service: CacheService, **kwargs) -> list[str]:
+    crawler = Crawler(parser, service, requests_per_second=1000)
+    upserted = []
+
+    async def upsert(titles: list[ParsedTitleShort]):
+        upserted.extend(title.id_on_website for title in titles)
+        return titles
+
+    crawler._upsert = upsert
+    asyncio.run(crawler.crawl_incremental(**kwargs))
+    return upserted
+
+
+def test_incremental_crawl_upserts_changed_titles():
+    service = CacheService(aioredis.FakeRedis(decode_responses=True))
+    parser = FakeParser({1: ['a', 'b'], 2: ['c', 'd'], 3: ['e', 'f']})
+    assert crawl(parser, service, stop_run=2) == ['a', 'b', 'c', 'd', 'e', 'f']
+
+    parser.pages[1] = ['new', 'a']
+    assert crawl(parser, service, stop_run=2) == ['new']
+
+
+def test_incremental_crawl_skips_unchanged_pages():
+    service = CacheService(aioredis.FakeRedis(decode_responses=True))
+    parser = FakeParser({1: ['a', 'b'], 2: ['c', 'd'], 3: ['e', 'f']})
+    parser.unchanged_pages = {1}
+    assert crawl(parser, service, stop_run=10) == ['c', 'd', 'e', 'f']
+
+    parser.unchanged_pages = {1, 2, 3}
+    assert crawl(parser, service, stop_run=10) == []
+
+
+def test_incremental_crawl_records_a_failed_run_in_the_watermark():
+    service = CacheService(aioredis.FakeRedis(decode_responses=True))
+    parser = FakeParser({1: ['a', 'b'], 2: ['c', 'd'], 3: ['e', 'f']})
+    del parser.pages[2]
+    assert crawl(parser, service, stop_run=10) == ['a', 'b']
+    watermark = asyncio.run(service.get_crawl_watermark('fake'))
+    assert (watermark['status'], watermark['pages']) == ('failed', '1')
+    assert watermark['error'] == '2'
+
+    parser.pages[2] = ['c', 'd']
+    assert crawl(parser, service, stop_run=10) == ['c', 'd', 'e', 'f']
+    watermark = asyncio.run(service.get_crawl_watermark('fake'))
+    assert (watermark['status'], watermark['pages'], watermark['error']) == ('complete', '3', '')
@@ -0,0 +1,46 @@
+import asyncio
+import uuid
+from fakeredis import aioredis
+from src import worker
+from src.core.config import settings
+from src.redis.services import CacheService
+from src.schemas.parsers import Episode
+
+
+def test_given_up_episode_is_not_dispatched_again(monkeypatch):
+    dispatched = []
+    monkeypatch.setattr(worker.get_episodes_duration_wrapper, 'apply_async',
+                        lambda args: dispatched.append([episode['id'] for episode in args[2]]))
+    redis = aioredis.FakeRedis(decode_responses=True)
+    service = CacheService(redis)
+    title_id = uuid.uuid4()
+    given_up = Episode(id=uuid.uuid4(), name='1 серия', number=1)
+    fresh = Episode(id=uuid.uuid4(), name='2 серия', number=2)
+
+    async def run():
+        for _ in range(settings.duration_probe_max_attempts):
+            resolved = await worker.resolve_durations_failures({given_up.id: None}, service)
+            # the backoff has passed
+            await redis.delete(f"duration:{given_up.id}:backoff")
+        assert resolved == {given_up.id: None}
+        assert await worker.dispatch_episodes_duration('anidub', title_id, [given_up, fresh], service)
+        await service.release_duration_probes([fresh.id])
+        await service.release_duration_title_job(title_id)
+        assert not await worker.dispatch_episodes_duration('anidub', title_id, [given_up], service)
+
+    asyncio.run(run())
+    assert dispatched == [[fresh.id]]
+
+
+def test_claim_duration_probes_skips_backoff_given_up_and_in_flight():
+    service = CacheService(aioredis.FakeRedis(decode_responses=True))
+    backoff, given_up, in_flight, fresh = [uuid.uuid4() for _ in range(4)]
+
+    async def run():
+        await service.set_duration_backoff(backoff, 60)
+        await service.set_duration_given_up(given_up)
+        assert await service.claim_duration_probes([in_flight], seconds=60) == [in_flight]
+        assert await service.claim_duration_probes([backoff, given_up, in_flight, fresh], seconds=60) == [fresh]
+        assert await service.claim_duration_probes([], seconds=60) == []
+
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+import uuid
+from src.models.parsers import Title as TitleModel
+from src.parsers import animevost
+from src.schemas.parsers import ParsedTitle, ParsedTitleShort
+from src.utils.parsers import short_titles, title_response
+
+
+def db_title(index: int) -> TitleModel:
+    return TitleModel(id=uuid.uuid4(), id_on_website=str(index), parser_id='anidub', name=f'Тайтл {index}',
+                      image_url=f'https://example.com/{index}.jpg')
+
+
+def parsed_title(index: int) -> ParsedTitleShort:
+    return ParsedTitleShort(id_on_website=str(index), name=f'Тайтл {index}', en_name=f'Title {index}',
+                            image_url=f'https://example.com/{index}.jpg', additional_info='[1-12 из 12]')
+
+
+def test_short_titles_take_the_parsed_fields_and_skip_invalid_rows():
+    rows = [db_title(1), db_title(2), db_title(3)]
+    rows[1].name = None
+    titles = short_titles([(row, parsed_title(int(row.id_on_website))) for row in rows])
+    assert [title.id for title in titles] == [rows[0].id, rows[2].id]
+    assert titles[0].en_name == 'Title 1'
+    assert titles[0].additional_info == '[1-12 из 12]'
+
+
+def test_title_response_is_built_from_the_parsed_title():
+    row = db_title(1)
+    parsed = ParsedTitle(**parsed_title(1).model_dump(exclude={'year'}), description='Описание', year='2024', duration='24 мин.')
+    title = title_response(row, parsed)
+    assert (title.id, title.parser_id) == (row.id, row.parser_id)
+    assert title.model_dump(include={'name', 'en_name', 'description', 'year', 'duration'}) == \
+        parsed.model_dump(include={'name', 'en_name', 'description', 'year', 'duration'})
+    assert title.episodes == [] and title.genres == []
+
+
+def test_animevost_list_page_has_year_and_kind():
+    html = '''<div id="dle-content"><div class="shortstory">
+    <div class="shortstoryHead"><h2><a href="https://v5.vost.pw/tip/tv/3000-hellsing.html">Хеллсинг / Hellsing [1-10 из 10]</a></h2></div>
+    <div class="shortstoryContent"><table><tr><td><img src="/uploads/posts/hellsing.jpg"></td>
+    <td><p><strong>Год выхода: </strong>2001</p><p><strong>Тип: </strong>ТВ</p>
+    <p><strong>Количество серий: </strong>10 (25 мин.)</p></td></tr></table></div></div></div>'''
+    titles = animevost.parse_titles_page(html).titles
+    assert [(title.name, title.year, title.kind) for title in titles] == [('Хеллсинг', '2001', 'tv')]
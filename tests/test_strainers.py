@@ -0,0 +1,39 @@
+import pytest
+from benchmarks.fixtures import load_fixtures
+from src.parsers import anidub, animevost
+
+FIXTURES = load_fixtures()
+
+
+def unstrained(monkeypatch: pytest.MonkeyPatch, module, *names: str):
+    for name in names:
+        monkeypatch.setattr(module, name, None)
+
+
+def test_anidub_list_page(monkeypatch: pytest.MonkeyPatch):
+    html = FIXTURES['anidub_page']
+    pages, titles = anidub.parse_titles_page(html)
+    assert pages and titles
+    unstrained(monkeypatch, anidub, 'LIST_PAGE_ONLY')
+    assert anidub.parse_titles_page(html) == (pages, titles)
+
+
+def test_anidub_title_page(monkeypatch: pytest.MonkeyPatch):
+    html = FIXTURES['anidub_title']
+    title, player_link = anidub.parse_title_page(html, '1')
+    assert title.name and (title.episodes_list or player_link)
+    unstrained(monkeypatch, anidub, 'TITLE_PAGE_ONLY')
+    assert anidub.parse_title_page(html, '1') == (title, player_link)
+
+
+def test_animevost_list_page(monkeypatch: pytest.MonkeyPatch):
+    html = FIXTURES['animevost_page']
+    page = animevost.parse_titles_page(html)
+    genres = animevost.parse_genres_page(html)
+    title_id = page.titles[0].id_on_website
+    search = animevost.parse_search_page(html, title_id)
+    assert page.titles and page.total_pages > 1 and genres
+    unstrained(monkeypatch, animevost, 'LIST_PAGE_ONLY', 'GENRES_PAGE_ONLY', 'SEARCH_PAGE_ONLY')
+    assert animevost.parse_titles_page(html) == page
+    assert animevost.parse_genres_page(html) == genres
+    assert animevost.parse_search_page(html, title_id) == search
@@ -0,0 +1,24 @@
+import uuid
+from types import SimpleNamespace
+from src.utils.title_matcher import TitleMatcher
+
+
+def title(parser_id: str, name: str, en_name: str, year: str | None = None, kind: str | None = None) -> SimpleNamespace:
+    return SimpleNamespace(id=uuid.uuid4(), parser_id=parser_id, name=name, en_name=en_name,
+                           year=year, kind=kind, shikimori_id=None)
+
+
+def test_same_name_titles_are_told_apart_by_year():
+    old = [title('anidub', 'Хеллсинг', 'Hellsing', '2001', 'tv'),
+           title('animevost', 'Хеллсинг', 'Hellsing', '2001', 'tv')]
+    new = [title('anidub', 'Хеллсинг', 'Hellsing', '2006', 'ova'),
+           title('animevost', 'Хеллсинг', 'Hellsing', '2006', 'ova')]
+    proposals = TitleMatcher().propose(old + new)
+    pairs = {frozenset((proposal.title_id, proposal.matched_title_id)) for proposal in proposals}
+    assert pairs == {frozenset(title.id for title in old), frozenset(title.id for title in new)}
+
+
+def test_titles_of_distant_years_are_not_matched():
+    titles = [title('anidub', 'Хеллсинг', 'Hellsing', '2001'),
+              title('animevost', 'Хеллсинг', 'Hellsing', '2006')]
+    assert TitleMatcher().propose(titles) == []
@@ -0,0 +1,87 @@
+import asyncio
+import time
+import pytest
+from src.utils.upstream import Upstream
+
+
+async def fail():
+    raise ConnectionError("upstream is down")
+
+
+async def hang():
+    await asyncio.sleep(10)
+
+
+async def cancel(upstream: Upstream):
+    task = asyncio.create_task(upstream.call(hang))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_cancelled_calls_do_not_open_the_breaker():
+    upstream = Upstream("test")
+    limit = upstream.limiter.limit
+
+    async def run():
+        for _ in range(upstream.breaker.failure_threshold * 2):
+            await cancel(upstream)
+
+    asyncio.run(run())
+    assert upstream.breaker.state == "closed"
+    assert upstream.breaker.failures == 0
+    assert upstream.limiter.limit == limit
+    assert upstream.limiter.in_flight == 0
+
+
+def test_cancelled_probe_lets_the_next_call_probe():
+    upstream = Upstream("test")
+    upstream.breaker.reset_timeout = 0
+
+    async def run():
+        for _ in range(upstream.breaker.failure_threshold):
+            with pytest.raises(ConnectionError):
+                await upstream.call(fail)
+        assert upstream.breaker.state == "open"
+        await cancel(upstream)
+        assert await upstream.call(asyncio.sleep, 0) is None
+
+    asyncio.run(run())
+    assert upstream.breaker.state == "closed"
+
+
+def test_probe_cancelled_while_waiting_lets_the_next_call_probe():
+    upstream = Upstream("test")
+    upstream.breaker.reset_timeout = 0
+
+    async def run():
+        for _ in range(upstream.breaker.failure_threshold):
+            with pytest.raises(ConnectionError):
+                await upstream.call(fail)
+        # the probe waits for a token and is cancelled before reaching the upstream
+        upstream.bucket.tokens = -upstream.bucket.rate
+        task = asyncio.create_task(upstream.call(asyncio.sleep, 0))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert upstream.breaker.state == "open"
+        upstream.bucket.tokens = upstream.bucket.capacity
+        assert await upstream.call(asyncio.sleep, 0) is None
+
+    asyncio.run(run())
+    assert upstream.breaker.state == "closed"
+    assert upstream.limiter.in_flight == 0
+
+
+def test_stuck_probe_is_replaced_after_the_reset_timeout():
+    breaker = Upstream("test").breaker
+    breaker.reset_timeout = 0.05
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()